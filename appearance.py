@@ -0,0 +1,104 @@
+# appearance.py
+from __future__ import annotations
+from typing import Dict, Optional, Sequence, Tuple
+import numpy as np
+from utilities import compute_hsv_hist, compute_grad_hist, FrameFeatures
+
+BBox = Tuple[int, int, int, int]  # (x1, y1, x2, y2)
+
+# Descriptores disponibles: nombre de la columna en TrackTable -> extractor sobre (frame, bbox)
+EXTRACTORS = {
+    "hsv_hist": compute_hsv_hist,
+    "grad_hist": compute_grad_hist,
+}
+
+
+class DetectionDescriptors:
+    """
+    Cache de descriptores de las detecciones de un frame.
+    Cada descriptor (hsv_hist, grad_hist) se extrae como mucho una vez por detección y frame,
+    tanto si lo pide la fase de emparejamiento como Car.update o la creación de tracks.
+    Si se pasa `features` (FrameFeatures del mismo frame) los descriptores salen de sus
+    histogramas integrales en lugar de recortar y procesar cada caja.
+    """
+    def __init__(self, frame: Optional[np.ndarray], features: Optional[FrameFeatures] = None):
+        self.frame = frame
+        self.features = features
+        self._cache: Dict[str, Dict[BBox, Optional[np.ndarray]]] = {kind: {} for kind in EXTRACTORS}
+
+    def get(self, kind: str, bbox: BBox) -> Optional[np.ndarray]:
+        """Descriptor de una caja; None si no hay frame o la caja no es válida."""
+        bbox = tuple(int(v) for v in bbox)
+        cache = self._cache[kind]
+        if bbox not in cache:
+            desc = None
+            if self.frame is not None:
+                try:
+                    if self.features is not None:
+                        desc = getattr(self.features, kind)(bbox)
+                    else:
+                        desc = EXTRACTORS[kind](self.frame, bbox)
+                    desc = np.asarray(desc, dtype=np.float32).ravel()
+                except Exception:
+                    desc = None
+            cache[bbox] = desc
+        return cache[bbox]
+
+    def matrix(self, kind: str, boxes: Sequence[BBox]) -> Tuple[np.ndarray, np.ndarray]:
+        """Apila los descriptores de las cajas indicadas: (D,K) y máscara de válidos (D,)."""
+        descs = [self.get(kind, b) for b in boxes]
+        valid = np.array([d is not None for d in descs], dtype=bool)
+        if not valid.any():
+            return np.zeros((len(descs), 0), dtype=np.float32), valid
+        k = next(d for d in descs if d is not None).shape[0]
+        out = np.zeros((len(descs), k), dtype=np.float32)
+        for i, d in enumerate(descs):
+            if d is not None:
+                out[i] = d
+        return out, valid
+
+
+def correlation_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """
+    Correlación de Pearson de cada fila de a (T,K) contra cada fila de b (D,K) en un solo
+    producto matricial. Equivale a cv2.compareHist(..., HISTCMP_CORREL) para cada pareja
+    (incluido devolver 1.0 cuando alguno de los histogramas es constante).
+    """
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    a = a - a.mean(axis=1, keepdims=True)
+    b = b - b.mean(axis=1, keepdims=True)
+    num = a @ b.T
+    den = np.outer((a * a).sum(axis=1), (b * b).sum(axis=1))
+    corr = np.ones_like(num)
+    ok = np.abs(den) > np.finfo(np.float64).eps
+    corr[ok] = num[ok] / np.sqrt(den[ok])
+    return corr
+
+
+def track_descriptors(store, kind: str, rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Descriptores (T,K) de los tracks de las filas indicadas y máscara de los que lo tienen."""
+    rows = np.asarray(rows, dtype=np.intp)
+    if kind not in store.hists:
+        return np.zeros((len(rows), 0), dtype=np.float32), np.zeros((len(rows),), dtype=bool)
+    return store.hists[kind][rows], store.has_hist[kind][rows]
+
+
+def similarity_matrix(store, rows: np.ndarray, descriptors: DetectionDescriptors,
+                      det_boxes: Sequence[BBox], kind: str) -> np.ndarray:
+    """
+    Similitud track-detección para todas las parejas, (T,D):
+    - hsv_hist: correlación limitada a [-1,1] (como appearance_score)
+    - grad_hist: correlación reescalada a [0,1] (como shape_score)
+    Las parejas sin descriptor (track o detección) valen 0.
+    """
+    t_desc, t_valid = track_descriptors(store, kind, rows)
+    d_desc, d_valid = descriptors.matrix(kind, det_boxes)
+    out = np.zeros((len(t_valid), len(d_valid)), dtype=np.float64)
+    if not t_valid.any() or not d_valid.any() or t_desc.shape[1] != d_desc.shape[1]:
+        return out
+    corr = np.clip(correlation_matrix(t_desc[t_valid], d_desc[d_valid]), -1.0, 1.0)
+    if kind == "grad_hist":
+        corr = (corr + 1.0) / 2.0
+    out[np.ix_(t_valid, d_valid)] = corr
+    return out
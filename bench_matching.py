@@ -0,0 +1,114 @@
+# python
+"""
+Benchmark del emparejamiento por IoU: bucle Python original (iou() por pareja +
+argmax greedy re-escaneando la matriz) contra el motor vectorizado de utilities
+(iou_matrix + greedy_assignment) y el camino de los trackers, que solo genera las
+parejas que se solapan (iou_candidates + assign_pairs) en modo greedy y óptimo por
+componentes (requiere scipy).
+
+Uso:
+    python bench_matching.py --sizes 10 30 100 300 1000 --repeats 5
+    python bench_matching.py --sizes 100 1000 3000 --gate-distance 1.5
+"""
+import argparse
+import time
+
+import numpy as np
+
+from utilities import (iou, iou_matrix, assign, iou_candidates, assign_pairs, center_distance_gate,
+                       linear_sum_assignment)
+
+
+def synthetic_scene(n_tracks: int, n_dets: int, width: int = 1920, height: int = 1080, seed: int = 0):
+    """Genera tracks y detecciones sintéticas (las detecciones son tracks desplazados + ruido)."""
+    rng = np.random.default_rng(seed)
+    wh = rng.uniform(40, 160, size=(n_tracks, 2))
+    xy = rng.uniform(0, [width, height], size=(n_tracks, 2))
+    tracks = np.hstack([xy, xy + wh]).astype(int)
+    idx = rng.permutation(n_tracks)[:n_dets]
+    shift = rng.integers(-12, 13, size=(len(idx), 2))
+    dets = tracks[idx] + np.hstack([shift, shift])
+    return [tuple(b) for b in tracks], [tuple(b) for b in dets]
+
+
+def legacy_match(track_boxes, det_boxes, threshold: float):
+    """Implementación previa: bucle anidado con iou() y argmax repetido."""
+    iou_mat = np.zeros((len(track_boxes), len(det_boxes)), dtype=np.float32)
+    for ti, tb in enumerate(track_boxes):
+        for di, db in enumerate(det_boxes):
+            iou_mat[ti, di] = iou(tb, db)
+    pairs = []
+    used_tracks, used_dets = set(), set()
+    while True:
+        ti, di = np.unravel_index(np.argmax(iou_mat), iou_mat.shape)
+        if iou_mat[ti, di] < threshold:
+            break
+        if ti in used_tracks or di in used_dets:
+            iou_mat[ti, di] = -1
+            continue
+        pairs.append((ti, di))
+        used_tracks.add(ti)
+        used_dets.add(di)
+        iou_mat[ti, :] = -1
+        iou_mat[:, di] = -1
+    return pairs
+
+
+def vectorized_match(track_boxes, det_boxes, threshold: float, gate_distance=None):
+    """Matriz IoU completa y gating (N,M) denso."""
+    gate = center_distance_gate(track_boxes, det_boxes, gate_distance) if gate_distance else None
+    rows, cols = assign(iou_matrix(track_boxes, det_boxes), threshold, "greedy", gate)
+    return list(zip(rows.tolist(), cols.tolist()))
+
+
+def sparse_match(track_boxes, det_boxes, threshold: float, gate_distance=None, mode: str = "greedy"):
+    """Como Tracker._match_boxes: parejas candidatas primero, gating solo sobre ellas."""
+    rows, cols, scores = iou_candidates(track_boxes, det_boxes, threshold)
+    if gate_distance:
+        keep = center_distance_gate(track_boxes, det_boxes, gate_distance, rows, cols)
+        rows, cols, scores = rows[keep], cols[keep], scores[keep]
+    rows, cols = assign_pairs(rows, cols, scores, (len(track_boxes), len(det_boxes)), threshold, mode)
+    return list(zip(rows.tolist(), cols.tolist()))
+
+
+def timeit(fn, repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--sizes", type=int, nargs="+", default=[10, 30, 100, 300, 1000])
+    p.add_argument("--det-ratio", type=float, default=0.7, help="nº detecciones / nº tracks")
+    p.add_argument("--threshold", type=float, default=0.3)
+    p.add_argument("--gate-distance", type=float, default=None, help="Gating por distancia de centros (x diagonal)")
+    p.add_argument("--repeats", type=int, default=3)
+    p.add_argument("--legacy-max", type=int, default=1000, help="No medir la versión previa por encima de N tracks")
+    args = p.parse_args()
+
+    print(f"{'tracks':>7} {'dets':>6} {'legacy ms':>11} {'vector ms':>11} {'sparse ms':>11} {'speedup':>8} "
+          f"{'hungarian ms':>13}")
+    for n in args.sizes:
+        d = max(1, int(n * args.det_ratio))
+        tracks, dets = synthetic_scene(n, d)
+        thr, gd = args.threshold, args.gate_distance
+        t_vec = timeit(lambda: vectorized_match(tracks, dets, thr, gd), args.repeats)
+        t_sp = timeit(lambda: sparse_match(tracks, dets, thr, gd), args.repeats)
+        assert sparse_match(tracks, dets, thr, gd) == vectorized_match(tracks, dets, thr, gd)
+        t_hun = "-"
+        if linear_sum_assignment is not None:
+            t_hun = f"{timeit(lambda: sparse_match(tracks, dets, thr, gd, 'hungarian'), args.repeats) * 1e3:.2f}"
+        t_old = "-"
+        if n <= args.legacy_max and gd is None:
+            t_old = timeit(lambda: legacy_match(tracks, dets, args.threshold), args.repeats)
+            assert legacy_match(tracks, dets, args.threshold) == vectorized_match(tracks, dets, args.threshold)
+            t_old = f"{t_old * 1e3:.2f}"
+        print(f"{n:>7} {d:>6} {t_old:>11} {t_vec * 1e3:>11.2f} {t_sp * 1e3:>11.2f} {t_vec / t_sp:>7.1f}x {t_hun:>13}")
+
+
+if __name__ == "__main__":
+    main()
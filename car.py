@@ -1,7 +1,6 @@
 # trackers/basic_tracker.py
 from __future__ import annotations
-from dataclasses import dataclass, field
-from typing import List, Tuple, Dict, Optional
+from typing import List, Tuple, Dict, Optional, Iterable
 import time
 import math
 import cv2
@@ -10,38 +9,326 @@ from utilities import *
 
 BBox = Tuple[int, int, int, int]  # (x1, y1, x2, y2)
 
-@dataclass
+
+class TrackTable:
+    """
+    Almacén columnar (struct-of-arrays) de los tracks.
+    Cada track ocupa una fila; las filas de los tracks eliminados se reutilizan, así que
+    la memoria solo depende del nº máximo de tracks simultáneos (no de la duración del vídeo).
+    - history: nº de centroides recientes que se guardan por track (ring buffer).
+    """
+    def __init__(self, capacity: int = 64, history: int = 32):
+        self.history = history
+        self.capacity = 0
+        self.ids = np.zeros((0,), dtype=np.int64)
+        self.bbox = np.zeros((0, 4), dtype=np.int64)
+        self.first_bbox = np.zeros((0, 4), dtype=np.int64)
+        self.velocity = np.zeros((0, 2), dtype=np.float64)   # (speed_x, speed_y)
+        self.hits = np.zeros((0,), dtype=np.int64)
+        self.lost = np.zeros((0,), dtype=np.int64)
+        self.confidence = np.zeros((0,), dtype=np.float64)
+        self.created_at = np.zeros((0,), dtype=np.float64)
+        self.last_seen = np.zeros((0,), dtype=np.float64)
+        self.alive = np.zeros((0,), dtype=bool)
+        self.centroids = np.zeros((0, history, 2), dtype=np.float64)
+        self.n_centroids = np.zeros((0,), dtype=np.int64)   # total añadidos (la cabeza es n % history)
+        self.kf_mean = np.zeros((0, 8), dtype=np.float64)     # estado del filtro de Kalman (si se usa)
+        self.kf_cov = np.zeros((0, 8, 8), dtype=np.float64)
+        self.hists: Dict[str, np.ndarray] = {}                # descriptores opcionales (hsv_hist, grad_hist)
+        self.has_hist: Dict[str, np.ndarray] = {}
+        self._free: List[int] = []
+        self._row_of: Dict[int, int] = {}
+        self._grow(capacity)
+
+    _COLUMNS = ("ids", "bbox", "first_bbox", "velocity", "hits", "lost", "confidence",
+                "created_at", "last_seen", "alive", "centroids", "n_centroids", "kf_mean", "kf_cov")
+
+    def _grow(self, capacity: int):
+        """Amplía todas las columnas a la nueva capacidad conservando las filas existentes."""
+        old = self.capacity
+        for name in self._COLUMNS:
+            col = getattr(self, name)
+            new = np.zeros((capacity,) + col.shape[1:], dtype=col.dtype)
+            new[:old] = col
+            setattr(self, name, new)
+        for store in (self.hists, self.has_hist):
+            for name, col in store.items():
+                new = np.zeros((capacity,) + col.shape[1:], dtype=col.dtype)
+                new[:old] = col
+                store[name] = new
+        self._free.extend(range(capacity - 1, old - 1, -1))
+        self.capacity = capacity
+
+    def __len__(self) -> int:
+        return len(self._row_of)
+
+    # ---------------------------- altas / bajas ----------------------------
+
+    def add(self, track_id: int, bbox: BBox, confidence: float, now: Optional[float] = None) -> int:
+        """Reserva una fila para un track nuevo y devuelve su índice."""
+        if not self._free:
+            self._grow(max(1, 2 * self.capacity))
+        row = self._free.pop()
+        now = time.time() if now is None else now
+        self.ids[row] = track_id
+        self.bbox[row] = bbox
+        self.first_bbox[row] = bbox
+        self.velocity[row] = 0.0
+        self.hits[row] = 1
+        self.lost[row] = 0
+        self.confidence[row] = confidence
+        self.created_at[row] = now
+        self.last_seen[row] = now
+        self.n_centroids[row] = 0
+        self.alive[row] = True
+        for name in self.has_hist:
+            self.has_hist[name][row] = False
+        self._row_of[track_id] = row
+        return row
+
+    def remove(self, rows: np.ndarray):
+        """Libera las filas indicadas (vector de índices)."""
+        rows = np.asarray(rows, dtype=np.intp)
+        self.alive[rows] = False
+        for tid in self.ids[rows].tolist():
+            del self._row_of[tid]
+        self._free.extend(rows.tolist())
+
+    # ---------------------------- consultas ----------------------------
+
+    def row_of(self, track_id: int) -> int:
+        return self._row_of[track_id]
+
+    def rows_of(self, track_ids: Iterable[int]) -> np.ndarray:
+        return np.fromiter((self._row_of[tid] for tid in track_ids), dtype=np.intp)
+
+    def active_rows(self) -> np.ndarray:
+        return np.flatnonzero(self.alive)
+
+    def expired(self, max_lost: int) -> np.ndarray:
+        """Filas de tracks vivos con más de max_lost frames sin detección."""
+        return np.flatnonzero(self.alive & (self.lost > max_lost))
+
+    def mark_missed(self, rows: np.ndarray):
+        self.lost[np.asarray(rows, dtype=np.intp)] += 1
+
+    # ---------------------------- centroides ----------------------------
+
+    def push_centroid(self, row: int, point: Tuple[float, float]):
+        self.centroids[row, self.n_centroids[row] % self.history] = point
+        self.n_centroids[row] += 1
+
+    def move(self, rows: np.ndarray, shifts: np.ndarray):
+        """
+        Desplaza los tracks de las filas indicadas (R,) según shifts (R,2) sin tocar hits/lost:
+        propagación entre inferencias. El centroide acumula el desplazamiento exacto (float) y el
+        bbox lo sigue redondeado, para no perder movimientos de menos de un píxel por frame.
+        """
+        rows = np.asarray(rows, dtype=np.intp)
+        shifts = np.asarray(shifts, dtype=np.float64).reshape(-1, 2)
+        has_last = self.n_centroids[rows] > 0
+        last = self.centroids[rows, (self.n_centroids[rows] - 1) % self.history]
+        box_center = 0.5 * (self.bbox[rows, :2] + self.bbox[rows, 2:])
+        center = np.where(has_last[:, None], last, box_center) + shifts
+        offset = np.rint(center - box_center).astype(np.int64)
+        self.bbox[rows] += np.hstack([offset, offset])
+        self.centroids[rows, self.n_centroids[rows] % self.history] = center
+        self.n_centroids[rows] += 1
+        self.velocity[rows] = shifts
+
+    def centroid_count(self, rows) -> np.ndarray:
+        return np.minimum(self.n_centroids[rows], self.history)
+
+    def last_centroids(self, rows: np.ndarray, k: int) -> np.ndarray:
+        """
+        Últimos k centroides de cada fila en orden cronológico, (R,k,2).
+        Si un track tiene menos de k, las primeras posiciones no son válidas (ver centroid_count).
+        """
+        rows = np.asarray(rows, dtype=np.intp)
+        offs = np.arange(-k, 0)
+        pos = (self.n_centroids[rows][:, None] + offs[None, :]) % self.history
+        return self.centroids[rows[:, None], pos]
+
+    # ---------------------------- histogramas ----------------------------
+
+    def get_hist(self, name: str, row: int) -> Optional[np.ndarray]:
+        if name not in self.hists or not self.has_hist[name][row]:
+            return None
+        return self.hists[name][row]
+
+    def set_hist(self, name: str, row: int, value: Optional[np.ndarray]):
+        if value is None:
+            if name in self.has_hist:
+                self.has_hist[name][row] = False
+            return
+        value = np.asarray(value, dtype=np.float32).ravel()
+        if name not in self.hists:
+            self.hists[name] = np.zeros((self.capacity, len(value)), dtype=np.float32)
+            self.has_hist[name] = np.zeros((self.capacity,), dtype=bool)
+        self.hists[name][row] = value
+        self.has_hist[name][row] = True
+
+    # ---------------------------- predicción ----------------------------
+
+    def predict_bboxes(self, rows: np.ndarray) -> np.ndarray:
+        """
+        Versión vectorizada de utilities.predict_bbox para varias filas: desplaza el bbox
+        según la velocidad media de los últimos (hasta 4) centroides y los frames perdidos;
+        con un solo centroide usa velocity (el prior de velocidad del track, si lo tiene).
+        Devuelve (R,4) int64.
+        """
+        rows = np.asarray(rows, dtype=np.intp)
+        boxes = self.bbox[rows].copy()
+        n = np.minimum(4, self.centroid_count(rows))
+        moving = n >= 2
+        seeded = ~moving & self.velocity[rows].any(axis=1)
+        if seeded.any():
+            r = rows[seeded]
+            d = self.velocity[r] * (1.1 * (self.lost[r] + 1))[:, None]
+            boxes[seeded] = np.trunc(self.bbox[r] + np.hstack([d, d])).astype(np.int64)
+        if not moving.any():
+            return boxes
+        r = rows[moving]
+        recent = self.last_centroids(r, 4)
+        first = recent[np.arange(len(r)), 4 - n[moving]]
+        # la suma de diferencias consecutivas es (último - primero); se divide por n como en predict_bbox
+        vel = (recent[:, -1] - first) / n[moving][:, None]
+        factor = 1.1 * (self.lost[r] + 1)
+        d = vel * factor[:, None]
+        shift = np.hstack([d, d])
+        boxes[moving] = np.trunc(self.bbox[r] + shift).astype(np.int64)
+        return boxes
+
+
+class CentroidHistory:
+    """Vista de solo los últimos centroides de un track; se usa como una lista acotada."""
+    __slots__ = ("_table", "_row")
+
+    def __init__(self, table: TrackTable, row: int):
+        self._table = table
+        self._row = row
+
+    def __len__(self) -> int:
+        return int(min(self._table.n_centroids[self._row], self._table.history))
+
+    def _ordered(self) -> np.ndarray:
+        n = len(self)
+        if n == 0:
+            return np.zeros((0, 2))
+        return self._table.last_centroids(np.array([self._row]), n)[0]
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [(float(x), float(y)) for x, y in self._ordered()[idx]]
+        n = len(self)
+        if idx < 0:
+            idx += n
+        if not 0 <= idx < n:
+            raise IndexError("centroid index out of range")
+        pos = (self._table.n_centroids[self._row] - n + idx) % self._table.history
+        x, y = self._table.centroids[self._row, pos]
+        return (float(x), float(y))
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def append(self, point: Tuple[float, float]):
+        self._table.push_centroid(self._row, point)
+
+
+def _column(name: str, cast):
+    def fget(self):
+        return cast(getattr(self._table, name)[self._row])
+
+    def fset(self, value):
+        getattr(self._table, name)[self._row] = value
+    return property(fget, fset)
+
+
+def _hist_column(name: str):
+    def fget(self):
+        return self._table.get_hist(name, self._row)
+
+    def fset(self, value):
+        self._table.set_hist(name, self._row, value)
+    return property(fget, fset)
+
+
 class Car:
-    track_id: int
-    bbox: BBox
-    first_bbox: BBox
-    confidence: float
-    speed_x: float = 0
-    speed_y: float = 0
-    created_at: float = field(default_factory=time.time)
-    last_seen: float = field(default_factory=time.time)
-    hits: int = 1                 # nº de veces emparejado con una detección
-    lost: int = 0                 # nº de frames consecutivos sin ser emparejado
-    centroids: List[Tuple[float, float]] = field(default_factory=list)
-    hsv_hist: Optional[np.ndarray] = None
-    grad_hist: Optional[np.ndarray] = None
-
-    def update(self, frame: np.ndarray, bbox: BBox, confidence: float):
-        self.bbox = bbox
-        self.confidence = confidence
-        self.last_seen = time.time()
-        self.hits += 1
-        self.lost = 0
-        self.centroids.append(bbox_center(bbox))
+    """
+    Vista ligera (__slots__) sobre una fila de TrackTable.
+    Mantiene la interfaz del antiguo dataclass: track_id, bbox, hits, lost, centroids, ...
+    """
+    __slots__ = ("_table", "_row")
+
+    def __init__(self, table: TrackTable, row: int):
+        self._table = table
+        self._row = row
+
+    track_id = _column("ids", int)
+    confidence = _column("confidence", float)
+    hits = _column("hits", int)
+    lost = _column("lost", int)
+    created_at = _column("created_at", float)
+    last_seen = _column("last_seen", float)
+    hsv_hist = _hist_column("hsv_hist")
+    grad_hist = _hist_column("grad_hist")
+
+    @property
+    def bbox(self) -> BBox:
+        return tuple(int(v) for v in self._table.bbox[self._row])
+
+    @bbox.setter
+    def bbox(self, value: BBox):
+        self._table.bbox[self._row] = value
+
+    @property
+    def first_bbox(self) -> BBox:
+        return tuple(int(v) for v in self._table.first_bbox[self._row])
+
+    @property
+    def speed_x(self) -> float:
+        return float(self._table.velocity[self._row, 0])
+
+    @speed_x.setter
+    def speed_x(self, value: float):
+        self._table.velocity[self._row, 0] = value
+
+    @property
+    def speed_y(self) -> float:
+        return float(self._table.velocity[self._row, 1])
+
+    @speed_y.setter
+    def speed_y(self, value: float):
+        self._table.velocity[self._row, 1] = value
+
+    @property
+    def centroids(self) -> CentroidHistory:
+        return CentroidHistory(self._table, self._row)
+
+    def update(self, frame: np.ndarray, bbox: BBox, confidence: float, now: Optional[float] = None,
+               descriptors=None):
+        """
+        Actualiza el track con una detección emparejada.
+        descriptors: cache de descriptores del frame (appearance.DetectionDescriptors); si se da,
+                     los histogramas se toman de ahí en lugar de recalcularlos sobre el recorte.
+        """
+        table, row = self._table, self._row
+        table.bbox[row] = bbox
+        table.confidence[row] = confidence
+        table.last_seen[row] = time.time() if now is None else now
+        table.hits[row] += 1
+        table.lost[row] = 0
+        table.push_centroid(row, bbox_center(bbox))
         # (opcional) refrescar histograma cada n actualizaciones para ahorrar coste
         if self.hsv_hist is None or (self.hits % 10 == 0):
-            self.hsv_hist = compute_hsv_hist(frame, bbox)
+            self.hsv_hist = descriptors.get("hsv_hist", bbox) if descriptors is not None else compute_hsv_hist(frame, bbox)
         if self.grad_hist is None or (self.hits % 10 == 0):
-            self.grad_hist = compute_grad_hist(frame, bbox)
+            self.grad_hist = descriptors.get("grad_hist", bbox) if descriptors is not None else compute_grad_hist(frame, bbox)
         self.speed_x, self.speed_y = self.calc_speed()
 
     def mark_missed(self):
-        self.lost += 1
+        self._table.lost[self._row] += 1
 
     def calc_speed(self):
         x1, y1 = self.centroids[-1]
@@ -63,11 +350,10 @@ class Car:
             return None
         # vector medio de los últimos k desplazamientos
         k = min(5, len(self.centroids) - 1)
+        recent = self.centroids[-k:]
         dy = 0.0
-        for i in range(-k, -1):
-            y_prev = self.centroids[i][1]
-            y_next = self.centroids[i + 1][1]
-            dy += (y_next - y_prev)
+        for i in range(len(recent) - 1):
+            dy += (recent[i + 1][1] - recent[i][1])
         if abs(dy) < 1e-3:
             return None
-        return "down" if dy > 0 else "up"
\ No newline at end of file
+        return "down" if dy > 0 else "up"
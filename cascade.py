@@ -0,0 +1,90 @@
+# cascade.py
+from __future__ import annotations
+from typing import List, Optional, Sequence
+import numpy as np
+from roi import RoiMosaic, Rect, merge_rois, pixel_boxes, roi_coverage, track_crops
+from tracker import Detections, yolo_result_to_detections
+from utilities import make_detections, nms
+
+
+class CascadeDetector:
+    """
+    Detección en dos niveles: una pasada barata a low_imgsz y, solo si hace falta, una pasada a
+    high_imgsz. Una caja de la pasada barata es dudosa si está cerca de una línea de conteo
+    (centro dentro de near_rois) y además tiene confianza entre low_conf y conf o es pequeña
+    (área < min_area del frame). Las zonas dudosas se repasan a alta resolución como mosaico
+    de recortes (roi.RoiMosaic) o, si cubren más de full_frame_ratio del frame, el frame entero.
+    Devuelve un solo array (N,6) de detecciones: en las zonas repasadas mandan las cajas de alta.
+    - near_rois: rectángulos alrededor de los segmentos de conteo (roi.counter_rois); None = todo el frame.
+    """
+    def __init__(self, model, conf: float = 0.5, low_imgsz: int = 416, high_imgsz: int = 960,
+                 low_conf: float = 0.25, min_area: float = 0.002, near_rois: Optional[List[Rect]] = None,
+                 full_frame_ratio: float = 0.5, classes: Optional[Sequence[int]] = None):
+        self.model = model
+        self.conf = conf
+        self.low_imgsz = low_imgsz
+        self.high_imgsz = high_imgsz
+        self.low_conf = low_conf
+        self.min_area = min_area
+        self.near_rois = near_rois
+        self.full_frame_ratio = full_frame_ratio
+        self.classes = list(classes) if classes is not None else None
+        self.frames = 0
+        self.refined_regions = 0
+        self.refined_full = 0
+
+    def _predict(self, source, imgsz: int, conf: float) -> Detections:
+        results = self.model.predict(source=source, conf=conf, imgsz=imgsz, classes=self.classes, verbose=False)
+        return yolo_result_to_detections(results[0] if results else None)
+
+    def _uncertain(self, boxes: np.ndarray, confs: np.ndarray, width: int, height: int) -> np.ndarray:
+        """Máscara de cajas dudosas cerca de las líneas de conteo."""
+        area = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1]) / float(width * height)
+        doubtful = (confs < self.conf) | (area < self.min_area)
+        if self.near_rois is None:
+            return doubtful
+        cx = 0.5 * (boxes[:, 0] + boxes[:, 2])
+        cy = 0.5 * (boxes[:, 1] + boxes[:, 3])
+        near = np.zeros(len(boxes), dtype=bool)
+        for x1, y1, x2, y2 in self.near_rois:
+            near |= (cx >= x1) & (cx < x2) & (cy >= y1) & (cy < y2)
+        return doubtful & near
+
+    def __call__(self, frame: np.ndarray) -> Detections:
+        self.frames += 1
+        height, width = frame.shape[:2]
+        low = self._predict(frame, self.low_imgsz, self.low_conf)
+        if not len(low):
+            return low
+        boxes = low[:, :4].astype(np.float64)
+        confs = low[:, 4].astype(np.float64)
+        uncertain = self._uncertain(boxes, confs, width, height)
+        if not uncertain.any():
+            return low[confs >= self.conf]
+
+        regions = merge_rois(track_crops(boxes[uncertain], width, height, context=3.0, min_side=96))
+        if roi_coverage(regions, width, height) > self.full_frame_ratio:
+            self.refined_full += 1
+            return self._predict(frame, self.high_imgsz, self.conf)
+
+        self.refined_regions += 1
+        mosaic = RoiMosaic(regions, width, height, self.high_imgsz)
+        high = self._predict(mosaic.compose(frame), mosaic.imgsz, self.conf)
+        hb, idx = mosaic.to_frame(high[:, :4])
+        parts = [make_detections(hb, high[idx, 4], high[idx, 5])]
+        # fuera de las zonas repasadas se quedan las cajas seguras de la pasada barata
+        cx = 0.5 * (boxes[:, 0] + boxes[:, 2])
+        cy = 0.5 * (boxes[:, 1] + boxes[:, 3])
+        in_region = np.zeros(len(boxes), dtype=bool)
+        for x1, y1, x2, y2 in regions:
+            in_region |= (cx >= x1) & (cx < x2) & (cy >= y1) & (cy < y2)
+        parts.append(low[~in_region & (confs >= self.conf)])
+        dets = np.concatenate(parts)
+        dets = dets[nms(dets[:, :4], dets[:, 4], 0.5)]
+        dets[:, :4] = pixel_boxes(dets[:, :4])
+        return dets
+
+    def summary(self) -> str:
+        n = max(self.frames, 1)
+        return (f"Cascada: {self.frames} inferencias | alta resolución en zonas: {self.refined_regions} "
+                f"({self.refined_regions / n:.0%}) | frame completo: {self.refined_full} ({self.refined_full / n:.0%})")
@@ -0,0 +1,192 @@
+# detection_cache.py
+from __future__ import annotations
+import hashlib
+import json
+import re
+import shutil
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+import numpy as np
+from stats import frame_time, recording_start
+
+CACHE_VERSION = 2
+CHUNK_FRAMES = 4096    # frames por trozo (cada trozo son dos .npy que se abren con mmap)
+_FINGERPRINT_BLOCK = 4 << 20
+
+# una fila por frame: índice en el vídeo, PTS (ms, NaN si no hay) y filas [start, start+count)
+# del array de detecciones del mismo trozo; count = -1 si en ese frame no hubo detección
+FRAME_DTYPE = np.dtype([("frame", "<i8"), ("pts", "<f8"), ("start", "<i8"), ("count", "<i4")])
+
+# argumentos que cambian qué se detecta y en qué frames (forman parte de la clave)
+DETECTION_ARGS = ("conf", "imgsz", "skip", "roi", "roi_margin", "cascade", "low_imgsz", "cascade_conf",
+                  "decoder", "decode_scale", "dir_fps")
+
+# modos en los que qué frames se detectan (o dónde) depende del estado del tracker al grabar, o
+# que necesitan los frames para reproducirse (--flow): sus detecciones no valen con otro tracker
+TRACKER_DEPENDENT = {"adaptive": "--adaptive", "track_crops": "--track-crops", "motion_gate": "--motion-gate",
+                     "tiles": "--tiles", "flow": "--flow"}
+
+
+def tracker_dependent(args, tile_spec: Optional[str] = None) -> List[str]:
+    """Opciones activas incompatibles con la caché de detecciones (tile_spec: TILE_CONFIG de la cámara)."""
+    found = [flag for name, flag in TRACKER_DEPENDENT.items()
+             if getattr(args, name, None) not in (None, False, "off")]
+    if tile_spec and "--tiles" not in found:
+        found.append("--tiles")
+    return found
+
+
+def fingerprint(spec) -> str:
+    """
+    Huella barata de un fichero (tamaño + primeros y últimos 4 MiB), de un directorio de imágenes
+    (nombres y tamaños) o, para URLs y fuentes sintéticas, del propio texto.
+    """
+    h = hashlib.sha1()
+    path = Path(str(spec))
+    if path.is_file():
+        size = path.stat().st_size
+        h.update(str(size).encode())
+        with open(path, "rb") as f:
+            h.update(f.read(_FINGERPRINT_BLOCK))
+            if size > _FINGERPRINT_BLOCK:
+                f.seek(max(size - _FINGERPRINT_BLOCK, _FINGERPRINT_BLOCK))
+                h.update(f.read())
+    elif path.is_dir():
+        for p in sorted(path.iterdir()):
+            h.update(f"{p.name}:{p.stat().st_size};".encode())
+    else:
+        h.update(str(spec).encode())
+    return h.hexdigest()
+
+
+def cache_settings(args, camera_id: str = "camara_1") -> Dict:
+    """Lo que identifica una grabación: vídeo, modelo y parámetros de detección."""
+    weights = getattr(args, "weights", None)
+    settings = {"version": CACHE_VERSION, "video": fingerprint(args.video),
+                "weights": fingerprint(weights) if weights else None, "camera_id": camera_id}
+    settings.update({name: getattr(args, name, None) for name in DETECTION_ARGS})
+    return settings
+
+
+def cache_path(args, camera_id: str = "camara_1") -> Path:
+    """Directorio de la caché de detecciones de esta ejecución: --det-cache/<stem>_<clave>."""
+    settings = cache_settings(args, camera_id)
+    key = hashlib.sha1(json.dumps(settings, sort_keys=True).encode()).hexdigest()[:16]
+    stem = re.sub(r"[^\w.-]+", "_", Path(str(args.video)).stem) or "source"
+    return Path(args.det_cache) / f"{stem}_{key}"
+
+
+class DetectionRecorder:
+    """
+    Graba las detecciones crudas de cada frame (frame, PTS, x1, y1, x2, y2, conf, cls) en
+    trozos de CHUNK_FRAMES frames: frames_NNNNN.npy (FRAME_DTYPE) y dets_NNNNN.npy ((M,6) float32).
+    Se escribe en <path>.partial y al cerrar se añade meta.json y se renombra a <path>, así que
+    un directorio sin .partial siempre está completo.
+    """
+    def __init__(self, path: Path, settings: Dict, width: int, height: int, fps: float):
+        self.path = Path(path)
+        self._tmp = self.path.with_name(self.path.name + ".partial")
+        shutil.rmtree(self._tmp, ignore_errors=True)
+        self._tmp.mkdir(parents=True)
+        self.meta = {"settings": settings, "width": width, "height": height, "fps": fps}
+        self._frames = np.zeros(CHUNK_FRAMES, dtype=FRAME_DTYPE)
+        self._dets: List[np.ndarray] = []
+        self._n = 0
+        self._rows = 0
+        self.chunks = 0
+        self.frames = 0
+        self.detections = 0
+
+    def add(self, frame_idx: int, pts: Optional[float], detections: Optional[np.ndarray]):
+        """Una fila por frame; detections=None si en ese frame no se ha detectado."""
+        count = -1
+        if detections is not None:
+            detections = np.asarray(detections, dtype=np.float32).reshape(-1, 6)
+            count = len(detections)
+            self._dets.append(detections)
+        self._frames[self._n] = (frame_idx, np.nan if pts is None else pts, self._rows, count)
+        self._rows += max(count, 0)
+        self._n += 1
+        if self._n == CHUNK_FRAMES:
+            self._flush()
+
+    def _flush(self):
+        if not self._n:
+            return
+        dets = np.concatenate(self._dets) if self._dets else np.zeros((0, 6), dtype=np.float32)
+        np.save(self._tmp / f"frames_{self.chunks:05d}.npy", self._frames[:self._n])
+        np.save(self._tmp / f"dets_{self.chunks:05d}.npy", dets)
+        self.chunks += 1
+        self.frames += self._n
+        self.detections += len(dets)
+        self._dets, self._n, self._rows = [], 0, 0
+
+    def close(self):
+        self._flush()
+        self.meta.update({"chunks": self.chunks, "frames": self.frames, "detections": self.detections})
+        with open(self._tmp / "meta.json", "w") as f:
+            json.dump(self.meta, f, indent=1)
+        shutil.rmtree(self.path, ignore_errors=True)
+        self._tmp.rename(self.path)
+
+    def summary(self) -> str:
+        return f"Caché de detecciones: {self.frames} frames, {self.detections} detecciones -> {self.path}"
+
+
+class DetectionCache:
+    """Lectura de una grabación de DetectionRecorder; los trozos se abren con mmap (sin cargarlos)."""
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        meta_path = self.path / "meta.json"
+        if not meta_path.is_file():
+            raise FileNotFoundError(f"No hay caché de detecciones en {self.path}")
+        with open(meta_path) as f:
+            self.meta = json.load(f)
+        self.width = self.meta["width"]
+        self.height = self.meta["height"]
+        self.fps = self.meta["fps"]
+
+    def __len__(self) -> int:
+        return self.meta["frames"]
+
+    def __iter__(self) -> Iterator[Tuple[int, Optional[float], Optional[np.ndarray]]]:
+        """(frame_idx, pts o None, detecciones (N,6) o None); las detecciones son vistas del mmap."""
+        for c in range(self.meta["chunks"]):
+            frames = np.load(self.path / f"frames_{c:05d}.npy", mmap_mode="r")
+            dets = np.load(self.path / f"dets_{c:05d}.npy", mmap_mode="r")
+            for frame_idx, pts, start, count in frames.tolist():
+                yield (frame_idx, None if pts != pts else pts,
+                       dets[start:start + count] if count >= 0 else None)
+
+
+def run_replay(args, tracker, camera_id: str = "camara_1"):
+    """
+    Tracking y conteo a partir de la caché grabada con --record-detections para el mismo vídeo,
+    modelo y parámetros de detección: sin YOLO y sin decodificar. Los trackers reciben frame=None
+    (sin descriptores de apariencia). ValueError con los modos de TRACKER_DEPENDENT.
+    """
+    from detection_frames import TILE_CONFIG, build_counters, report, update_counters
+    bad = tracker_dependent(args, TILE_CONFIG.get(camera_id))
+    if bad:
+        raise ValueError(f"--replay no se combina con {', '.join(bad)}: dependen del tracker o de los frames")
+    path = cache_path(args, camera_id)
+    cache = DetectionCache(path)
+    shape = (cache.height, cache.width, 3)
+    if hasattr(tracker, "_frame_shape"):
+        tracker._frame_shape = shape   # Tracker_predict: agrupación por región sin frames
+    counters = build_counters(cache.width, cache.height)
+    file_name = Path(str(args.video)).name
+    print(f"Replay: {path} ({len(cache)} frames)")
+    start_ts = recording_start(getattr(args, "recording_start", None), args.video, len(cache), cache.fps)
+    track_ids = {}
+    frames = 0
+    t0 = time.time()
+    for frame_idx, pts, detections in cache:
+        if detections is not None:
+            track_ids = tracker.update(None, detections, now=frame_time(start_ts, frame_idx, pts, cache.fps))
+        update_counters(counters, track_ids, shape, camera_id, file_name, frame_idx=frame_idx, pts=pts)
+        frames += 1
+    elapsed = time.time() - t0
+    report(frames, elapsed, None, counters)
+    return frames, elapsed, None
@@ -2,10 +2,22 @@
 import os
 import sys
 import time
+from collections import deque
 from datetime import datetime
 from pathlib import Path
 from tracker import *
+from stats import frame_time, recording_start
+from flow import FlowPropagator
+from scheduler import InferenceScheduler, MotionGate
+from roi import RoiMosaic, counter_rois, parse_rois, pixel_boxes, roi_coverage, track_crops
+from cascade import CascadeDetector
+from tiles import TiledDetector, parse_tiles
+from pipeline import FfmpegWriter, ThreadedCapture, ThreadedWriter
+from sources import (CaptureSource, FfmpegSource, FrameCacheSource, ImageDirSource, StreamSource, SyntheticSource,
+                     is_frame_cache)
+from detection_cache import DetectionRecorder, cache_path, cache_settings, tracker_dependent
 import json
+import shutil
 import subprocess
 
 from mqtt_client import AWSClient
@@ -33,8 +45,35 @@ Path(SETTINGS["weights_dir"]).mkdir(parents=True, exist_ok=True)
 PLAYBACK_OPTIONS = ["fast", "1x"]
 PLAYBACK = PLAYBACK_OPTIONS[0]  # "1x" for real-time, "fast" for as-fast-as-possible
 PERSIST_FRAMES = 3              # keep last detections visible for N frames
+CROP_MAX_LOST = 3               # --track-crops: only tracks lost for at most N updates get a crop
 # ---------------------------------------------
 
+# --- Líneas de conteo ---
+# params: argumentos de VehicleCounter | line_start/line_end: segmento activo de la línea
+# counter_type/zone: campos del evento JSON | log: prefijo del print | color/label_y: solo para el overlay
+COUNTER_CONFIG = [
+    # Contador horizontal (cuenta ambas direcciones: arriba-abajo)
+    dict(params=dict(line_position=2 / 3, margin=5, orientation='horizontal'),
+         line_start=0.0, line_end=1.0, counter_type="horizontal", zone="traffic",
+         log="[H] Evento detectado", color=(0, 255, 0), label_y=30),
+    # Línea vertical izquierda (solo cuenta der->izq): ENTRADA
+    dict(params=dict(line_position=0.3, margin=3, orientation='vertical', direction='right_to_left'),
+         line_start=0.2, line_end=0.4, counter_type="left", zone="entry",
+         log="[L] Entrada detectada", color=(255, 0, 0), label_y=90),
+    # Línea vertical derecha (solo cuenta izq->der): SALIDA
+    dict(params=dict(line_position=0.85, margin=3, orientation='vertical', direction='left_to_right'),
+         line_start=0.2, line_end=0.4, counter_type="right", zone="exit",
+         log="[R] Salida detectada", color=(0, 0, 255), label_y=120),
+]
+# ------------------------
+
+# --- Teselas por cámara (--tiles) ---
+# camera_id -> "COLSxROWS" o "x1,y1,x2,y2;..." (como --roi). Se usa si no se pasa --tiles.
+TILE_CONFIG = {
+    # "panoramica_muelle": "4x2",
+}
+# ------------------------
+
 def draw_boxes(frame, result, label_suffix=""):
     if result is None or result.boxes is None:
         return frame
@@ -65,7 +104,62 @@ def parse_args():
     p.add_argument("--conf", type=float, default=0.5)
     p.add_argument("--imgsz", type=int, default=960)
     p.add_argument("--skip", type=int, default=3, help="Run inference every N frames")
-    p.add_argument("--display", action="store_true", default=True, help="Show window (press Q to quit)")  # default ON
+    p.add_argument("--recording-start", type=str, default=None, metavar="ISO_DATETIME",
+                   help="Wall-clock time of the first frame (e.g. 2025-03-01T07:30:00) used as track time "
+                        "(default: file mtime minus its duration; now for live sources)")
+    p.add_argument("--display", action=argparse.BooleanOptionalAction, default=True,
+                   help="Show window (press Q to quit); --no-display to disable")  # default ON
+    p.add_argument("--headless", action="store_true",
+                   help="Throughput mode: no window, no overlays and no output video (only counts/events)")
+    p.add_argument("--draw-predictions", action="store_true", help="Overlay the predicted boxes used for matching")
+    p.add_argument("--flow", action="store_true",
+                   help="Propagate tracks with optical flow on skipped frames (allows a larger --skip)")
+    p.add_argument("--adaptive", action="store_true",
+                   help="Adaptive inference rate (tracks, speeds, distance to lines) instead of a fixed --skip. "
+                        "Always enables --flow: the scheduler needs per-frame track speeds")
+    p.add_argument("--min-skip", type=int, default=1, help="Adaptive mode: minimum frames between inferences")
+    p.add_argument("--max-skip", type=int, default=15, help="Adaptive mode: maximum frames between inferences")
+    p.add_argument("--schedule-log", type=str, default=None, help="Adaptive mode: JSONL log of inference decisions")
+    p.add_argument("--roi", type=str, default=None,
+                   help="Run inference only on regions of interest: 'auto' (around the counting segments) "
+                        "or 'x1,y1,x2,y2;...' (relative 0-1 or pixels)")
+    p.add_argument("--roi-margin", type=float, default=0.1, help="--roi auto: margin around each segment (fraction of frame)")
+    p.add_argument("--cascade", action="store_true",
+                   help="Two-tier detection: --low-imgsz pass, --imgsz pass only for doubtful boxes near counting lines")
+    p.add_argument("--low-imgsz", type=int, default=416, help="--cascade: inference size of the cheap pass")
+    p.add_argument("--cascade-conf", type=float, default=0.25,
+                   help="--cascade: boxes of the cheap pass between this and --conf are refined")
+    p.add_argument("--tiles", type=str, default=None,
+                   help="Tiled detection: COLSxROWS grid or 'x1,y1,x2,y2;...' tiles (default: TILE_CONFIG[camera-id])")
+    p.add_argument("--tile-overlap", type=float, default=0.2, help="--tiles grid: overlap between neighbouring tiles")
+    p.add_argument("--tile-imgsz", type=int, default=640, help="--tiles: inference size of each tile")
+    p.add_argument("--track-crops", action="store_true",
+                   help="On frames without a full pass, detect only in small crops around each live track")
+    p.add_argument("--crop-imgsz", type=int, default=160, help="--track-crops: inference size of each crop")
+    p.add_argument("--motion-gate", choices=["off", "mog2", "diff"], default="off",
+                   help="Skip inference while the scene is static (background subtraction / frame differencing)")
+    p.add_argument("--refresh", type=int, default=150, help="Motion gate / --tiles: force a full inference every N frames")
+    p.add_argument("--batch", type=int, default=1,
+                   help="Offline mode: read ahead and run N inference frames (per --skip) in one predict call")
+    p.add_argument("--threaded", action="store_true",
+                   help="Decode and encode in their own threads (bounded queues) overlapping inference")
+    p.add_argument("--queue-size", type=int, default=8, help="--threaded: frames buffered between stages")
+    p.add_argument("--encoder", choices=["auto", "ffmpeg", "opencv"], default="auto",
+                   help="Output video: H.264 piped to ffmpeg in one pass (web-ready _web.mp4) or cv2 mp4v + re-encode")
+    p.add_argument("--preset", type=str, default="veryfast", help="--encoder ffmpeg: libx264 preset")
+    p.add_argument("--crf", type=int, default=23, help="--encoder ffmpeg: libx264 CRF (lower = better quality)")
+    p.add_argument("--fragmented", action="store_true",
+                   help="--encoder ffmpeg: fragmented MP4 (playable while being written) instead of +faststart")
+    p.add_argument("--decoder", choices=["opencv", "ffmpeg"], default="opencv",
+                   help="Frame source: cv2.VideoCapture (grab() on skipped frames) or an ffmpeg rawvideo pipe")
+    p.add_argument("--decode-scale", type=float, default=1.0, help="--decoder ffmpeg: downscale inside the decoder")
+    p.add_argument("--dir-fps", type=float, default=30.0, help="Image-directory source: frames per second")
+    p.add_argument("--live", action="store_true", help="synthetic source: deliver frames in real time like a camera")
+    p.add_argument("--record-detections", action="store_true",
+                   help="Save raw per-frame detections to the detection cache (--det-cache) for --replay; not with "
+                        "--flow/--adaptive/--track-crops/--motion-gate/--tiles (they depend on tracker state or frames)")
+    p.add_argument("--det-cache", type=str, default="det_cache",
+                   help="Detection cache directory (one entry per video, model and detection settings)")
     p.add_argument("--reuse-last", action="store_true", default=True, help="Draw last detections on skipped frames")  # default True
     return p.parse_args()
 
@@ -77,10 +171,53 @@ def open_capture(video_path: Path):
         raise IOError(f"Could not open video source: {video_path}")
     return cap
 
-def prepare_writer(cap: cv2.VideoCapture, camera_id: str = "camara_1"):
-    width  = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    fps_in = cap.get(cv2.CAP_PROP_FPS) or 30.0
+def decode_step(args) -> int:
+    """
+    Cada cuántos frames hace falta decodificar uno completo: con --skip N en modo --headless y sin
+    nada que use los frames intermedios (flujo, planificador, motion gate, recortes, lotes) los
+    intermedios solo se saltan (grab / select de ffmpeg).
+    """
+    if not getattr(args, "headless", False) or args.skip <= 1:
+        return 1
+    if (getattr(args, "flow", False) or getattr(args, "adaptive", False) or getattr(args, "track_crops", False)
+            or getattr(args, "motion_gate", "off") != "off" or getattr(args, "batch", 1) > 1):
+        return 1
+    return args.skip
+
+STREAM_PREFIXES = ("rtsp://", "rtsps://", "rtmp://", "http://", "https://", "udp://", "tcp://")
+
+def open_source(spec, args):
+    """
+    Fuente de frames para process_frames según --video:
+    - rtsp://, http(s)://, ... o un número (webcam): sources.StreamSource (reconexión, último frame).
+    - "synthetic" o "synthetic:WxH@FPS": sources.SyntheticSource.
+    - directorio: sources.FrameCacheSource si es una caché de frame_cache.py; si no, sources.ImageDirSource.
+    - fichero: sources.CaptureSource (cv2) o sources.FfmpegSource (--decoder ffmpeg), con índice/PTS
+      exactos y lectura diezmada si decode_step lo permite.
+    """
+    spec = str(spec)
+    if spec.lower().startswith(STREAM_PREFIXES) or spec.isdigit():
+        url = int(spec) if spec.isdigit() else spec
+        return StreamSource(url)
+    if spec == "synthetic" or spec.startswith("synthetic:"):
+        size, _, fps = spec.partition(":")[2].partition("@")
+        w, h = (int(v) for v in size.split("x")) if size else (1280, 720)
+        return SyntheticSource(w, h, fps=float(fps) if fps else 30.0, live=getattr(args, "live", False))
+    step = decode_step(args)
+    video_path = Path(spec)
+    if video_path.is_dir():
+        if is_frame_cache(video_path):
+            return FrameCacheSource(video_path, step=step)
+        return ImageDirSource(video_path, fps=getattr(args, "dir_fps", 30.0), step=step)
+    if getattr(args, "decoder", "opencv") == "ffmpeg":
+        if not video_path.exists():
+            raise FileNotFoundError(f"Video not found: {video_path}")
+        return FfmpegSource(video_path, step=step, scale=getattr(args, "decode_scale", 1.0))
+    if getattr(args, "decode_scale", 1.0) != 1.0:
+        print("[WARN] --decode-scale solo se aplica con --decoder ffmpeg")
+    return CaptureSource(open_capture(video_path), step=step)
+
+def output_path(camera_id: str = "camara_1") -> Path:
     out_dir = Path(SETTINGS["runs_dir"]) / "cars_video"
     out_dir.mkdir(parents=True, exist_ok=True)
 
@@ -89,16 +226,48 @@ def prepare_writer(cap: cv2.VideoCapture, camera_id: str = "camara_1"):
     # sanitizar camera_id para nombre de archivo
     safe_cam = "".join(c if c.isalnum() or c in "-_" else "_" for c in str(camera_id))
     base_name = f"cars_{safe_cam}_{ts}.mp4"
+    return out_dir / base_name
 
-    out_path = out_dir / base_name
+def open_writer(out_path: Path, fps_in: float, width: int, height: int, encoder: str = "opencv",
+                preset: str = "veryfast", crf: int = 23, fragmented: bool = False):
+    """
+    Abre el writer de salida y devuelve (writer, out_path).
+    - encoder='opencv': cv2.VideoWriter mp4v y, si no se puede abrir, MJPG en .avi (luego
+      generate_web_video re-codifica a H.264).
+    - encoder='ffmpeg': H.264 en una sola pasada directamente al fichero _web (pipeline.FfmpegWriter).
+    - encoder='auto': 'ffmpeg' si está en el PATH, si no 'opencv'.
+    """
+    if encoder == "auto":
+        encoder = "ffmpeg" if shutil.which("ffmpeg") else "opencv"
+    if encoder == "ffmpeg":
+        web_path = out_path.with_name(out_path.stem + "_web.mp4")
+        writer = FfmpegWriter(web_path, fps_in, width, height, preset=preset, crf=crf, fragmented=fragmented)
+        if writer.isOpened():
+            return writer, web_path
+        print("[WARN] No se pudo lanzar ffmpeg; se usa cv2.VideoWriter")
     fourcc = cv2.VideoWriter_fourcc(*"mp4v")
     writer = cv2.VideoWriter(str(out_path), fourcc, fps_in, (width, height))
     if not writer.isOpened():
-        out_path = out_dir / base_name.replace(".mp4", ".avi")
+        out_path = out_path.with_suffix(".avi")
         fourcc = cv2.VideoWriter_fourcc(*"MJPG")
         writer = cv2.VideoWriter(str(out_path), fourcc, fps_in, (width, height))
+    return writer, out_path
+
+def writer_options(args) -> dict:
+    """Opciones de codificación de la línea de comandos para open_writer."""
+    return dict(encoder=getattr(args, "encoder", "opencv"), preset=getattr(args, "preset", "veryfast"),
+                crf=getattr(args, "crf", 23), fragmented=getattr(args, "fragmented", False))
+
+def prepare_writer(cap: cv2.VideoCapture, camera_id: str = "camara_1", **options):
+    width  = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    fps_in = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    writer, out_path = open_writer(output_path(camera_id), fps_in, width, height, **options)
     return writer, out_path, width, height, fps_in
 
+def is_web_video(path: Path) -> bool:
+    return Path(path).stem.endswith("_web")
+
 def generate_web_video(source_path: Path) -> Path | None:
     """
     Genera una versión web del vídeo (H.264, yuv420p, faststart) con sufijo _web.
@@ -190,39 +359,288 @@ def map_to_web_name(video_name: str) -> str:
     if not video_name:
         return video_name
     p = Path(video_name)
+    if is_web_video(p):
+        return p.name
     print(f"Mapping video name: {p.name}")
     web_candidate = p.with_name(p.stem + "_web" + p.suffix)
     full_web = Path(SETTINGS["runs_dir"]) / "cars_video" / web_candidate.name
     return web_candidate.name
     # return web_candidate.name if full_web.is_file() else p.name
 
+def build_counters(width: int, height: int, config=COUNTER_CONFIG):
+    """Crea los VehicleCounter de cada línea de config. Devuelve [(cfg, counter), ...]."""
+    counters = []
+    for cfg in config:
+        counter = VehicleCounter(**cfg["params"])
+        counter.set_line_position(height, width)
+        counters.append((cfg, counter))
+    return counters
+
+def update_counters(counters, tracks, frame_shape, camera_id: str, video_file: str,
+                    frame_idx: Optional[int] = None, pts: Optional[float] = None):
+    """
+    Pasa el último centroide de cada track por todas las líneas y guarda un evento por cruce.
+    frame_idx/pts: índice y PTS (ms) del frame en el vídeo original, si la fuente los da.
+    """
+    for track_id, car in tracks.items():
+        if not car.centroids:
+            continue
+        center_x, center_y = car.centroids[-1]
+        for cfg, counter in counters:
+            evento = counter.update(
+                track_id,
+                center_x=int(center_x),
+                center_y=int(center_y),
+                line_start=cfg["line_start"],
+                line_end=cfg["line_end"],
+                frame_shape=frame_shape
+            )
+            if evento:  # "forward" / "backward"
+                payload = {
+                    "camera_id": camera_id,
+                    "timestamp": int(time.time()),
+                    "iso_date": datetime.now().isoformat(),
+                    "direction": evento,
+                    "counter_type": cfg["counter_type"],
+                    "track_id": track_id,
+                    "video_file": video_file,
+                    "center_x": int(center_x),
+                    "center_y": int(center_y),
+                    "zone": cfg["zone"]
+                }
+                if frame_idx is not None:
+                    payload["frame"] = int(frame_idx)
+                if pts is not None:
+                    payload["pts_ms"] = round(float(pts), 1)
+                save_event_to_json(payload)
+                # aws.publish_event("trafico/conteo", payload)
+                print(f"{cfg['log']}: Coche {track_id} -> {evento}")
+
+def draw_overlay(frame, tracker: Tracker, counters, draw_predictions: bool = False):
+    """
+    Etapa de visualización (opcional): devuelve una copia del frame con tracks, líneas y contadores.
+    No modifica el estado del tracker ni de los contadores; en modo --headless no se llama.
+    """
+    annotated = tracker.draw_tracks(frame.copy(), min_hits=1)
+    if draw_predictions:
+        tracker.draw_predictions(annotated)
+    for cfg, counter in counters:
+        counter.draw(annotated, color=cfg["color"], label_y_start=cfg["label_y"],
+                     line_start=cfg["line_start"], line_end=cfg["line_end"])
+    return annotated
+
+def _mosaic_to_frame(detections: Detections, mosaic: RoiMosaic) -> Detections:
+    boxes, idx = mosaic.to_frame(detections[:, :4])
+    confs = detections[idx, 4].astype(np.float64)
+    # ROIs solapados: la misma caja puede salir en dos recortes
+    keep = nms(boxes, confs, 0.5)
+    return make_detections(pixel_boxes(boxes[keep]), confs[keep], detections[idx[keep], 5])
+
+def detect(model, frame, args, mosaic: RoiMosaic = None) -> Detections:
+    """
+    Inferencia YOLO: sobre el frame completo o, si hay ROIs, sobre el mosaico de sus recortes
+    (una sola llamada a predict) con las cajas devueltas a coordenadas del frame.
+    """
+    source, imgsz = (frame, args.imgsz) if mosaic is None else (mosaic.compose(frame), mosaic.imgsz)
+    results = model.predict(
+        source=source,
+        conf=args.conf,
+        imgsz=imgsz,
+        classes=[CAR_CLASS_ID],
+        verbose=False
+    )
+    result = results[0] if results else None
+    detections = yolo_result_to_detections(result)
+    if mosaic is None or not len(detections):
+        return detections
+    return _mosaic_to_frame(detections, mosaic)
+
+def detect_batch(model, frames: List[np.ndarray], args, mosaic: RoiMosaic = None) -> List[Detections]:
+    """Como detect() pero para varios frames (del mismo tamaño) en una sola llamada a predict."""
+    if not frames:
+        return []
+    sources = frames if mosaic is None else [mosaic.compose(f) for f in frames]
+    results = model.predict(
+        source=sources,
+        conf=args.conf,
+        imgsz=args.imgsz if mosaic is None else mosaic.imgsz,
+        classes=[CAR_CLASS_ID],
+        verbose=False
+    )
+    out = []
+    for result in results:
+        detections = yolo_result_to_detections(result)
+        out.append(_mosaic_to_frame(detections, mosaic) if mosaic is not None and len(detections) else detections)
+    return out
+
+def read_batch(cap: cv2.VideoCapture, model, args, size: int, start_idx: int,
+               mosaic: RoiMosaic = None) -> List[Tuple[np.ndarray, int, Optional[float], Optional[Detections]]]:
+    """
+    Lee por adelantado frames hasta reunir size frames de inferencia según --skip (o hasta el
+    final del vídeo) y los detecta en un solo lote. Devuelve [(frame, índice, pts, detecciones o
+    None)] en orden; índice y pts son los de la fuente en el momento de leer cada frame (cap.index/
+    cap.pts si los da, si no start_idx + posición y None). None en los frames que --skip no infiere.
+    """
+    out, run = [], []
+    while len(run) < size:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        idx = getattr(cap, "index", None)
+        if idx is None:
+            idx = start_idx + len(out)
+        if args.skip <= 1 or idx % args.skip == 0:
+            run.append(len(out))
+        out.append((frame, idx, getattr(cap, "pts", None), None))
+    for i, detections in zip(run, detect_batch(model, [out[i][0] for i in run], args, mosaic)):
+        out[i] = out[i][:3] + (detections,)
+    return out
+
+def detect_tracks(model, frame, args, tracker: Tracker) -> Optional[Detections]:
+    """
+    Inferencia guiada por tracks para los frames intermedios: un recorte cuadrado alrededor de la
+    caja prevista de cada track vivo, todos reescalados a crop_imgsz y en una sola llamada a predict
+    (mismo tamaño -> sin relleno extra). Devuelve detecciones en coordenadas del frame, o None si
+    no hay tracks o si los recortes costarían tanto como el frame completo.
+    """
+    height, width = frame.shape[:2]
+    size = args.crop_imgsz
+    _, boxes = tracker.predicted_boxes(max_lost=CROP_MAX_LOST)
+    if not len(boxes):
+        return None
+    rects = track_crops(boxes, width, height)
+    if len(rects) * size * size >= args.imgsz * args.imgsz * min(width, height) / max(width, height):
+        return None
+    crops = [cv2.resize(frame[y1:y2, x1:x2], (size, size)) for x1, y1, x2, y2 in rects]
+    results = model.predict(
+        source=crops,
+        conf=args.conf,
+        imgsz=size,
+        classes=[CAR_CLASS_ID],
+        verbose=False
+    )
+    parts = []
+    for result, (x1, y1, x2, y2) in zip(results, rects):
+        dets = yolo_result_to_detections(result)
+        b = dets[:, :4]
+        # caja cortada por el borde del recorte (salvo que sea el del frame): es un coche vecino
+        cut = (((b[:, 0] <= 1) & (x1 > 0)) | ((b[:, 1] <= 1) & (y1 > 0)) |
+               ((b[:, 2] >= size - 1) & (x2 < width)) | ((b[:, 3] >= size - 1) & (y2 < height)))
+        dets = dets[~cut]
+        dets[:, :4] = dets[:, :4] * ((x2 - x1) / size) + [x1, y1, x1, y1]
+        parts.append(dets)
+    dets = np.concatenate(parts) if parts else np.zeros((0, 6), dtype=np.float32)
+    if not len(dets):
+        return dets
+    # tracks cercanos comparten parte del recorte: la misma caja puede salir dos veces
+    keep = nms(dets[:, :4], dets[:, 4], 0.5)
+    dets = dets[keep]
+    dets[:, :4] = pixel_boxes(dets[:, :4])
+    return dets
+
+def report(frame_idx: int, elapsed: float, out_path, counters):
+    by_type = {cfg["counter_type"]: counter for cfg, counter in counters}
+    print(f"Frames: {frame_idx} | Elapsed: {elapsed:.1f}s ({frame_idx / max(elapsed, 1e-9):.1f} fps) | Out: {out_path}")
+    print(f"Arriba->Abajo: {by_type['horizontal'].count_forward} | Abajo->Arriba: {by_type['horizontal'].count_backward}")
+    print(f"Der->Izq: {by_type['left'].count_backward} | Izq->Der: {by_type['right'].count_forward}")
+
 def process_frames(cap: cv2.VideoCapture, writer: cv2.VideoWriter, model, args, width: int, height: int, fps_in: float,
                    out_path: Path, tracker: Tracker, camera_id: str = "camara_1"):
-    # 2. Definir nombre del archivo en la nube (usamos el mismo nombre del archivo local)
-    # out_path es un objeto Path, lo convertimos a string y cogemos solo el nombre del archivo
-    writer, out_path, width, height, fps_in = prepare_writer(cap, camera_id=camera_id)
-    file_name_in_s3 = out_path.name
-    file_name_in_s3 = map_to_web_name(file_name_in_s3)
-
-    # Contador horizontal (cuenta ambas direcciones: arriba-abajo)
-    counter_horizontal = VehicleCounter(line_position=2 / 3, margin=5, orientation='horizontal')
-    counter_horizontal.set_line_position(height)
-
-    # Línea vertical izquierda (solo cuenta der->izq)
-    counter_left = VehicleCounter(line_position=0.3, margin=3, orientation='vertical', direction='right_to_left')
-    counter_left.set_line_position(height, width)
-
-    # Línea vertical derecha (solo cuenta izq->der)
-    counter_right = VehicleCounter(line_position=0.85, margin=3, orientation='vertical', direction='left_to_right')
-    counter_right.set_line_position(height, width)
+    # En modo headless no se dibuja, no se muestra nada y no se escribe vídeo: solo tracking, conteo y eventos
+    headless = getattr(args, "headless", False)
+    display = args.display and not headless
+
+    if headless:
+        writer, out_path = None, None
+        # sin vídeo de salida: los eventos referencian el vídeo de entrada
+        file_name_in_s3 = Path(getattr(args, "video", "") or "").name
+    else:
+        # 2. Definir nombre del archivo en la nube (usamos el mismo nombre del archivo local)
+        # out_path es un objeto Path, lo convertimos a string y cogemos solo el nombre del archivo
+        writer, out_path, width, height, fps_in = prepare_writer(cap, camera_id=camera_id, **writer_options(args))
+        file_name_in_s3 = out_path.name
+        file_name_in_s3 = map_to_web_name(file_name_in_s3)
+
+    # tiempo del vídeo para created_at/last_seen de los tracks (franja horaria de Tracker_predict)
+    start_ts = recording_start(getattr(args, "recording_start", None), getattr(args, "video", None),
+                               cap.get(cv2.CAP_PROP_FRAME_COUNT), fps_in)
+
+    # decodificación y codificación en sus hilos, solapadas con inferencia y tracking
+    if getattr(args, "threaded", False):
+        cap = ThreadedCapture(cap, maxsize=args.queue_size)
+        if writer is not None:
+            writer = ThreadedWriter(writer, maxsize=args.queue_size)
+
+    counters = build_counters(width, height)
+    mosaic = None
+    roi_spec = getattr(args, "roi", None)
+    if roi_spec:
+        if roi_spec == "auto":
+            rois = counter_rois(counters, width, height, margin=args.roi_margin)
+        else:
+            rois = parse_rois(roi_spec, width, height)
+        mosaic = RoiMosaic(rois, width, height, args.imgsz)
+        print(f"ROIs: {rois} ({roi_coverage(rois, width, height):.0%} del frame) | "
+              f"mosaico {mosaic.shape[1]}x{mosaic.shape[0]}, imgsz={mosaic.imgsz}")
+    adaptive = getattr(args, "adaptive", False)
+    # el planificador adaptativo necesita velocidades por frame: implica propagar con flujo óptico
+    flow = FlowPropagator() if getattr(args, "flow", False) or adaptive else None
+    if adaptive and not getattr(args, "flow", False):
+        print("[WARN] --adaptive activa --flow (propagación con flujo óptico en los frames sin inferencia)")
+    scheduler = None
+    if adaptive:
+        scheduler = InferenceScheduler(min_interval=args.min_skip, max_interval=args.max_skip,
+                                       log_path=getattr(args, "schedule_log", None))
+    cascade = None
+    if getattr(args, "cascade", False):
+        if mosaic is not None:
+            print("[WARN] --cascade no se combina con --roi; se usa solo --roi")
+        else:
+            cascade = CascadeDetector(model, conf=args.conf, low_imgsz=args.low_imgsz, high_imgsz=args.imgsz,
+                                      low_conf=args.cascade_conf,
+                                      near_rois=counter_rois(counters, width, height, margin=args.roi_margin),
+                                      classes=[CAR_CLASS_ID])
+    tiled = None
+    tile_spec = getattr(args, "tiles", None) or TILE_CONFIG.get(camera_id)
+    if tile_spec:
+        if mosaic is not None or cascade is not None:
+            print("[WARN] --tiles no se combina con --roi/--cascade; se usa solo --tiles")
+            mosaic = cascade = None
+        tiles = parse_tiles(tile_spec, width, height, overlap=args.tile_overlap)
+        tiled = TiledDetector(model, tiles, width, height, conf=args.conf, tile_imgsz=args.tile_imgsz,
+                              refresh_interval=args.refresh, classes=[CAR_CLASS_ID])
+        print(f"Layout: {len(tiles)} teselas de {tiles[0][2] - tiles[0][0]}x{tiles[0][3] - tiles[0][1]} a imgsz={args.tile_imgsz}")
+    gate = None
+    if getattr(args, "motion_gate", "off") != "off":
+        gate = MotionGate(method=args.motion_gate, refresh_interval=args.refresh)
+
+    # lotes de varios frames: solo con la cadencia fija de --skip (el resto decide frame a frame
+    # en función del estado del tracker)
+    batch = getattr(args, "batch", 1)
+    if batch > 1 and (scheduler is not None or gate is not None or cascade is not None or tiled is not None
+                      or getattr(args, "track_crops", False)):
+        print("[WARN] --batch solo se combina con --skip/--roi; se infiere frame a frame")
+        batch = 1
+    pending = deque()
+
+    # detecciones crudas de cada frame a disco, para repetir tracking y conteo sin YOLO (--replay)
+    recorder = None
+    if getattr(args, "record_detections", False):
+        bad = tracker_dependent(args, tile_spec)
+        if bad:
+            print(f"[WARN] --record-detections no se combina con {', '.join(bad)} "
+                  "(dependen del tracker o de los frames); no se graba")
+        else:
+            recorder = DetectionRecorder(cache_path(args, camera_id), cache_settings(args, camera_id),
+                                         width, height, fps_in)
 
     frame_period = 1.0 / (fps_in if fps_in > 0 else 30.0)
     next_frame_ts = time.perf_counter() + frame_period
 
-    last_result = None
+    track_ids = {}
     frame_idx = 0
     t0 = time.time()
-    win_name = "cars" if args.display else None
+    win_name = "cars" if display else None
 
 
     # Configura esto con TUS DATOS de AWS
@@ -236,125 +654,72 @@ def process_frames(cap: cv2.VideoCapture, writer: cv2.VideoWriter, model, args,
 
 
     while True:
-        ok, frame = cap.read()
-        if not ok:
-            break
+        if batch > 1:
+            if not pending:
+                pending.extend(read_batch(cap, model, args, batch, frame_idx, mosaic))
+                if not pending:
+                    break
+            # índice y PTS guardados al leer: cap ya va varios frames por delante
+            frame, frame_idx, pts, batch_detections = pending.popleft()
+        else:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            batch_detections = None
+            # fuentes de sources.py: índice real del frame (con lectura diezmada salta de N en N)
+            if getattr(cap, "index", None) is not None:
+                frame_idx = cap.index
+            pts = getattr(cap, "pts", None)
 
         frame_shape = frame.shape  # Dimensiones del frame
 
-        if args.skip <= 1 or frame_idx % args.skip == 0:
-            results = model.predict(
-                source=frame,
-                conf=args.conf,
-                imgsz=args.imgsz,
-                classes=[CAR_CLASS_ID],
-                verbose=False
-            )
-            last_result = results[0] if results else None
-            if last_result is not None:
-                # print(f"Frame {frame_idx}: {len(last_result.boxes)} cars")
-                pass
-
-            detections = yolo_result_to_detections(last_result) if last_result is not None else []
-            track_ids = tracker.update(frame, detections)
-
-        # Actualizar los tres contadores con frame_shape y límites de línea
-        for track_id, car in track_ids.items():
-            if car.centroids:
-                center_x, center_y = car.centroids[-1]
-
-                # ----- CONTADOR HORIZONTAL (arriba <-> abajo) -----
-                evento = counter_horizontal.update(
-                    track_id,
-                    center_x=int(center_x),
-                    center_y=int(center_y),
-                    line_start=0.0,
-                    line_end=1.0,
-                    frame_shape=frame_shape
-                )
-
-                if evento:  # "forward" / "backward"
-                    payload = {
-                        "camera_id": camera_id,
-                        "timestamp": int(time.time()),
-                        "iso_date": datetime.now().isoformat(),
-                        "direction": evento,
-                        "counter_type": "horizontal",
-                        "track_id": track_id,
-                        "video_file": file_name_in_s3,
-                        "center_x": int(center_x),
-                        "center_y": int(center_y),
-                        # Para aforo no lo usamos, pero dejamos zone explícito
-                        "zone": "traffic"
-                    }
-                    save_event_to_json(payload)
-                    # aws.publish_event("trafico/conteo", payload)
-                    print(f"[H] Evento detectado: Coche {track_id} -> {evento}")
-
-                # ----- CONTADOR LEFT (entrada) -----
-                evento_left = counter_left.update(
-                    track_id,
-                    center_x=int(center_x),
-                    center_y=int(center_y),
-                    line_start=0.2,
-                    line_end=0.4,
-                    frame_shape=frame_shape
-                )
-
-                if evento_left:  # cruzó la línea izquierda en la dirección configurada
-                    payload_left = {
-                        "camera_id": camera_id,
-                        "timestamp": int(time.time()),
-                        "iso_date": datetime.now().isoformat(),
-                        "direction": evento_left,          # ej: "forward"/"backward"
-                        "counter_type": "left",
-                        "track_id": track_id,
-                        "video_file": file_name_in_s3,
-                        "center_x": int(center_x),
-                        "center_y": int(center_y),
-                        # Interpretamos línea izquierda como ENTRADA
-                        "zone": "entry"
-                    }
-                    save_event_to_json(payload_left)
-                    print(f"[L] Entrada detectada: Coche {track_id} -> {evento_left}")
-
-                # ----- CONTADOR RIGHT (salida) -----
-                evento_right = counter_right.update(
-                    track_id,
-                    center_x=int(center_x),
-                    center_y=int(center_y),
-                    line_start=0.2,
-                    line_end=0.4,
-                    frame_shape=frame_shape
-                )
-
-                if evento_right:  # cruzó la línea derecha en la dirección configurada
-                    payload_right = {
-                        "camera_id": camera_id,
-                        "timestamp": int(time.time()),
-                        "iso_date": datetime.now().isoformat(),
-                        "direction": evento_right,
-                        "counter_type": "right",
-                        "track_id": track_id,
-                        "video_file": file_name_in_s3,
-                        "center_x": int(center_x),
-                        "center_y": int(center_y),
-                        # Interpretamos línea derecha como SALIDA
-                        "zone": "exit"
-                    }
-                    save_event_to_json(payload_right)
-                    print(f"[R] Salida detectada: Coche {track_id} -> {evento_right}")
-
-        annotated = tracker.draw_tracks(frame.copy(), min_hits=1)
-
-        # Dibujar líneas con los mismos límites
-        counter_horizontal.draw(annotated, color=(0, 255, 0), label_y_start=30, line_start=0.0, line_end=1.0)
-        counter_left.draw(annotated, color=(255, 0, 0), label_y_start=90, line_start=0.2, line_end=0.4)
-        counter_right.draw(annotated, color=(0, 0, 255), label_y_start=120, line_start=0.2, line_end=0.4)
-
+        if scheduler is not None:
+            run_inference = scheduler.decide(frame_idx, tracker.store, [c for _, c in counters])
+        else:
+            run_inference = args.skip <= 1 or frame_idx % args.skip == 0
+
+        # el fondo se actualiza en todos los frames; la puerta solo decide cuando toca inferencia
+        if gate is not None:
+            gate.observe(frame)
+            if run_inference:
+                run_inference = gate.allow(frame_idx, tracker.store)
+
+        if run_inference:
+            if batch_detections is not None:
+                detections = batch_detections
+            elif tiled is not None:
+                detections = tiled(frame, frame_idx, tracker.predicted_boxes(max_lost=CROP_MAX_LOST)[1])
+            elif cascade is not None:
+                detections = cascade(frame)
+            else:
+                detections = detect(model, frame, args, mosaic)
+            track_ids = tracker.update(frame, detections, now=frame_time(start_ts, frame_idx, pts, fps_in))
+            if flow is not None:
+                flow.step(frame)
+        else:
+            # frames intermedios: detección solo alrededor de los tracks y, si no, flujo óptico
+            detections = detect_tracks(model, frame, args, tracker) if getattr(args, "track_crops", False) else None
+            if detections is not None:
+                track_ids = tracker.update(frame, detections, now=frame_time(start_ts, frame_idx, pts, fps_in))
+                if flow is not None:
+                    flow.step(frame)
+            elif flow is not None:
+                track_ids = tracker.propagate(frame, flow)
+        if recorder is not None:
+            recorder.add(frame_idx, pts, detections)
+
+        # Actualizar los contadores con frame_shape y límites de línea
+        update_counters(counters, track_ids, frame_shape, camera_id, file_name_in_s3,
+                        frame_idx=frame_idx, pts=pts)
+
+        if headless:
+            frame_idx += 1
+            continue
+
+        annotated = draw_overlay(frame, tracker, counters, getattr(args, "draw_predictions", False))
         writer.write(annotated)
 
-        if args.display:
+        if display:
             if window_closed(win_name):
                 break
             cv2.imshow(win_name, annotated)
@@ -374,17 +739,31 @@ def process_frames(cap: cv2.VideoCapture, writer: cv2.VideoWriter, model, args,
         frame_idx += 1
 
     cap.release()
-    writer.release()
-    if args.display:
+    if writer is not None:
+        writer.release()
+    if display:
         cv2.destroyAllWindows()
 
     elapsed = time.time() - t0
-    print(f"Frames: {frame_idx} | Elapsed: {elapsed:.1f}s | Out: {out_path}")
-    print(f"Arriba->Abajo: {counter_horizontal.count_forward} | Abajo->Arriba: {counter_horizontal.count_backward}")
-    print(f"Der->Izq: {counter_left.count_backward} | Izq->Der: {counter_right.count_forward}")
-
-    # Generar versión web del vídeo para el dashboard
-    web_out = generate_web_video(out_path)
+    report(frame_idx, elapsed, out_path, counters)
+    if scheduler is not None:
+        print(scheduler.summary())
+        scheduler.close()
+    if gate is not None:
+        print(gate.summary())
+    if cascade is not None:
+        print(cascade.summary())
+    if tiled is not None:
+        print(tiled.summary())
+    if recorder is not None:
+        recorder.close()
+        print(recorder.summary())
+
+    if out_path is None:
+        return frame_idx, elapsed, out_path
+
+    # Generar versión web del vídeo para el dashboard (con --encoder ffmpeg ya lo es)
+    web_out = out_path if is_web_video(out_path) else generate_web_video(out_path)
     if web_out:
         print(f"✓ Versión web generada: {web_out}")
         file_name_in_s3 = web_out.name  # a partir de aquí, nombre _web
@@ -0,0 +1,77 @@
+# flow.py
+from __future__ import annotations
+from typing import Optional, Tuple
+import cv2
+import numpy as np
+
+
+class FlowPropagator:
+    """
+    Propagación de cajas entre inferencias con Lucas-Kanade piramidal (cv2.calcOpticalFlowPyrLK).
+    Para cada caja se siguen grid x grid puntos de su zona central (todas las cajas en una sola
+    llamada) y el desplazamiento de la caja es la mediana de los puntos que pasan el control
+    ida-vuelta. Hay que llamar a step() en todos los frames (también en los de inferencia, sin
+    cajas) para que el frame anterior esté siempre al día.
+    - scale: escala de la imagen en gris sobre la que se calcula el flujo (más pequeño = más rápido).
+    - max_fb_error: error ida-vuelta máximo (px a escala original) para aceptar un punto.
+    - min_points: puntos válidos mínimos para mover una caja; si no, la caja se deja quieta.
+    """
+    def __init__(self, grid: int = 3, scale: float = 0.5, win_size: Tuple[int, int] = (15, 15),
+                 max_level: int = 3, max_fb_error: float = 1.0, min_points: int = 3):
+        self.grid = grid
+        self.scale = scale
+        self.win_size = win_size
+        self.max_level = max_level
+        self.max_fb_error = max_fb_error
+        self.min_points = min_points
+        self.criteria = (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 20, 0.03)
+        self._prev: Optional[np.ndarray] = None
+        # posiciones relativas de los puntos dentro de la caja (20%-80% en cada eje)
+        t = np.linspace(0.2, 0.8, grid) if grid > 1 else np.array([0.5])
+        gx, gy = np.meshgrid(t, t)
+        self._rel = np.stack([gx.ravel(), gy.ravel()], axis=1)   # (P,2)
+
+    def reset(self):
+        self._prev = None
+
+    def _gray(self, frame: np.ndarray) -> np.ndarray:
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        if self.scale != 1.0:
+            gray = cv2.resize(gray, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        return gray
+
+    def _points(self, boxes: np.ndarray) -> np.ndarray:
+        """Puntos a seguir de cada caja, (N*P,1,2) float32 en coordenadas de la imagen reducida."""
+        xy = boxes[:, None, :2] + self._rel[None, :, :] * (boxes[:, None, 2:] - boxes[:, None, :2])
+        return (xy * self.scale).reshape(-1, 1, 2).astype(np.float32)
+
+    def step(self, frame: np.ndarray, boxes: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Desplazamiento (N,2) de cada caja (N,4 xyxy) desde el frame anterior hasta este y
+        máscara (N,) de cajas con flujo fiable. Sin cajas solo actualiza el frame anterior.
+        """
+        gray = self._gray(frame)
+        prev, self._prev = self._prev, gray
+        n = 0 if boxes is None else len(boxes)
+        shifts = np.zeros((n, 2), dtype=np.float64)
+        ok = np.zeros((n,), dtype=bool)
+        if n == 0 or prev is None or prev.shape != gray.shape:
+            return shifts, ok
+
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        p0 = self._points(boxes)
+        lk = dict(winSize=self.win_size, maxLevel=self.max_level, criteria=self.criteria)
+        p1, st, _ = cv2.calcOpticalFlowPyrLK(prev, gray, p0, None, **lk)
+        # control ida-vuelta: el punto seguido hacia atrás debe volver a su origen
+        p0r, st_back, _ = cv2.calcOpticalFlowPyrLK(gray, prev, p1, None, **lk)
+        fb = np.linalg.norm((p0 - p0r).reshape(-1, 2), axis=1) / self.scale
+        good = (st.ravel() == 1) & (st_back.ravel() == 1) & (fb <= self.max_fb_error)
+
+        P = len(self._rel)
+        disp = ((p1 - p0).reshape(n, P, 2) / self.scale).astype(np.float64)
+        good = good.reshape(n, P)
+        ok = good.sum(axis=1) >= self.min_points
+        if ok.any():
+            d = np.where(good[ok][:, :, None], disp[ok], np.nan)
+            shifts[ok] = np.nanmedian(d, axis=1)
+        return shifts, ok
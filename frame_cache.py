@@ -0,0 +1,92 @@
+# python
+"""
+Decodifica un vídeo una sola vez a una caché de frames en disco (sources.FrameCacheSource) para
+repetir experimentos sobre el mismo clip sin volver a decodificar: los trackers de apariencia
+(Tracker_color, Tracker_grad, TrackerHíbrido) necesitan los píxeles y la caché de detecciones
+no basta. Opcionalmente reducida (--scale) y/o en gris (--gray). Ocupa W*H*C bytes por frame.
+
+Uso:
+    python frame_cache.py videos/output2.mp4 --out frame_cache/output2 --scale 0.5
+    python main.py --video frame_cache/output2 ...
+"""
+import argparse
+import json
+import shutil
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from sources import (FRAME_CACHE_FRAMES, FRAME_CACHE_INDEX, FRAME_CACHE_META, FRAME_INDEX_DTYPE, CaptureSource,
+                     FfmpegSource)
+
+
+def build_frame_cache(video, out_dir, scale: float = 1.0, gray: bool = False, step: int = 1,
+                      decoder: str = "opencv") -> dict:
+    """
+    Escribe frames.u8, index.npy y meta.json en out_dir (primero en out_dir.partial, que se
+    renombra al terminar). step guarda uno de cada step frames; con decoder='ffmpeg' el
+    diezmado y el reescalado se hacen dentro de ffmpeg. Devuelve el meta.
+    """
+    video, out_dir = Path(video), Path(out_dir)
+    if decoder == "ffmpeg":
+        src = FfmpegSource(video, step=step, scale=scale)
+        width, height = src.width, src.height
+    else:
+        cap = cv2.VideoCapture(str(video))
+        if not cap.isOpened():
+            raise FileNotFoundError(f"No se puede abrir el vídeo: {video}")
+        src = CaptureSource(cap, step=step)
+        width, height = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        if scale != 1.0:
+            # mismas dimensiones (pares) que FfmpegSource
+            width, height = max(2, int(round(width * scale / 2)) * 2), max(2, int(round(height * scale / 2)) * 2)
+    tmp = out_dir.with_name(out_dir.name + ".partial")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    index = []
+    try:
+        with open(tmp / FRAME_CACHE_FRAMES, "wb") as f:
+            while True:
+                ok, frame = src.read()
+                if not ok:
+                    break
+                if frame.shape[:2] != (height, width):
+                    frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+                if gray:
+                    frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+                f.write(np.ascontiguousarray(frame).data)
+                index.append((src.index, src.pts))
+    finally:
+        src.release()
+    np.save(tmp / FRAME_CACHE_INDEX, np.array(index, dtype=FRAME_INDEX_DTYPE))
+    meta = {"source": str(video), "width": width, "height": height, "channels": 1 if gray else 3,
+            "fps": src.fps, "frames": len(index), "scale": scale, "step": step}
+    with open(tmp / FRAME_CACHE_META, "w") as f:
+        json.dump(meta, f, indent=1)
+    shutil.rmtree(out_dir, ignore_errors=True)
+    tmp.rename(out_dir)
+    return meta
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("video", type=str)
+    p.add_argument("--out", type=str, default=None, help="Cache directory (default: frame_cache/<video stem>)")
+    p.add_argument("--scale", type=float, default=1.0, help="Downscale factor for the stored frames")
+    p.add_argument("--gray", action="store_true", help="Store single-channel frames (served as 3 equal channels)")
+    p.add_argument("--step", type=int, default=1, help="Keep one frame out of N")
+    p.add_argument("--decoder", choices=["opencv", "ffmpeg"], default="opencv")
+    args = p.parse_args()
+
+    out = Path(args.out) if args.out else Path("frame_cache") / Path(args.video).stem
+    t0 = time.perf_counter()
+    meta = build_frame_cache(args.video, out, scale=args.scale, gray=args.gray, step=args.step, decoder=args.decoder)
+    size = (out / FRAME_CACHE_FRAMES).stat().st_size
+    print(f"{meta['frames']} frames {meta['width']}x{meta['height']}x{meta['channels']} -> {out} "
+          f"({size / 2**20:.0f} MiB, {time.perf_counter() - t0:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
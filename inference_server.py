@@ -0,0 +1,108 @@
+# inference_server.py
+from __future__ import annotations
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Tuple
+
+
+class InferenceServer:
+    """
+    Un único modelo YOLO compartido por varias cámaras: cada pipeline (process_frames en su hilo,
+    con su tracker y sus contadores) usa un ServerModel en lugar del modelo, y el servidor junta
+    en un solo predict las peticiones de todas las cámaras que lleguen antes de max_wait segundos
+    desde la primera (o hasta max_batch imágenes). Las peticiones con distintos parámetros
+    (imgsz, conf, classes) van en llamadas separadas.
+    """
+    def __init__(self, model, max_batch: int = 16, max_wait: float = 0.01):
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue: "queue.Queue" = queue.Queue()
+        self._closed = False
+        self.calls = 0
+        self.images = 0
+        self.requests = 0
+        self._thread = threading.Thread(target=self._run, name="inference-server", daemon=True)
+        self._thread.start()
+
+    def client(self) -> "ServerModel":
+        return ServerModel(self)
+
+    def submit(self, images: List, params: Dict) -> Future:
+        """Encola imágenes con los parámetros de predict; el Future devuelve sus resultados en orden."""
+        if self._closed:
+            raise RuntimeError("InferenceServer cerrado")
+        future: Future = Future()
+        self._queue.put((images, params, future))
+        return future
+
+    def _collect(self) -> List[Tuple[List, Dict, Future]]:
+        """Primera petición (bloqueante) más las que lleguen antes del plazo."""
+        first = self._queue.get()
+        if first is None:
+            return []
+        batch = [first]
+        n = len(first[0])
+        deadline = time.perf_counter() + self.max_wait
+        while n < self.max_batch:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)   # se procesa lo reunido y se cierra en la siguiente vuelta
+                break
+            batch.append(item)
+            n += len(item[0])
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if not batch:
+                return
+            groups: Dict[Tuple, List[Tuple[List, Dict, Future]]] = {}
+            for item in batch:
+                key = tuple(sorted((k, tuple(v) if isinstance(v, list) else v) for k, v in item[1].items()))
+                groups.setdefault(key, []).append(item)
+            for items in groups.values():
+                images = [img for imgs, _, _ in items for img in imgs]
+                try:
+                    results = self.model.predict(source=images, **items[0][1])
+                except Exception as e:
+                    for _, _, future in items:
+                        future.set_exception(e)
+                    continue
+                self.calls += 1
+                self.images += len(images)
+                self.requests += len(items)
+                start = 0
+                for imgs, _, future in items:
+                    future.set_result(list(results[start:start + len(imgs)]))
+                    start += len(imgs)
+
+    def close(self):
+        """Procesa lo pendiente y para el hilo."""
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+            self._thread.join()
+
+    def summary(self) -> str:
+        return (f"Servidor de inferencia: {self.requests} peticiones, {self.images} imágenes en {self.calls} "
+                f"llamadas (lote medio {self.images / max(self.calls, 1):.1f})")
+
+
+class ServerModel:
+    """Sustituto del modelo YOLO para un pipeline: predict() se delega al InferenceServer."""
+    def __init__(self, server: InferenceServer):
+        self.server = server
+
+    def predict(self, source, verbose: bool = False, timeout: Optional[float] = None, **params):
+        images = list(source) if isinstance(source, (list, tuple)) else [source]
+        return self.server.submit(images, params).result(timeout=timeout)
@@ -0,0 +1,114 @@
+# kalman.py
+from __future__ import annotations
+from typing import Optional, Tuple
+import numpy as np
+
+# Cuantil 0.95 de la chi-cuadrado según los grados de libertad (para el gating de Mahalanobis)
+CHI2INV95 = {1: 3.8415, 2: 5.9915, 3: 7.8147, 4: 9.4877}
+
+
+def xyxy_to_cxcywh(boxes: np.ndarray) -> np.ndarray:
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    wh = boxes[:, 2:] - boxes[:, :2]
+    return np.hstack([boxes[:, :2] + 0.5 * wh, wh])
+
+
+def cxcywh_to_xyxy(meas: np.ndarray) -> np.ndarray:
+    meas = np.asarray(meas, dtype=np.float64).reshape(-1, 4)
+    half = 0.5 * meas[:, 2:]
+    return np.hstack([meas[:, :2] - half, meas[:, :2] + half])
+
+
+class KalmanBoxFilter:
+    """
+    Filtro de Kalman de velocidad constante sobre el estado (cx, cy, w, h, vx, vy, vw, vh),
+    con predict/update para N tracks a la vez (arrays (N,8) y (N,8,8)).
+    El ruido se escala con el tamaño de la caja (como en SORT/DeepSORT), así que un coche
+    grande y rápido tiene más incertidumbre en píxeles que uno lejano.
+    - std_position / std_velocity: desviaciones relativas al ancho/alto de la caja.
+    - init_velocity: desviación inicial de la velocidad (relativa a la caja). Es grande porque
+      con --skip un coche rápido puede moverse media caja entre dos inferencias y, si no,
+      la segunda detección quedaría fuera del gating antes de aprender su velocidad.
+    - dt: nº de pasos entre predicciones (1 = una llamada a update del tracker).
+    """
+    ndim = 4
+
+    def __init__(self, std_position: float = 1. / 20, std_velocity: float = 1. / 160,
+                 init_velocity: float = 0.5, dt: float = 1.0):
+        self.std_position = std_position
+        self.std_velocity = std_velocity
+        self.init_velocity = init_velocity
+        self.F = np.eye(2 * self.ndim)
+        self.F[:self.ndim, self.ndim:] = dt * np.eye(self.ndim)
+        self.H = np.eye(self.ndim, 2 * self.ndim)
+        self.gating_threshold = CHI2INV95[self.ndim]
+
+    def _scale(self, mean: np.ndarray) -> np.ndarray:
+        """(w, h, w, h) de cada track, (N,4), para escalar el ruido."""
+        wh = np.maximum(mean[:, 2:4], 1.0)
+        return np.hstack([wh, wh])
+
+    def initiate(self, boxes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Estado inicial a partir de cajas (N,4) xyxy: velocidad 0 con mucha incertidumbre."""
+        meas = xyxy_to_cxcywh(boxes)
+        mean = np.hstack([meas, np.zeros_like(meas)])
+        scale = self._scale(mean)
+        std = np.hstack([2 * self.std_position * scale, self.init_velocity * scale])
+        cov = np.zeros((len(mean), 8, 8))
+        idx = np.arange(8)
+        cov[:, idx, idx] = std ** 2
+        return mean, cov
+
+    def predict(self, mean: np.ndarray, cov: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Paso de predicción para todos los tracks: x = F x, P = F P F^T + Q."""
+        scale = self._scale(mean)
+        std = np.hstack([self.std_position * scale, self.std_velocity * scale])
+        mean = mean @ self.F.T
+        cov = self.F @ cov @ self.F.T
+        idx = np.arange(8)
+        cov[:, idx, idx] += std ** 2
+        return mean, cov
+
+    def project(self, mean: np.ndarray, cov: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Proyecta al espacio de medida (cx, cy, w, h): devuelve (N,4) y la innovación S (N,4,4)."""
+        std = self.std_position * self._scale(mean)
+        S = self.H @ cov @ self.H.T
+        idx = np.arange(self.ndim)
+        S[:, idx, idx] += std ** 2
+        return mean[:, :self.ndim], S
+
+    def update(self, mean: np.ndarray, cov: np.ndarray, boxes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Corrige N tracks con sus N medidas (cajas xyxy emparejadas fila a fila)."""
+        meas = xyxy_to_cxcywh(boxes)
+        proj_mean, S = self.project(mean, cov)
+        PHt = cov @ self.H.T                                   # (N,8,4)
+        # K = P H^T S^-1  ->  resolver S K^T = H P^T (S simétrica)
+        K = np.linalg.solve(S, np.transpose(PHt, (0, 2, 1))).transpose(0, 2, 1)
+        innovation = meas - proj_mean
+        mean = mean + np.einsum("nij,nj->ni", K, innovation)
+        cov = cov - K @ S @ np.transpose(K, (0, 2, 1))
+        return mean, cov
+
+    def gating_distance(self, mean: np.ndarray, cov: np.ndarray, boxes: np.ndarray,
+                        rows: Optional[np.ndarray] = None, cols: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Distancia de Mahalanobis al cuadrado entre N tracks y M cajas xyxy, (N,M);
+        (K,) solo para las parejas (rows, cols) si se dan.
+        """
+        meas = xyxy_to_cxcywh(boxes)
+        proj_mean, S = self.project(mean, cov)
+        S_inv = np.linalg.inv(S)
+        if rows is not None:
+            d = meas[cols] - proj_mean[rows]                   # (K,4)
+            return np.einsum("ki,kij,kj->k", d, S_inv[rows], d)
+        d = meas[None, :, :] - proj_mean[:, None, :]           # (N,M,4)
+        return np.einsum("nmi,nij,nmj->nm", d, S_inv, d)
+
+    def gate(self, mean: np.ndarray, cov: np.ndarray, boxes: np.ndarray,
+             rows: Optional[np.ndarray] = None, cols: Optional[np.ndarray] = None) -> np.ndarray:
+        """True si la caja cae dentro de la elipse de incertidumbre (95%) del track, (N,M) o (K,) bool."""
+        return self.gating_distance(mean, cov, boxes, rows, cols) <= self.gating_threshold
+
+    def boxes(self, mean: np.ndarray) -> np.ndarray:
+        """Cajas xyxy (N,4) del estado actual."""
+        return cxcywh_to_xyxy(mean[:, :self.ndim])
@@ -4,11 +4,15 @@ import time
 from datetime import datetime
 from pathlib import Path
 import argparse
+import threading
 
 import cv2
 from ultralytics import YOLO
 from ultralytics.utils import SETTINGS
 from detection_frames import *
+from inference_server import InferenceServer
+from mp_pipeline import run_multiprocess
+from detection_cache import run_replay
 
 def parse_main_args():
     p = argparse.ArgumentParser()
@@ -16,7 +20,7 @@ def parse_main_args():
         "--video",
         type=str,
         default=str(Path("videos") / "output2.mp4"),
-        help="Ruta del vídeo a procesar",
+        help="Vídeo, directorio de imágenes, caché de frame_cache.py, URL rtsp/http, índice de webcam o synthetic[:WxH@FPS]",
     )
     p.add_argument(
         "--camera-id",
@@ -24,22 +28,151 @@ def parse_main_args():
         default="camara_1",
         help="Identificador lógico de la cámara (se guarda en los JSON)",
     )
+    p.add_argument(
+        "--stream",
+        action="append",
+        default=None,
+        metavar="CAMERA_ID=VIDEO",
+        help="Varias cámaras en un proceso con un solo modelo (repetible); sustituye a --video/--camera-id",
+    )
+    p.add_argument("--server-batch", type=int, default=16, help="--stream: maximum images per shared predict call")
+    p.add_argument("--server-wait-ms", type=float, default=10.0,
+                   help="--stream: how long the server waits for other cameras to fill a batch")
     # reusar algunos argumentos de detection_frames.parse_args si quieres
     p.add_argument("--weights", type=str, default=str(YOLO_DIR / "weights" / "yolo11n.pt"))
     p.add_argument("--conf", type=float, default=0.5)
     p.add_argument("--imgsz", type=int, default=960)
     p.add_argument("--skip", type=int, default=3, help="Run inference every N frames")
-    p.add_argument("--display", action="store_true", default=True, help="Show window (press Q to quit)")
+    p.add_argument("--recording-start", type=str, default=None, metavar="ISO_DATETIME",
+                   help="Wall-clock time of the first frame (e.g. 2025-03-01T07:30:00) used as track time "
+                        "(default: file mtime minus its duration; now for live sources)")
+    p.add_argument("--display", action=argparse.BooleanOptionalAction, default=True,
+                   help="Show window (press Q to quit); --no-display to disable")
+    p.add_argument("--headless", action="store_true",
+                   help="Throughput mode: no window, no overlays and no output video (only counts/events)")
+    p.add_argument("--draw-predictions", action="store_true", help="Overlay the predicted boxes used for matching")
+    p.add_argument("--flow", action="store_true",
+                   help="Propagate tracks with optical flow on skipped frames (allows a larger --skip)")
+    p.add_argument("--adaptive", action="store_true",
+                   help="Adaptive inference rate (tracks, speeds, distance to lines) instead of a fixed --skip. "
+                        "Always enables --flow: the scheduler needs per-frame track speeds")
+    p.add_argument("--min-skip", type=int, default=1, help="Adaptive mode: minimum frames between inferences")
+    p.add_argument("--max-skip", type=int, default=15, help="Adaptive mode: maximum frames between inferences")
+    p.add_argument("--schedule-log", type=str, default=None, help="Adaptive mode: JSONL log of inference decisions")
+    p.add_argument("--roi", type=str, default=None,
+                   help="Run inference only on regions of interest: 'auto' (around the counting segments) "
+                        "or 'x1,y1,x2,y2;...' (relative 0-1 or pixels)")
+    p.add_argument("--roi-margin", type=float, default=0.1, help="--roi auto: margin around each segment (fraction of frame)")
+    p.add_argument("--cascade", action="store_true",
+                   help="Two-tier detection: --low-imgsz pass, --imgsz pass only for doubtful boxes near counting lines")
+    p.add_argument("--low-imgsz", type=int, default=416, help="--cascade: inference size of the cheap pass")
+    p.add_argument("--cascade-conf", type=float, default=0.25,
+                   help="--cascade: boxes of the cheap pass between this and --conf are refined")
+    p.add_argument("--tiles", type=str, default=None,
+                   help="Tiled detection: COLSxROWS grid or 'x1,y1,x2,y2;...' tiles (default: TILE_CONFIG[camera-id])")
+    p.add_argument("--tile-overlap", type=float, default=0.2, help="--tiles grid: overlap between neighbouring tiles")
+    p.add_argument("--tile-imgsz", type=int, default=640, help="--tiles: inference size of each tile")
+    p.add_argument("--track-crops", action="store_true",
+                   help="On frames without a full pass, detect only in small crops around each live track")
+    p.add_argument("--crop-imgsz", type=int, default=160, help="--track-crops: inference size of each crop")
+    p.add_argument("--motion-gate", choices=["off", "mog2", "diff"], default="off",
+                   help="Skip inference while the scene is static (background subtraction / frame differencing)")
+    p.add_argument("--refresh", type=int, default=150, help="Motion gate / --tiles: force a full inference every N frames")
+    p.add_argument("--batch", type=int, default=1,
+                   help="Offline mode: read ahead and run N inference frames (per --skip) in one predict call")
+    p.add_argument("--threaded", action="store_true",
+                   help="Decode and encode in their own threads (bounded queues) overlapping inference")
+    p.add_argument("--queue-size", type=int, default=8, help="--threaded: frames buffered between stages")
+    p.add_argument("--processes", action="store_true",
+                   help="One process per stage (decode, detect, track/count/draw, encode) sharing frames through shared memory")
+    p.add_argument("--ring-slots", type=int, default=16, help="--processes: frame slots in the shared-memory ring")
+    p.add_argument("--encoder", choices=["auto", "ffmpeg", "opencv"], default="auto",
+                   help="Output video: H.264 piped to ffmpeg in one pass (web-ready _web.mp4) or cv2 mp4v + re-encode")
+    p.add_argument("--preset", type=str, default="veryfast", help="--encoder ffmpeg: libx264 preset")
+    p.add_argument("--crf", type=int, default=23, help="--encoder ffmpeg: libx264 CRF (lower = better quality)")
+    p.add_argument("--fragmented", action="store_true",
+                   help="--encoder ffmpeg: fragmented MP4 (playable while being written) instead of +faststart")
+    p.add_argument("--decoder", choices=["opencv", "ffmpeg"], default="opencv",
+                   help="Frame source: cv2.VideoCapture (grab() on skipped frames) or an ffmpeg rawvideo pipe")
+    p.add_argument("--decode-scale", type=float, default=1.0, help="--decoder ffmpeg: downscale inside the decoder")
+    p.add_argument("--dir-fps", type=float, default=30.0, help="Image-directory source: frames per second")
+    p.add_argument("--live", action="store_true", help="synthetic source: deliver frames in real time like a camera")
+    p.add_argument("--record-detections", action="store_true",
+                   help="Save raw per-frame detections to the detection cache (--det-cache) for --replay; not with "
+                        "--flow/--adaptive/--track-crops/--motion-gate/--tiles (they depend on tracker state or frames)")
+    p.add_argument("--replay", action="store_true",
+                   help="Run trackers and counters from the detections recorded for this video/model/settings "
+                        "(no YOLO, no decoding); same restrictions as --record-detections")
+    p.add_argument("--det-cache", type=str, default="det_cache",
+                   help="Detection cache directory (one entry per video, model and detection settings)")
     p.add_argument("--reuse-last", action="store_true", default=True, help="Draw last detections on skipped frames")
     return p.parse_args()
 
+def run_streams(args):
+    """
+    Varias cámaras en un solo proceso: un hilo por cámara (captura, tracker y contadores propios)
+    y un único modelo en un InferenceServer que junta en lotes las inferencias de todas.
+    Sin ventana (OpenCV no admite ventanas desde varios hilos).
+    """
+    streams = []
+    for spec in args.stream:
+        camera_id, sep, video = spec.partition("=")
+        if not sep or not camera_id or not video:
+            print(f"--stream mal formado: {spec!r} (se espera CAMERA_ID=VIDEO)")
+            sys.exit(1)
+        try:
+            cap = open_source(video, args)
+        except Exception as e:
+            print(e)
+            sys.exit(1)
+        streams.append((camera_id, video, cap))
+
+    server = InferenceServer(init_model(args.weights), max_batch=args.server_batch,
+                             max_wait=args.server_wait_ms / 1000.0)
+    threads = []
+    for camera_id, video, cap in streams:
+        stream_args = argparse.Namespace(**vars(args))
+        stream_args.video = video
+        stream_args.display = False
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        fps_in = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        t = threading.Thread(
+            target=process_frames,
+            args=(cap, None, server.client(), stream_args, width, height, fps_in, None, Tracker_predict()),
+            kwargs=dict(camera_id=camera_id),
+            name=f"camera-{camera_id}",
+        )
+        t.start()
+        threads.append(t)
+    for t in threads:
+        t.join()
+    server.close()
+    print(server.summary())
+
 def main():
     args = parse_main_args()
+    if args.stream:
+        run_streams(args)
+        return
+
+    if args.replay:
+        try:
+            run_replay(args, Tracker_predict(), camera_id=args.camera_id)
+        except FileNotFoundError as e:
+            print(f"{e} (grábala antes con --record-detections y los mismos parámetros)")
+            sys.exit(1)
+        except ValueError as e:
+            print(e)
+            sys.exit(1)
+        return
 
-    video_path = Path(args.video)
+    if args.processes:
+        run_multiprocess(args, Tracker_predict(), camera_id=args.camera_id)
+        return
 
     try:
-        cap = open_capture(video_path)
+        cap = open_source(args.video, args)
     except Exception as e:
         print(e)
         sys.exit(1)
@@ -52,7 +185,7 @@ def main():
     fps_in = cap.get(cv2.CAP_PROP_FPS) or 30.0
 
     model = init_model(args.weights)
-    setup_display_if_needed(args.display, width, height)
+    setup_display_if_needed(args.display and not args.headless, width, height)
     tracker = Tracker_predict()
     # tracker = TrackerHíbrido(...)
 
@@ -0,0 +1,253 @@
+# mp_pipeline.py
+from __future__ import annotations
+import multiprocessing as mp
+import queue
+import time
+from multiprocessing import shared_memory
+from pathlib import Path
+from typing import Optional, Tuple
+import cv2
+import numpy as np
+from stats import frame_time, recording_start
+
+_POLL = 0.1   # s entre comprobaciones de parada/procesos caídos
+
+
+class FrameRing:
+    """
+    Anillo de slots de frame preasignados en memoria compartida (multiprocessing.shared_memory).
+    Entre procesos solo viajan índices de slot; ring[i] es un ndarray (H,W,C) sobre la memoria
+    compartida, sin copias. Quien lo crea (create=True) es el responsable de unlink().
+    """
+    def __init__(self, slots: int, shape: Tuple[int, ...], name: Optional[str] = None, create: bool = False):
+        self.slots = slots
+        self.shape = tuple(shape)
+        size = int(np.prod(self.shape)) * slots
+        self.shm = shared_memory.SharedMemory(name=name, create=create, size=size if create else 0)
+        self.owner = create
+        # frombuffer (no ndarray(buffer=...)) mantiene exportado el buffer mientras viva alguna vista:
+        # así shm.close() falla con BufferError en lugar de desmapear memoria que aún se usa
+        self._frames = np.frombuffer(self.shm.buf, dtype=np.uint8, count=size).reshape((slots,) + self.shape)
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    def __getitem__(self, slot: int) -> np.ndarray:
+        return self._frames[slot]
+
+    def close(self):
+        self._frames = None
+        try:
+            self.shm.close()
+        except BufferError:
+            pass    # quedan vistas vivas (p. ej. en el tracker); el mapeo se libera al salir del proceso
+
+    def unlink(self):
+        if self.owner:
+            self.shm.unlink()
+
+
+def _get(q, stop) -> object:
+    """q.get() que se rinde si se pide parar."""
+    while not stop.is_set():
+        try:
+            return q.get(timeout=_POLL)
+        except queue.Empty:
+            continue
+    raise InterruptedError
+
+
+def _decoder(args, video: str, info_q, ring_q, free_q, out_q, stop):
+    """
+    Abre la fuente (detection_frames.open_source), manda (ancho, alto, fps) al proceso principal
+    (o la excepción si no se puede abrir) y espera el anillo (nombre, slots, shape). Después
+    decodifica en slots libres y pasa (i, slot, índice del frame, pts) al detector; None al final.
+    Con las dimensiones manda también el instante del primer frame (stats.recording_start).
+    """
+    from detection_frames import open_source
+    try:
+        cap = open_source(video, args)
+    except Exception as e:
+        info_q.put(e)
+        return
+    ring = None
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        start_ts = recording_start(getattr(args, "recording_start", None), video, cap.get(cv2.CAP_PROP_FRAME_COUNT), fps)
+        info_q.put((int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)), fps, start_ts))
+        ring = FrameRing(*_get(ring_q, stop))
+        idx = 0
+        while not stop.is_set():
+            ok, frame = cap.read()
+            if not ok:
+                break
+            slot = _get(free_q, stop)
+            ring[slot][...] = frame
+            # fuentes de sources.py: índice en el vídeo original y PTS; si no, posición y sin PTS
+            index = getattr(cap, "index", None)
+            out_q.put((idx, slot, idx if index is None else index, getattr(cap, "pts", None)))
+            idx += 1
+        out_q.put(None)
+    except InterruptedError:
+        pass
+    finally:
+        cap.release()
+        if ring is not None:
+            ring.close()
+
+
+def _detector(args, ring_name: str, slots: int, shape, in_q, out_q, stop):
+    """Carga su propio modelo e infiere (según --skip) sobre el slot; añade al item dets (N,6) o None."""
+    from detection_frames import RoiMosaic, build_counters, counter_rois, detect, init_model, parse_rois
+    ring = FrameRing(slots, shape, name=ring_name)
+    try:
+        model = init_model(args.weights)
+        height, width = shape[:2]
+        mosaic = None
+        if getattr(args, "roi", None):
+            rois = (counter_rois(build_counters(width, height), width, height, margin=args.roi_margin)
+                    if args.roi == "auto" else parse_rois(args.roi, width, height))
+            mosaic = RoiMosaic(rois, width, height, args.imgsz)
+        while True:
+            item = _get(in_q, stop)
+            if item is None:
+                break
+            _, slot, frame_idx, _ = item
+            dets = None
+            if args.skip <= 1 or frame_idx % args.skip == 0:
+                dets = detect(model, ring[slot], args, mosaic)
+            out_q.put(item + (dets,))
+        out_q.put(None)
+    except InterruptedError:
+        pass
+    finally:
+        ring.close()
+
+
+def _writer(out_path: str, fps: float, options: dict, ring_name: str, slots: int, shape, in_q, free_q, result_q, stop):
+    """Escribe los slots anotados en orden y los devuelve al anillo."""
+    from detection_frames import open_writer
+    ring = FrameRing(slots, shape, name=ring_name)
+    height, width = shape[:2]
+    writer, path = open_writer(Path(out_path), fps, width, height, **options)
+    result_q.put(str(path))
+    try:
+        while True:
+            slot = _get(in_q, stop)
+            if slot is None:
+                break
+            writer.write(ring[slot])
+            free_q.put(slot)
+    except InterruptedError:
+        pass
+    finally:
+        writer.release()
+        ring.close()
+
+
+def _wait(q, procs):
+    """q.get() del proceso principal; falla si alguna etapa ha terminado con error."""
+    while True:
+        try:
+            return q.get(timeout=_POLL)
+        except queue.Empty:
+            dead = [p.name for p in procs if p.exitcode not in (None, 0)]
+            if dead:
+                raise RuntimeError(f"proceso(s) {dead} terminados con error")
+
+
+def run_multiprocess(args, tracker, camera_id: str = "camara_1"):
+    """
+    Variante de process_frames con un proceso por etapa: decodificación -> detección -> (proceso
+    principal) tracking, conteo y dibujo -> escritura. Los frames viven en un FrameRing de
+    --ring-slots slots; entre procesos solo pasan índices de slot y arrays (N,6) de detecciones.
+    La fuente se abre en el proceso decodificador con open_source (cualquier --video), que
+    informa del tamaño antes de crear el anillo.
+    Cada slot vuelve a la cola de libres cuando la última etapa termina con él, así que se
+    liberan en orden. Si un proceso muere o hay una excepción se paran todos y la memoria
+    compartida se libera siempre (finally). Admite --skip, --roi, --flow y --headless.
+    """
+    from detection_frames import (FlowPropagator, build_counters, draw_overlay, generate_web_video, is_web_video,
+                                  map_to_web_name, output_path, report, update_counters, writer_options)
+    headless = getattr(args, "headless", False)
+    slots = args.ring_slots
+
+    ctx = mp.get_context("spawn")   # sin fork: el modelo y los hilos de torch no se heredan
+    stop = ctx.Event()
+    info_q, ring_q, free_q, det_in, det_out, write_q, result_q = (ctx.Queue() for _ in range(7))
+    ring = None
+    procs = [ctx.Process(target=_decoder, name="decoder",
+                         args=(args, str(args.video), info_q, ring_q, free_q, det_in, stop))]
+    try:
+        procs[0].start()
+        info = _wait(info_q, procs)
+        if isinstance(info, Exception):
+            raise info
+        width, height, fps_in, start_ts = info
+        shape = (height, width, 3)
+        ring = FrameRing(slots, shape, create=True)
+        ring_q.put((slots, shape, ring.name))
+        for slot in range(slots):
+            free_q.put(slot)
+        procs.append(ctx.Process(target=_detector, name="detector",
+                                 args=(args, ring.name, slots, shape, det_in, det_out, stop)))
+        out_path = None
+        if not headless:
+            procs.append(ctx.Process(target=_writer, name="writer",
+                                     args=(str(output_path(camera_id)), fps_in, writer_options(args), ring.name, slots, shape,
+                                           write_q, free_q, result_q, stop)))
+        for p in procs[1:]:
+            p.start()
+        if not headless:
+            out_path = Path(_wait(result_q, procs))
+        file_name = map_to_web_name(out_path.name) if out_path is not None else Path(args.video).name
+
+        counters = build_counters(width, height)
+        flow = FlowPropagator() if getattr(args, "flow", False) else None
+        track_ids = {}
+        frame_idx = 0
+        t0 = time.time()
+        while True:
+            item = _wait(det_out, procs)
+            if item is None:
+                break
+            _, slot, video_idx, pts, dets = item
+            frame = ring[slot]
+            if dets is not None:
+                track_ids = tracker.update(frame, dets, now=frame_time(start_ts, video_idx, pts, fps_in))
+                if flow is not None:
+                    flow.step(frame)
+            elif flow is not None:
+                track_ids = tracker.propagate(frame, flow)
+            update_counters(counters, track_ids, frame.shape, camera_id, file_name, frame_idx=video_idx, pts=pts)
+            if headless:
+                free_q.put(slot)
+            else:
+                frame[...] = draw_overlay(frame, tracker, counters, getattr(args, "draw_predictions", False))
+                write_q.put(slot)
+            frame_idx += 1
+        if not headless:
+            write_q.put(None)
+        for p in procs:
+            p.join()
+        elapsed = time.time() - t0
+        frame = None
+        report(frame_idx, elapsed, out_path, counters)
+        if out_path is not None:
+            web_out = out_path if is_web_video(out_path) else generate_web_video(out_path)
+            if web_out:
+                print(f"✓ Versión web generada: {web_out}")
+            else:
+                print("⚠ No se ha generado versión web del vídeo (revisa ffmpeg).")
+        return frame_idx, elapsed, out_path
+    finally:
+        stop.set()
+        for p in procs:
+            p.join(timeout=5)
+            if p.is_alive():
+                p.terminate()
+                p.join()
+        if ring is not None:
+            ring.unlink()
+            ring.close()
@@ -0,0 +1,160 @@
+# pipeline.py
+from __future__ import annotations
+import queue
+import subprocess
+import threading
+from pathlib import Path
+from typing import Optional, Tuple
+import numpy as np
+
+_END = object()   # marca de fin de vídeo / de escritura
+
+
+class ThreadedCapture:
+    """
+    Decodificación en un hilo aparte: un hilo hace cap.read() y deja los frames, en orden, en una
+    cola acotada (maxsize). Si la cola está llena el hilo espera (contrapresión: no se decodifica
+    más rápido de lo que se consume). Se usa como el cv2.VideoCapture que envuelve (read, get,
+    release); si es una fuente de sources.py, index/pts acompañan a cada frame.
+    release() para el hilo aunque queden frames sin leer (salida con Q).
+    """
+    def __init__(self, cap, maxsize: int = 8):
+        self.cap = cap
+        self._queue: "queue.Queue" = queue.Queue(maxsize=maxsize)
+        self._stop = threading.Event()
+        self._error: Optional[BaseException] = None
+        self._done = False
+        self.index: Optional[int] = None
+        self.pts: Optional[float] = None
+        self._thread = threading.Thread(target=self._run, name="decoder", daemon=True)
+        self._thread.start()
+
+    def _put(self, item) -> bool:
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _run(self):
+        try:
+            while not self._stop.is_set():
+                ok, frame = self.cap.read()
+                if not ok:
+                    break
+                if not self._put((frame, getattr(self.cap, "index", None), getattr(self.cap, "pts", None))):
+                    return
+        except BaseException as e:
+            self._error = e
+        self._put(_END)
+
+    def read(self) -> Tuple[bool, Optional[np.ndarray]]:
+        if self._done:
+            return False, None
+        item = self._queue.get()
+        if item is _END:
+            self._done = True
+            if self._error is not None:
+                raise self._error
+            return False, None
+        frame, self.index, self.pts = item
+        return True, frame
+
+    def get(self, prop_id):
+        return self.cap.get(prop_id)
+
+    def isOpened(self) -> bool:
+        return self.cap.isOpened()
+
+    def release(self):
+        self._stop.set()
+        self._thread.join()
+        self.cap.release()
+
+
+class ThreadedWriter:
+    """
+    Codificación en un hilo aparte: write() deja el frame en una cola acotada y vuelve; si la cola
+    está llena, write() espera (contrapresión). El orden de escritura es el de llegada.
+    release() escribe lo pendiente, para el hilo y libera el cv2.VideoWriter.
+    """
+    def __init__(self, writer, maxsize: int = 8):
+        self.writer = writer
+        self._queue: "queue.Queue" = queue.Queue(maxsize=maxsize)
+        self._error: Optional[BaseException] = None
+        self._thread = threading.Thread(target=self._run, name="encoder", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            frame = self._queue.get()
+            if frame is _END:
+                return
+            if self._error is None:
+                try:
+                    self.writer.write(frame)
+                except BaseException as e:
+                    self._error = e   # se sigue vaciando la cola para no bloquear al productor
+
+    def write(self, frame: np.ndarray):
+        if self._error is not None:
+            raise self._error
+        self._queue.put(frame)
+
+    def release(self):
+        self._queue.put(_END)
+        self._thread.join()
+        self.writer.release()
+        if self._error is not None:
+            raise self._error
+
+
+class FfmpegWriter:
+    """
+    Codificación H.264 en una sola pasada: los frames BGR se escriben en crudo por la entrada
+    estándar de un proceso ffmpeg (libx264, yuv420p) que produce directamente el MP4 para la web.
+    Sustituye a cv2.VideoWriter (write, isOpened, release).
+    - preset/crf: velocidad/calidad de libx264.
+    - fragmented: MP4 fragmentado (se puede reproducir mientras se escribe); si no, +faststart
+      (el índice se mueve al principio al cerrar).
+    """
+    def __init__(self, out_path: Path, fps: float, width: int, height: int, preset: str = "veryfast",
+                 crf: int = 23, fragmented: bool = False, ffmpeg: str = "ffmpeg"):
+        self.out_path = Path(out_path)
+        self.shape = (height, width, 3)
+        movflags = "+frag_keyframe+empty_moov+default_base_moof" if fragmented else "+faststart"
+        cmd = [
+            ffmpeg, "-y", "-loglevel", "error",
+            "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{width}x{height}", "-r", f"{fps:g}", "-i", "-",
+            "-an", "-c:v", "libx264", "-preset", preset, "-crf", str(crf),
+            # yuv420p necesita dimensiones pares
+            "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2", "-pix_fmt", "yuv420p",
+            "-movflags", movflags, str(self.out_path),
+        ]
+        try:
+            self._proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                                          stderr=subprocess.PIPE)
+        except OSError:
+            self._proc = None
+
+    def isOpened(self) -> bool:
+        return self._proc is not None and self._proc.poll() is None
+
+    def write(self, frame: np.ndarray):
+        if frame.shape != self.shape:
+            raise ValueError(f"frame {frame.shape} != {self.shape}")
+        try:
+            self._proc.stdin.write(np.ascontiguousarray(frame).data)
+        except BrokenPipeError:
+            raise RuntimeError(f"ffmpeg ha terminado: {self._proc.stderr.read().decode(errors='replace')}")
+
+    def release(self):
+        if self._proc is None:
+            return
+        proc, self._proc = self._proc, None
+        proc.stdin.close()
+        err = proc.stderr.read()
+        if proc.wait() != 0:
+            raise RuntimeError(f"ffmpeg ha terminado con código {proc.returncode}: {err.decode(errors='replace')}")
@@ -0,0 +1,169 @@
+# roi.py
+from __future__ import annotations
+from typing import List, Sequence, Tuple
+import numpy as np
+
+Rect = Tuple[int, int, int, int]  # (x1, y1, x2, y2)
+
+
+def counter_rois(counters, width: int, height: int, margin: float = 0.1) -> List[Rect]:
+    """
+    Rectángulos de interés alrededor de los segmentos de conteo.
+    counters: [(cfg, VehicleCounter)] como devuelve detection_frames.build_counters
+    (cfg con line_start/line_end). margin: ampliación relativa al ancho/alto del frame.
+    """
+    mx, my = margin * width, margin * height
+    rois = []
+    for cfg, counter in counters:
+        if counter.line_pos is None:
+            continue
+        if counter.orientation == "horizontal":
+            x1, x2 = cfg["line_start"] * width, cfg["line_end"] * width
+            y1 = y2 = counter.line_pos
+        else:
+            y1, y2 = cfg["line_start"] * height, cfg["line_end"] * height
+            x1 = x2 = counter.line_pos
+        rois.append(clip_rect((x1 - mx, y1 - my, x2 + mx, y2 + my), width, height))
+    return merge_rois(rois)
+
+
+def parse_rois(spec: str, width: int, height: int, merge: bool = True) -> List[Rect]:
+    """
+    ROIs explícitos: "x1,y1,x2,y2;x1,y1,x2,y2;..." en coordenadas relativas (0-1)
+    o en píxeles (si algún valor es > 1). merge=False deja los solapados separados.
+    """
+    rois = []
+    for part in spec.split(";"):
+        if not part.strip():
+            continue
+        vals = [float(v) for v in part.split(",")]
+        if len(vals) != 4:
+            raise ValueError(f"ROI mal formado: {part!r} (se esperan x1,y1,x2,y2)")
+        if max(vals) <= 1.0:
+            vals = [vals[0] * width, vals[1] * height, vals[2] * width, vals[3] * height]
+        rois.append(clip_rect(vals, width, height))
+    return merge_rois(rois) if merge else rois
+
+
+def clip_rect(rect: Sequence[float], width: int, height: int) -> Rect:
+    x1, y1, x2, y2 = rect
+    return (int(max(0, np.floor(x1))), int(max(0, np.floor(y1))),
+            int(min(width, np.ceil(x2))), int(min(height, np.ceil(y2))))
+
+
+def pixel_boxes(boxes: np.ndarray) -> np.ndarray:
+    """
+    Coordenadas enteras (truncadas) de cajas devueltas al frame desde un mosaico, teselas o
+    recortes: la misma convención que yolo_result_to_detections para las del frame completo.
+    """
+    return np.trunc(boxes)
+
+
+def _area(r: Rect) -> int:
+    return max(0, r[2] - r[0]) * max(0, r[3] - r[1])
+
+
+def merge_rois(rois: List[Rect], max_growth: float = 1.2) -> List[Rect]:
+    """
+    Une los rectángulos que se solapan cuando su envolvente no es mucho mayor que ambos
+    juntos (area(union) <= max_growth * (area(a) + area(b))); si no, se dejan separados y
+    las detecciones duplicadas en la zona común se eliminan con NMS.
+    """
+    rois = [r for r in rois if _area(r) > 0]
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(rois)):
+            for j in range(i + 1, len(rois)):
+                a, b = rois[i], rois[j]
+                if a[0] >= b[2] or b[0] >= a[2] or a[1] >= b[3] or b[1] >= a[3]:
+                    continue
+                u = (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+                if _area(u) <= max_growth * (_area(a) + _area(b)):
+                    rois[i] = u
+                    del rois[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return rois
+
+
+class RoiMosaic:
+    """
+    Empaqueta los recortes de los ROIs en una sola imagen (filas de recortes separados por gap
+    píxeles grises) para hacer una única llamada a predict. Ultralytics rellena a un cuadrado
+    imgsz x imgsz los lotes con imágenes de distinto tamaño, lo que anularía el ahorro; con un
+    mosaico de área ~ suma de los ROIs el coste es proporcional a los píxeles de interés.
+    El layout se calcula una vez (los ROIs de una cámara son fijos).
+    - imgsz: el de la inferencia a frame completo; el del mosaico conserva la misma escala.
+    """
+    def __init__(self, rois: List[Rect], width: int, height: int, imgsz: int, gap: int = 16, stride: int = 32):
+        if not rois:
+            raise ValueError("RoiMosaic necesita al menos un ROI")
+        self.rois = list(rois)
+        self.gap = gap
+        max_w = max(width, max(r[2] - r[0] for r in rois))
+        # empaquetado por estanterías: de más alto a más bajo, filas de ancho máximo max_w
+        order = sorted(range(len(rois)), key=lambda i: rois[i][3] - rois[i][1], reverse=True)
+        self.offsets = [(0, 0)] * len(rois)
+        x = y = shelf_h = canvas_w = 0
+        for i in order:
+            w, h = rois[i][2] - rois[i][0], rois[i][3] - rois[i][1]
+            if x > 0 and x + w > max_w:
+                y += shelf_h + gap
+                x = shelf_h = 0
+            self.offsets[i] = (x, y)
+            x += w + gap
+            shelf_h = max(shelf_h, h)
+            canvas_w = max(canvas_w, x - gap)
+        self.shape = (y + shelf_h, canvas_w)
+        scale = imgsz / float(max(width, height))
+        self.imgsz = int(min(imgsz, max(stride, np.ceil(max(self.shape) * scale / stride) * stride)))
+
+    def compose(self, frame: np.ndarray) -> np.ndarray:
+        canvas = np.full(self.shape + frame.shape[2:], 114, dtype=frame.dtype)
+        for (x1, y1, x2, y2), (ox, oy) in zip(self.rois, self.offsets):
+            canvas[oy:oy + y2 - y1, ox:ox + x2 - x1] = frame[y1:y2, x1:x2]
+        return canvas
+
+    def to_frame(self, boxes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Pasa cajas (N,4) del mosaico a coordenadas del frame. Cada caja se asigna al recorte que
+        contiene su centro y se recorta a él. Devuelve (cajas (K,4), índices de las conservadas).
+        """
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        out = np.zeros_like(boxes)
+        keep = np.zeros((len(boxes),), dtype=bool)
+        cx = 0.5 * (boxes[:, 0] + boxes[:, 2])
+        cy = 0.5 * (boxes[:, 1] + boxes[:, 3])
+        for (x1, y1, x2, y2), (ox, oy) in zip(self.rois, self.offsets):
+            w, h = x2 - x1, y2 - y1
+            inside = ~keep & (cx >= ox) & (cx < ox + w) & (cy >= oy) & (cy < oy + h)
+            if not inside.any():
+                continue
+            b = boxes[inside] - [ox, oy, ox, oy]
+            b = np.clip(b, 0, [w, h, w, h]) + [x1, y1, x1, y1]
+            out[inside] = b
+            keep |= inside
+        idx = np.flatnonzero(keep)
+        return out[idx], idx
+
+
+def track_crops(boxes, width: int, height: int, context: float = 2.0, min_side: int = 64) -> List[Rect]:
+    """
+    Recortes cuadrados centrados en cada caja (N,4), de lado context * max(ancho, alto) de la
+    caja (al menos min_side) y desplazados para quedar dentro del frame.
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    side = np.maximum(np.max(boxes[:, 2:] - boxes[:, :2], axis=1) * context, min_side)
+    side = np.floor(np.minimum(side, min(width, height)))
+    c = 0.5 * (boxes[:, :2] + boxes[:, 2:])
+    x1 = np.clip(np.round(c[:, 0] - side / 2), 0, width - side)
+    y1 = np.clip(np.round(c[:, 1] - side / 2), 0, height - side)
+    return [(int(x), int(y), int(x + s), int(y + s)) for x, y, s in zip(x1, y1, side)]
+
+
+def roi_coverage(rois: List[Rect], width: int, height: int) -> float:
+    """Fracción del frame que cubren los ROIs (cota superior si se solapan)."""
+    return min(1.0, sum(_area(r) for r in rois) / float(width * height))
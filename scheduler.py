@@ -0,0 +1,180 @@
+# scheduler.py
+from __future__ import annotations
+import json
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+import cv2
+import numpy as np
+
+
+class InferenceScheduler:
+    """
+    Decide frame a frame si toca pasar YOLO, en lugar del módulo fijo --skip.
+    Intervalo objetivo (en frames desde la última inferencia) = el mínimo de:
+    - idle: max_interval (escena vacía o tracks parados).
+    - crowd: max_interval / (1 + nº tracks / crowd); con más tracks entran/salen más coches.
+    - new: confirm_interval mientras haya tracks con menos de confirm_hits detecciones
+      (su velocidad aún es 0 y con un intervalo largo se fragmentarían).
+    - motion: frames hasta que el track más rápido se desplace max_displacement veces su caja
+      (más allá el IoU con la predicción cae y se pierden identidades).
+    - line: frames hasta que el track más cercano que se acerca a una línea de conteo la cruce,
+      para tener una detección justo después del cruce.
+    acotado a [min_interval, max_interval]. Las velocidades son las de TrackTable y se asumen por
+    frame, es decir, con los tracks propagados con flujo óptico entre inferencias (Tracker.propagate):
+    los modelos de movimiento por update (Kalman con dt fijo, predict_bbox) no admiten intervalos
+    variables.
+    log_path: si se indica, escribe una línea JSON por inferencia (frame, motivo, intervalo...).
+    """
+    def __init__(self, min_interval: int = 1, max_interval: int = 15, max_displacement: float = 0.5,
+                 crowd: float = 20.0, confirm_hits: int = 3, confirm_interval: int = 2,
+                 log_path: Optional[Path] = None):
+        if not 1 <= min_interval <= max_interval:
+            raise ValueError("se requiere 1 <= min_interval <= max_interval")
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.max_displacement = max_displacement
+        self.crowd = crowd
+        self.confirm_hits = confirm_hits
+        self.confirm_interval = confirm_interval
+        self._last_run: Optional[int] = None
+        self.frames = 0
+        self.runs = 0
+        self.reasons: Counter = Counter()
+        self._log = open(log_path, "w", encoding="utf-8") if log_path is not None else None
+
+    def _targets(self, store, counters: Iterable) -> Dict[str, float]:
+        """Intervalo propuesto por cada señal."""
+        targets = {"idle": float(self.max_interval)}
+        rows = store.active_rows()
+        rows = rows[store.lost[rows] == 0]
+        if not len(rows):
+            return targets
+        targets["crowd"] = self.max_interval / (1.0 + len(rows) / self.crowd)
+        # tracks recién creados: aún no tienen velocidad fiable, se confirman enseguida
+        if (store.hits[rows] < self.confirm_hits).any():
+            targets["new"] = float(self.confirm_interval)
+
+        vel = store.velocity[rows]
+        boxes = store.bbox[rows].astype(np.float64)
+        size = np.maximum(boxes[:, 2:] - boxes[:, :2], 1.0)
+        speed = np.abs(vel)
+        with np.errstate(divide="ignore"):
+            t_motion = np.where(speed > 1e-6, self.max_displacement * size / speed, np.inf).min()
+        targets["motion"] = float(t_motion)
+
+        centers = 0.5 * (boxes[:, :2] + boxes[:, 2:])
+        for counter in counters:
+            if counter.line_pos is None:
+                continue
+            axis = 1 if counter.orientation == "horizontal" else 0
+            dist = counter.line_pos - centers[:, axis]
+            v = vel[:, axis]
+            approaching = dist * v > 0
+            if approaching.any():
+                ttl = np.abs(dist[approaching]) / np.abs(v[approaching])
+                targets["line"] = min(targets.get("line", np.inf), float(ttl.min()) + 1.0)
+        return targets
+
+    def decide(self, frame_idx: int, store, counters: Iterable = ()) -> bool:
+        """True si hay que ejecutar la detección en este frame."""
+        self.frames += 1
+        if self._last_run is None:
+            reason, interval, targets = "start", self.min_interval, {}
+        else:
+            targets = self._targets(store, counters)
+            reason = min(targets, key=targets.get)
+            interval = int(np.clip(np.floor(targets[reason]), self.min_interval, self.max_interval))
+            if frame_idx - self._last_run < interval:
+                return False
+        self._last_run = frame_idx
+        self.runs += 1
+        self.reasons[reason] += 1
+        if self._log is not None:
+            self._log.write(json.dumps({
+                "frame": frame_idx, "reason": reason, "interval": interval,
+                "tracks": int(len(store.active_rows())),
+                "targets": {k: round(v, 2) for k, v in targets.items() if np.isfinite(v)},
+            }) + "\n")
+        return True
+
+    def summary(self) -> str:
+        rate = self.runs / max(self.frames, 1)
+        reasons = ", ".join(f"{k}={v}" for k, v in self.reasons.most_common())
+        return f"Inferencias: {self.runs}/{self.frames} frames ({rate:.0%}) | motivos: {reasons}"
+
+    def close(self):
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+
+class MotionGate:
+    """
+    Filtro previo al detector para cámaras casi siempre estáticas (parkings, zonas de carga):
+    mantiene un modelo de fondo a baja resolución y deja pasar la inferencia solo si
+    - hay cambio en la imagen (fracción de píxeles en primer plano >= threshold) desde la última
+      comprobación,
+    - algún track vivo se está moviendo (|velocidad| >= min_track_speed px; por encima del
+      temblor típico de las cajas de un coche aparcado), o
+    - han pasado refresh_interval frames desde la última inferencia (refresco periódico).
+    observe() debe llamarse en todos los frames; allow() solo cuando la cadencia pide inferencia.
+    - method: 'mog2' (cv2.createBackgroundSubtractorMOG2) o 'diff' (diferencia con el frame anterior).
+    """
+    def __init__(self, method: str = "mog2", scale: float = 0.25, threshold: float = 0.002,
+                 refresh_interval: int = 150, min_track_speed: float = 3.0, diff_threshold: int = 25):
+        if method not in ("mog2", "diff"):
+            raise ValueError(f"method debe ser 'mog2' o 'diff', no {method!r}")
+        self.method = method
+        self.scale = scale
+        self.threshold = threshold
+        self.refresh_interval = refresh_interval
+        self.min_track_speed = min_track_speed
+        self.diff_threshold = diff_threshold
+        self._bg = cv2.createBackgroundSubtractorMOG2(history=500, varThreshold=16,
+                                                      detectShadows=False) if method == "mog2" else None
+        self._prev: Optional[np.ndarray] = None
+        self._motion = 0.0              # fracción máxima de cambio desde la última comprobación
+        self._last_run: Optional[int] = None
+        self.skipped = 0
+        self.allowed = 0
+
+    def observe(self, frame: np.ndarray) -> float:
+        """Actualiza el modelo de fondo con el frame y devuelve la fracción de píxeles cambiados."""
+        small = cv2.resize(frame, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        if self._bg is not None:
+            mask = self._bg.apply(small)
+        else:
+            gray = cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+            prev, self._prev = self._prev, gray
+            if prev is None or prev.shape != gray.shape:
+                return 0.0
+            mask = cv2.threshold(cv2.absdiff(gray, prev), self.diff_threshold, 255, cv2.THRESH_BINARY)[1]
+        fraction = cv2.countNonZero(mask) / float(mask.size)
+        self._motion = max(self._motion, fraction)
+        return fraction
+
+    def _tracks_moving(self, store) -> bool:
+        rows = store.active_rows()
+        rows = rows[store.lost[rows] == 0]
+        if not len(rows):
+            return False
+        return bool((np.linalg.norm(store.velocity[rows], axis=1) >= self.min_track_speed).any())
+
+    def allow(self, frame_idx: int, store) -> bool:
+        """True si se debe ejecutar la inferencia que la cadencia ha pedido en este frame."""
+        run = (self._last_run is None
+               or frame_idx - self._last_run >= self.refresh_interval
+               or self._motion >= self.threshold
+               or self._tracks_moving(store))
+        self._motion = 0.0
+        if run:
+            self._last_run = frame_idx
+            self.allowed += 1
+        else:
+            self.skipped += 1
+        return run
+
+    def summary(self) -> str:
+        total = self.allowed + self.skipped
+        return f"Motion gate ({self.method}): {self.skipped}/{total} inferencias evitadas"
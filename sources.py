@@ -0,0 +1,411 @@
+# sources.py
+from __future__ import annotations
+import json
+import subprocess
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Tuple
+import cv2
+import numpy as np
+
+
+class CaptureSource:
+    """
+    Lectura diezmada sobre cv2.VideoCapture: entrega un frame de cada step y en los demás solo
+    hace cap.grab() (demultiplexa y decodifica, pero sin retrieve: ni copia ni conversión de color).
+    Tras cada read(), index es el índice exacto del frame en el vídeo original y pts su instante
+    de presentación en ms (CAP_PROP_POS_MSEC; si el backend no lo da, index / fps).
+    Se usa como el cv2.VideoCapture que envuelve (read, get, release).
+    """
+    def __init__(self, cap, step: int = 1):
+        self.cap = cap
+        self.step = max(1, int(step))
+        self.fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        self.index = -1
+        self.pts: Optional[float] = None
+        self._next = 0   # índice del próximo frame que decodificará cap
+
+    def read(self) -> Tuple[bool, Optional[np.ndarray]]:
+        target = 0 if self.index < 0 else self.index + self.step
+        while self._next < target:
+            if not self.cap.grab():
+                return False, None
+            self._next += 1
+        ok, frame = self.cap.read()
+        if not ok:
+            return False, None
+        self.index = self._next
+        self._next += 1
+        pts = self.cap.get(cv2.CAP_PROP_POS_MSEC)
+        self.pts = pts if pts > 0 or self.index == 0 else self.index * 1000.0 / self.fps
+        return True, frame
+
+    def get(self, prop_id):
+        return self.cap.get(prop_id)
+
+    def isOpened(self) -> bool:
+        return self.cap.isOpened()
+
+    def release(self):
+        self.cap.release()
+
+
+def _probe(path: str) -> Tuple[int, int, float]:
+    cap = cv2.VideoCapture(path)
+    try:
+        if not cap.isOpened():
+            raise FileNotFoundError(f"No se puede abrir el vídeo: {path}")
+        return (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+                cap.get(cv2.CAP_PROP_FPS) or 30.0)
+    finally:
+        cap.release()
+
+
+class FfmpegSource:
+    """
+    Decodificación con ffmpeg a rawvideo BGR por una tubería: el filtro select deja pasar un frame
+    de cada step (los demás no llegan a convertirse ni a copiarse) y, con scale, el reescalado se
+    hace en el propio decodificador. index es el índice exacto del frame en el original (select por
+    número de frame, no por tiempo) y pts = index / fps en ms (vídeo de fps constante).
+    Expone CAP_PROP_FRAME_WIDTH/HEIGHT (ya escalados) y CAP_PROP_FPS (del original) en get().
+    """
+    def __init__(self, path, step: int = 1, scale: float = 1.0, ffmpeg: str = "ffmpeg"):
+        self.path = str(path)
+        self.step = max(1, int(step))
+        src_w, src_h, self.fps = _probe(self.path)
+        # dimensiones pares para no depender del redondeo del filtro
+        self.width = max(2, int(round(src_w * scale / 2)) * 2) if scale != 1.0 else src_w
+        self.height = max(2, int(round(src_h * scale / 2)) * 2) if scale != 1.0 else src_h
+        filters = []
+        if self.step > 1:
+            filters.append(f"select=not(mod(n\\,{self.step}))")
+        if (self.width, self.height) != (src_w, src_h):
+            filters.append(f"scale={self.width}:{self.height}:flags=area")
+        cmd = [ffmpeg, "-loglevel", "error", "-nostdin", "-i", self.path]
+        if filters:
+            cmd += ["-vf", ",".join(filters)]
+        cmd += ["-vsync", "0", "-f", "rawvideo", "-pix_fmt", "bgr24", "-"]
+        self._frame_bytes = self.width * self.height * 3
+        self._proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                      bufsize=self._frame_bytes * 2)
+        self.index = -1
+        self.pts: Optional[float] = None
+        self._count = 0
+
+    def read(self) -> Tuple[bool, Optional[np.ndarray]]:
+        if self._proc is None:
+            return False, None
+        frame = np.empty((self.height, self.width, 3), dtype=np.uint8)
+        if self._proc.stdout.readinto(memoryview(frame).cast("B")) < self._frame_bytes:
+            self.release()
+            return False, None
+        self.index = self._count * self.step
+        self._count += 1
+        self.pts = self.index * 1000.0 / self.fps
+        return True, frame
+
+    def get(self, prop_id):
+        if prop_id == cv2.CAP_PROP_FRAME_WIDTH:
+            return self.width
+        if prop_id == cv2.CAP_PROP_FRAME_HEIGHT:
+            return self.height
+        if prop_id == cv2.CAP_PROP_FPS:
+            return self.fps
+        return 0.0
+
+    def isOpened(self) -> bool:
+        return self._proc is not None
+
+    def release(self):
+        if self._proc is not None:
+            proc, self._proc = self._proc, None
+            proc.stdout.close()
+            proc.terminate()
+            proc.wait()
+
+
+class ImageDirSource:
+    """
+    Directorio de imágenes (jpg/png/bmp) en orden alfabético como si fuera un vídeo a fps.
+    Con step > 1 ni siquiera se leen del disco las imágenes saltadas.
+    """
+    EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+    def __init__(self, path, fps: float = 30.0, step: int = 1):
+        self.files = sorted(p for p in Path(path).iterdir() if p.suffix.lower() in self.EXTENSIONS)
+        if not self.files:
+            raise FileNotFoundError(f"No hay imágenes en {path}")
+        self.fps = fps
+        self.step = max(1, int(step))
+        first = cv2.imread(str(self.files[0]))
+        if first is None:
+            raise IOError(f"No se puede leer {self.files[0]}")
+        self.height, self.width = first.shape[:2]
+        self.index = -1
+        self.pts: Optional[float] = None
+
+    def read(self) -> Tuple[bool, Optional[np.ndarray]]:
+        idx = 0 if self.index < 0 else self.index + self.step
+        while idx < len(self.files):
+            frame = cv2.imread(str(self.files[idx]))
+            if frame is not None:
+                if frame.shape[:2] != (self.height, self.width):
+                    frame = cv2.resize(frame, (self.width, self.height))
+                self.index = idx
+                self.pts = idx * 1000.0 / self.fps
+                return True, frame
+            idx += 1   # imagen corrupta: se salta
+        return False, None
+
+    def get(self, prop_id):
+        return {cv2.CAP_PROP_FRAME_WIDTH: self.width, cv2.CAP_PROP_FRAME_HEIGHT: self.height,
+                cv2.CAP_PROP_FPS: self.fps, cv2.CAP_PROP_FRAME_COUNT: len(self.files)}.get(prop_id, 0.0)
+
+    def isOpened(self) -> bool:
+        return True
+
+    def release(self):
+        pass
+
+
+# caché de frames decodificados (frame_cache.py): frames.u8 en crudo (N,H,W,C) uint8,
+# index.npy con el índice y el PTS de cada frame en el vídeo original, y meta.json
+FRAME_CACHE_FRAMES = "frames.u8"
+FRAME_CACHE_INDEX = "index.npy"
+FRAME_CACHE_META = "meta.json"
+FRAME_INDEX_DTYPE = np.dtype([("frame", "<i8"), ("pts", "<f8")])
+
+
+def is_frame_cache(path) -> bool:
+    path = Path(path)
+    return (path / FRAME_CACHE_META).is_file() and (path / FRAME_CACHE_FRAMES).is_file()
+
+
+class FrameCacheSource:
+    """
+    Frames ya decodificados de una caché de frame_cache.py, leídos con mmap: read() y cache[i]
+    devuelven vistas de solo lectura del fichero, sin decodificar ni copiar. Las cachés en gris
+    se sirven como (H,W,3) con los tres canales sobre el mismo dato (np.broadcast_to).
+    index/pts son los del frame en el vídeo original. step cuenta frames del vídeo original, como en
+    las demás fuentes: si la caché se hizo con --step N se diezma cada step // N posiciones, y si
+    step no es múltiplo de N no se diezma (process_frames decide por index).
+    set(cv2.CAP_PROP_POS_FRAMES, i) salta a la posición i de la caché.
+    """
+    def __init__(self, path, step: int = 1):
+        self.path = Path(path)
+        with open(self.path / FRAME_CACHE_META) as f:
+            self.meta = json.load(f)
+        self.width, self.height = self.meta["width"], self.meta["height"]
+        self.channels = self.meta["channels"]
+        self.fps = self.meta["fps"]
+        step, cache_step = max(1, int(step)), max(1, int(self.meta.get("step", 1)))
+        self.step = step // cache_step if step % cache_step == 0 else 1
+        self._index = np.load(self.path / FRAME_CACHE_INDEX)
+        shape = (len(self._index), self.height, self.width, self.channels)
+        self._frames = np.memmap(self.path / FRAME_CACHE_FRAMES, dtype=np.uint8, mode="r", shape=shape)
+        self._pos = 0
+        self.index = -1
+        self.pts: Optional[float] = None
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __getitem__(self, pos: int) -> np.ndarray:
+        frame = self._frames[pos]
+        if self.channels == 1:
+            return np.broadcast_to(frame, (self.height, self.width, 3))
+        return frame
+
+    def read(self) -> Tuple[bool, Optional[np.ndarray]]:
+        if self._frames is None or self._pos >= len(self._index):
+            return False, None
+        pos = self._pos
+        self._pos += self.step
+        self.index = int(self._index["frame"][pos])
+        self.pts = float(self._index["pts"][pos])
+        return True, self[pos]
+
+    def set(self, prop_id, value) -> bool:
+        if prop_id == cv2.CAP_PROP_POS_FRAMES:
+            self._pos = max(0, int(value))
+            return True
+        return False
+
+    def get(self, prop_id):
+        return {cv2.CAP_PROP_FRAME_WIDTH: self.width, cv2.CAP_PROP_FRAME_HEIGHT: self.height,
+                cv2.CAP_PROP_FPS: self.fps, cv2.CAP_PROP_FRAME_COUNT: len(self._index),
+                cv2.CAP_PROP_POS_FRAMES: self._pos}.get(prop_id, 0.0)
+
+    def isOpened(self) -> bool:
+        return self._frames is not None
+
+    def release(self):
+        self._frames = None
+
+
+class SyntheticSource:
+    """
+    Generador de frames sintéticos (rectángulos de colores que cruzan la imagen en ambos ejes) para
+    probar el pipeline sin vídeo ni cámara. frames=None: infinito. live=True: entrega los frames al
+    ritmo de fps, como una cámara (para probar StreamSource y la política del último frame).
+    """
+    def __init__(self, width: int = 1280, height: int = 720, fps: float = 30.0, frames: Optional[int] = None,
+                 cars: int = 8, live: bool = False, seed: int = 0):
+        self.width, self.height, self.fps = width, height, fps
+        self.frames = frames
+        self.live = live
+        rng = np.random.default_rng(seed)
+        self._size = rng.integers([40, 30], [120, 80], size=(cars, 2))
+        self._speed = rng.uniform(2.0, 8.0, size=cars) * rng.choice([-1, 1], size=cars)
+        self._axis = rng.integers(0, 2, size=cars)           # 0: horizontal, 1: vertical
+        self._lane = rng.uniform(0.1, 0.9, size=cars)
+        self._phase = rng.uniform(0, 1, size=cars)
+        self._color = rng.integers(0, 256, size=(cars, 3))
+        self.index = -1
+        self.pts: Optional[float] = None
+        self._t0: Optional[float] = None
+
+    def read(self) -> Tuple[bool, Optional[np.ndarray]]:
+        idx = self.index + 1
+        if self.frames is not None and idx >= self.frames:
+            return False, None
+        if self.live:
+            now = time.perf_counter()
+            if self._t0 is None:
+                self._t0 = now
+            delay = self._t0 + idx / self.fps - now
+            if delay > 0:
+                time.sleep(delay)
+        frame = np.full((self.height, self.width, 3), 110, dtype=np.uint8)
+        for (w, h), v, axis, lane, phase, color in zip(self._size, self._speed, self._axis, self._lane,
+                                                       self._phase, self._color):
+            span = (self.width if axis == 0 else self.height) + 2 * max(w, h)
+            pos = (phase * span + v * idx) % span - max(w, h)
+            x, y = (pos, lane * self.height) if axis == 0 else (lane * self.width, pos)
+            cv2.rectangle(frame, (int(x), int(y)), (int(x + w), int(y + h)), tuple(int(c) for c in color), -1)
+        self.index = idx
+        self.pts = idx * 1000.0 / self.fps
+        return True, frame
+
+    def get(self, prop_id):
+        return {cv2.CAP_PROP_FRAME_WIDTH: self.width, cv2.CAP_PROP_FRAME_HEIGHT: self.height,
+                cv2.CAP_PROP_FPS: self.fps}.get(prop_id, 0.0)
+
+    def isOpened(self) -> bool:
+        return True
+
+    def release(self):
+        pass
+
+
+class StreamSource:
+    """
+    Fuente en directo (RTSP/HTTP/webcam): un hilo lee continuamente y solo guarda el último frame
+    (latest-frame-wins); si el procesado va más lento que la cámara los frames viejos se descartan
+    (dropped) en lugar de acumular retraso. Si la conexión cae, reconecta con espera exponencial
+    (reconnect_delay .. max_delay) hasta max_retries intentos seguidos (None: sin límite).
+    La misma política vale para el primer frame: el constructor espera hasta recibirlo y solo
+    falla si se agotan los reintentos.
+    index cuenta los frames entregados; pts es el instante de captura en ms desde el inicio.
+    - read_timeout: espera máxima de read() a un frame nuevo (s); si vence, también durante una
+      reconexión, read() devuelve (False, None). None: espera mientras queden reintentos.
+    - opener: función que abre la conexión (por defecto cv2.VideoCapture(url)); permite pruebas
+      con una fuente falsa.
+    """
+    def __init__(self, url, reconnect_delay: float = 1.0, max_delay: float = 30.0,
+                 max_retries: Optional[int] = None, read_timeout: Optional[float] = None, opener=None):
+        self.url = url
+        self.reconnect_delay = reconnect_delay
+        self.max_delay = max_delay
+        self.max_retries = max_retries
+        self.read_timeout = read_timeout
+        self._opener = opener or (lambda: cv2.VideoCapture(url))
+        self._cond = threading.Condition()
+        self._frame: Optional[np.ndarray] = None
+        self._frame_ts = 0.0
+        self._seq = 0            # frames recibidos
+        self._delivered_seq = 0
+        self._stopped = False
+        self._ended = False
+        self.width = self.height = 0
+        self.fps = 30.0
+        self.index = -1
+        self.pts: Optional[float] = None
+        self.dropped = 0
+        self.reconnects = 0
+        self._t0 = None
+        self._thread = threading.Thread(target=self._run, name="stream-reader", daemon=True)
+        self._thread.start()
+        # esperar al primer frame para conocer las dimensiones (con las reconexiones de _run)
+        with self._cond:
+            self._cond.wait_for(lambda: self._frame is not None or self._ended)
+        if self._frame is None:
+            self.release()
+            raise IOError(f"Could not open video source: {url}")
+
+    def _run(self):
+        failures = 0
+        while not self._stopped:
+            cap = self._opener()
+            if cap is not None and cap.isOpened():
+                fps = cap.get(cv2.CAP_PROP_FPS)
+                if fps and 0 < fps < 1000:
+                    self.fps = fps
+                while not self._stopped:
+                    ok, frame = cap.read()
+                    if not ok:
+                        break
+                    failures = 0
+                    now = time.perf_counter()
+                    with self._cond:
+                        if self._t0 is None:
+                            self._t0 = now
+                            self.height, self.width = frame.shape[:2]
+                        if self._frame is not None and self._seq > self._delivered_seq:
+                            self.dropped += 1      # el anterior no llegó a entregarse
+                        self._frame, self._frame_ts = frame, now
+                        self._seq += 1
+                        self._cond.notify_all()
+            if cap is not None:
+                cap.release()
+            if self._stopped:
+                break
+            failures += 1
+            if self.max_retries is not None and failures > self.max_retries:
+                break
+            self.reconnects += 1
+            delay = min(self.max_delay, self.reconnect_delay * 2 ** (failures - 1))
+            print(f"[WARN] Stream {self.url} caído; reconectando en {delay:.1f}s (intento {failures})")
+            with self._cond:
+                self._cond.wait_for(lambda: self._stopped, timeout=delay)
+        with self._cond:
+            self._ended = True
+            self._cond.notify_all()
+
+    def read(self) -> Tuple[bool, Optional[np.ndarray]]:
+        with self._cond:
+            # espera a un frame más nuevo que el último entregado (también durante una reconexión),
+            # como mucho read_timeout
+            self._cond.wait_for(lambda: self._seq != self._delivered_seq or self._ended or self._stopped,
+                                timeout=self.read_timeout)
+            if self._seq == self._delivered_seq:
+                return False, None
+            frame, ts = self._frame, self._frame_ts
+            self._delivered_seq = self._seq
+        self.index += 1
+        self.pts = (ts - self._t0) * 1000.0
+        return True, frame
+
+    def get(self, prop_id):
+        return {cv2.CAP_PROP_FRAME_WIDTH: self.width, cv2.CAP_PROP_FRAME_HEIGHT: self.height,
+                cv2.CAP_PROP_FPS: self.fps}.get(prop_id, 0.0)
+
+    def isOpened(self) -> bool:
+        return not self._ended
+
+    def release(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        self._thread.join(timeout=10.0)
@@ -0,0 +1,147 @@
+# stats.py
+from __future__ import annotations
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Hashable, Iterable, Optional, Tuple
+import numpy as np
+
+
+class RunningStats:
+    """
+    Media y varianza en línea (Welford) con memoria y coste O(1) por muestra.
+    Acepta escalares o vectores (p. ej. (w, h) para el tamaño típico de caja).
+    - decay: si se indica (0 < decay < 1), cada muestra nueva pesa 1 y las anteriores se
+      multiplican por decay, de modo que la media sigue cambios lentos (día/noche, obras...).
+      Con decay=None es la media/varianza exacta de todas las muestras.
+    """
+    def __init__(self, decay: Optional[float] = None):
+        if decay is not None and not 0.0 < decay < 1.0:
+            raise ValueError(f"decay debe estar en (0, 1), no {decay!r}")
+        self.decay = decay
+        self.count = 0          # nº de muestras vistas
+        self.weight = 0.0       # suma de pesos (== count sin decay)
+        self._mean = None
+        self._m2 = None
+
+    def update(self, x) -> None:
+        """Añade una muestra."""
+        x = np.asarray(x, dtype=np.float64)
+        if self._mean is None:
+            self._mean = np.zeros_like(x)
+            self._m2 = np.zeros_like(x)
+        if self.decay is not None:
+            self.weight *= self.decay
+            self._m2 = self._m2 * self.decay
+        self.count += 1
+        self.weight += 1.0
+        delta = x - self._mean
+        self._mean = self._mean + delta / self.weight
+        self._m2 = self._m2 + delta * (x - self._mean)
+
+    def update_many(self, xs: Iterable) -> None:
+        for x in xs:
+            self.update(x)
+
+    @property
+    def mean(self):
+        """Media actual (None si aún no hay muestras)."""
+        if self._mean is None:
+            return None
+        return float(self._mean) if self._mean.ndim == 0 else self._mean.copy()
+
+    @property
+    def var(self):
+        """Varianza (poblacional) actual (None si aún no hay muestras)."""
+        if self._mean is None:
+            return None
+        v = self._m2 / self.weight
+        return float(v) if v.ndim == 0 else v
+
+    @property
+    def std(self):
+        v = self.var
+        return None if v is None else np.sqrt(v)
+
+
+class GroupedStats:
+    """
+    RunningStats global más uno por grupo (franja horaria, región de la imagen, dirección...).
+    mean(key) devuelve la media del grupo si tiene al menos min_count muestras y, si no,
+    la global, para no arrancar con un prior basado en dos coches.
+    """
+    def __init__(self, decay: Optional[float] = None, min_count: int = 5):
+        self.decay = decay
+        self.min_count = min_count
+        self.total = RunningStats(decay)
+        self.groups: Dict[Hashable, RunningStats] = {}
+
+    def update(self, x, key: Hashable = None) -> None:
+        self.total.update(x)
+        if key is not None:
+            if key not in self.groups:
+                self.groups[key] = RunningStats(self.decay)
+            self.groups[key].update(x)
+
+    def get(self, key: Hashable = None) -> RunningStats:
+        """Estadístico del grupo (o el global si el grupo no tiene suficientes muestras)."""
+        stats = self.groups.get(key) if key is not None else None
+        if stats is None or stats.count < self.min_count:
+            return self.total
+        return stats
+
+    def mean(self, key: Hashable = None):
+        return self.get(key).mean
+
+    def var(self, key: Hashable = None):
+        return self.get(key).var
+
+
+# ------------- Claves de agrupación habituales -------------
+
+def hour_bucket(ts: Optional[float] = None, hours: int = 1) -> int:
+    """Franja horaria local de ts (por defecto ahora): 0..24/hours-1."""
+    return time.localtime(time.time() if ts is None else ts).tm_hour // hours
+
+
+def recording_start(spec: Optional[str] = None, video=None, frames: float = 0, fps: float = 0.0) -> float:
+    """
+    Instante (epoch, s) del primer frame, para dar a los tracks el tiempo del vídeo y no el del
+    procesado (Tracker.update(now=...)):
+    - spec: fecha ISO 8601 ('2025-03-01T07:30:00', --recording-start).
+    - si no, para un fichero: su mtime (fin de la grabación) menos la duración frames / fps, si se conoce.
+    - si no (directo, webcam, sintético): ahora.
+    """
+    if spec:
+        return datetime.fromisoformat(spec).timestamp()
+    path = Path(str(video)) if video is not None else None
+    if path is not None and path.is_file():
+        start = path.stat().st_mtime
+        if frames > 0 and fps > 0:
+            start -= frames / fps
+        return start
+    return time.time()
+
+
+def frame_time(start: float, frame_idx: int, pts: Optional[float] = None, fps: float = 30.0) -> float:
+    """Instante (epoch, s) de un frame: start + PTS (ms) o, si la fuente no da PTS, start + índice / fps."""
+    if pts is not None:
+        return start + pts / 1000.0
+    return start + frame_idx / (fps if fps > 0 else 30.0)
+
+
+def region_bucket(center: Tuple[float, float], frame_shape, grid: Tuple[int, int] = (3, 3)) -> Tuple[int, int]:
+    """Celda (col, fila) de una rejilla grid=(cols, filas) sobre el frame que contiene center."""
+    h, w = frame_shape[:2]
+    cols, rows = grid
+    cx = min(max(int(center[0] * cols / max(w, 1)), 0), cols - 1)
+    cy = min(max(int(center[1] * rows / max(h, 1)), 0), rows - 1)
+    return cx, cy
+
+
+
+def direction_bucket(velocity, min_speed: float = 0.5) -> Tuple[int, int]:
+    """Sentido (signo de vx, signo de vy) de una velocidad; componentes con |v| < min_speed cuentan como 0."""
+    vx, vy = velocity
+    return (int(np.sign(vx)) if abs(vx) >= min_speed else 0,
+            int(np.sign(vy)) if abs(vy) >= min_speed else 0)
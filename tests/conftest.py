@@ -0,0 +1,5 @@
+# los módulos del proyecto están en la raíz del repositorio, sin paquete
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,69 @@
+# tests/fake_yolo.py
+"""Modelo falso con la interfaz de predict de ultralytics que usa el proyecto (sin torch)."""
+import cv2
+import numpy as np
+
+RED = (0, 0, 255)
+
+
+class FakeBox:
+    def __init__(self, row):
+        self.xyxy = [row[:4]]
+        self.conf = row[4]
+        self.cls = row[5]
+
+
+class FakeBoxes:
+    """result.boxes: data (N,6) x1, y1, x2, y2, conf, cls; también iterable caja a caja."""
+    def __init__(self, data):
+        self.data = np.asarray(data, dtype=np.float32).reshape(-1, 6)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __iter__(self):
+        return (FakeBox(row) for row in self.data)
+
+
+class FakeResult:
+    def __init__(self, data):
+        self.boxes = FakeBoxes(data)
+
+
+class RedBoxModel:
+    """
+    "Detecta" los rectángulos rojos puros de la imagen (componentes conexas), con clase cls.
+    La confianza depende de la escala de inferencia imgsz / lado mayor (low_conf por debajo de
+    sharp_scale) para simular que a baja resolución el detector duda. Guarda (nº de imágenes,
+    imgsz, shape) de cada llamada.
+    """
+    def __init__(self, cls=2, sharp_scale=0.6, conf=0.9, low_conf=0.4):
+        self.cls = cls
+        self.sharp_scale = sharp_scale
+        self.high_conf = conf
+        self.low_conf = low_conf
+        self.calls = []
+
+    def detect(self, image, imgsz):
+        mask = cv2.inRange(image, RED, RED)
+        n, _, stats, _ = cv2.connectedComponentsWithStats(mask)
+        score = self.high_conf if imgsz / max(image.shape[:2]) >= self.sharp_scale else self.low_conf
+        return [[x, y, x + w, y + h, score, self.cls] for x, y, w, h, _ in stats[1:n]]
+
+    def predict(self, source, conf=0.25, imgsz=640, classes=None, verbose=False, **kw):
+        images = source if isinstance(source, list) else [source]
+        self.calls.append((len(images), imgsz, images[0].shape))
+        results = []
+        for image in images:
+            rows = [r for r in self.detect(image, imgsz)
+                    if r[4] >= conf and (classes is None or self.cls in classes)]
+            results.append(FakeResult(rows))
+        return results
+
+
+def draw_cars(shape, boxes):
+    """Frame gris con un rectángulo rojo por caja (x1, y1, x2, y2) (x2, y2 exclusivos)."""
+    frame = np.full(tuple(shape) + (3,), 90, dtype=np.uint8)
+    for x1, y1, x2, y2 in boxes:
+        frame[y1:y2, x1:x2] = RED
+    return frame
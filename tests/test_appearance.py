@@ -0,0 +1,69 @@
+# tests/test_appearance.py
+import cv2
+import numpy as np
+import pytest
+
+from appearance import DetectionDescriptors, correlation_matrix, similarity_matrix
+from car import Car, TrackTable
+from tracker import TrackerHíbrido
+from utilities import appearance_score, compute_grad_hist, compute_hsv_hist, make_detections, shape_score
+
+
+def test_correlation_matrix_matches_compare_hist():
+    rng = np.random.default_rng(0)
+    a = rng.random((6, 32)).astype(np.float32)
+    b = rng.random((5, 32)).astype(np.float32)
+    b[2] = 0.25                                    # histograma constante
+    expected = [[cv2.compareHist(x, y, cv2.HISTCMP_CORREL) for y in b] for x in a]
+    np.testing.assert_allclose(correlation_matrix(a, b), expected, atol=1e-6)
+
+
+def test_similarity_matrix_matches_pairwise_scores():
+    rng = np.random.default_rng(1)
+    frame = rng.integers(0, 256, size=(240, 320, 3), dtype=np.uint8)
+    track_boxes = [(10, 10, 60, 50), (100, 40, 180, 120), (200, 150, 260, 230)]
+    det_boxes = [(12, 14, 62, 52), (150, 100, 210, 170), (0, 0, 40, 40), (240, 180, 300, 236)]
+    table = TrackTable(capacity=4)
+    cars = []
+    for tid, box in enumerate(track_boxes):
+        car = Car(table, table.add(tid, box, 1.0, now=0.0))
+        car.hsv_hist = compute_hsv_hist(frame, box)
+        car.grad_hist = compute_grad_hist(frame, box)
+        cars.append(car)
+    rows = table.rows_of(range(len(track_boxes)))
+    desc = DetectionDescriptors(frame)
+    hsv = similarity_matrix(table, rows, desc, det_boxes, "hsv_hist")
+    grad = similarity_matrix(table, rows, desc, det_boxes, "grad_hist")
+    np.testing.assert_allclose(hsv, [[appearance_score(frame, c, d) for d in det_boxes] for c in cars], atol=1e-5)
+    np.testing.assert_allclose(grad, [[shape_score(frame, c, d) for d in det_boxes] for c in cars], atol=1e-5)
+    # tracks sin descriptor: 0
+    cars[1].hsv_hist = None
+    assert not similarity_matrix(table, rows, desc, det_boxes, "hsv_hist")[1].any()
+
+
+def scene(boxes_colors):
+    frame = np.full((240, 400, 3), 40, dtype=np.uint8)
+    for (x1, y1, x2, y2), color in boxes_colors:
+        cv2.rectangle(frame, (x1, y1), (x2 - 1, y2 - 1), color, -1)
+    return frame
+
+
+@pytest.mark.parametrize("red_first", [True, False])
+def test_hybrid_appearance_decides_the_match(red_first):
+    red, blue = (0, 0, 220), (220, 60, 0)
+    # motion='linear': sin gating de Kalman, que rechazaría el salto de un track parado
+    tracker = TrackerHíbrido(cascade_threshold=0.3, motion="linear")
+    first = (180, 100, 220, 130)
+    # el histograma del track se guarda al emparejarlo por IoU (Car.update)
+    for _ in range(2):
+        tracker.update(scene([(first, red)]), make_detections([first], [0.9]))
+    (tid,) = tracker.tracks
+    assert tracker.tracks[tid].hsv_hist is not None
+
+    # sin solape con el track y a la misma distancia por ambos lados: solo el color las distingue
+    left, right = (135, 100, 175, 130), (225, 100, 265, 130)
+    red_box, blue_box = (left, right) if red_first else (right, left)
+    boxes = [red_box, blue_box] if red_first else [blue_box, red_box]
+    frame = scene([(red_box, red), (blue_box, blue)])
+    tracks = tracker.update(frame, make_detections(boxes, [0.9, 0.9]))
+    assert tracks[tid].bbox == red_box
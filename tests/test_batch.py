@@ -0,0 +1,59 @@
+# tests/test_batch.py
+from argparse import Namespace
+
+import numpy as np
+import pytest
+
+pytest.importorskip("ultralytics")    # detection_frames configura ultralytics al importarse
+
+from detection_frames import detect, detect_batch, read_batch
+from fake_yolo import RedBoxModel, draw_cars
+from roi import RoiMosaic
+
+
+class ListCapture:
+    """Captura sobre una lista de frames, sin index/pts (como cv2.VideoCapture)."""
+    def __init__(self, frames):
+        self.frames = list(frames)
+
+    def read(self):
+        if not self.frames:
+            return False, None
+        return True, self.frames.pop(0)
+
+
+def moving_cars(n):
+    return [draw_cars((270, 480), [(10 + 7 * i, 60, 70 + 7 * i, 100), (400 - 5 * i, 180, 440 - 5 * i, 210)])
+            for i in range(n)]
+
+
+@pytest.mark.parametrize("rois", [None, [(0, 40, 480, 120), (200, 160, 480, 230)]])
+def test_detect_batch_matches_detect(rois):
+    args = Namespace(conf=0.5, imgsz=480, skip=1)
+    mosaic = RoiMosaic(rois, 480, 270, args.imgsz) if rois else None
+    frames = moving_cars(5)
+    model = RedBoxModel(sharp_scale=0.0)
+    batched = detect_batch(model, frames, args, mosaic)
+    assert len(model.calls) == 1 and model.calls[0][0] == 5
+    for frame, dets in zip(frames, batched):
+        np.testing.assert_array_equal(dets, detect(model, frame, args, mosaic))
+    assert detect_batch(model, [], args) == []
+
+
+def test_read_batch_follows_skip_and_keeps_order():
+    args = Namespace(conf=0.5, imgsz=480, skip=3)
+    frames = moving_cars(11)
+    model = RedBoxModel(sharp_scale=0.0)
+    cap = ListCapture(frames)
+    first = read_batch(cap, model, args, 3, start_idx=0)
+    # 3 frames de inferencia (0, 3, 6) y los intermedios hasta el último
+    assert [idx for _, idx, _, _ in first] == list(range(7))
+    assert [idx for _, idx, _, dets in first if dets is not None] == [0, 3, 6]
+    rest = read_batch(cap, model, args, 3, start_idx=7)
+    assert [idx for _, idx, _, _ in rest] == [7, 8, 9, 10]               # final del vídeo
+    assert [c[0] for c in model.calls] == [3, 1]
+    for frame, idx, pts, dets in first + rest:
+        assert frame is frames[idx] and pts is None
+        if dets is not None:
+            np.testing.assert_array_equal(dets, detect(model, frame, args))
+    assert read_batch(cap, model, args, 3, start_idx=11) == []
@@ -0,0 +1,68 @@
+# tests/test_car.py
+import numpy as np
+
+from car import Car, TrackTable
+from utilities import predict_bbox
+
+
+def test_removed_rows_are_reused_and_reset():
+    table = TrackTable(capacity=4, history=8)
+    rows = [table.add(tid, (0, 0, 10, 10), 0.9, now=0.0) for tid in range(1, 4)]
+    car = Car(table, rows[1])
+    car.hits, car.lost = 7, 3
+    car.centroids.append((5.0, 5.0))
+    table.set_hist("hsv_hist", rows[1], np.ones(4))
+    table.remove(np.array([rows[1]]))
+    assert len(table) == 2 and not table.alive[rows[1]]
+
+    row = table.add(10, (20, 20, 40, 40), 0.5, now=1.0)
+    assert row == rows[1] and table.capacity == 4
+    car = Car(table, row)
+    assert (car.track_id, car.bbox, car.hits, car.lost) == (10, (20, 20, 40, 40), 1, 0)
+    assert len(car.centroids) == 0 and car.hsv_hist is None
+    assert table.row_of(10) == row and table.rows_of([1, 3]).tolist() == [rows[0], rows[2]]
+
+
+def test_grow_keeps_existing_rows():
+    table = TrackTable(capacity=2, history=4)
+    for tid in range(1, 4):
+        table.add(tid, (tid, tid, tid + 10, tid + 10), 0.1 * tid, now=0.0)
+        table.set_hist("hsv_hist", table.row_of(tid), np.full(3, tid))
+    assert table.capacity == 4 and len(table) == 3
+    for tid in range(1, 4):
+        row = table.row_of(tid)
+        assert Car(table, row).bbox == (tid, tid, tid + 10, tid + 10)
+        np.testing.assert_array_equal(table.get_hist("hsv_hist", row), np.full(3, tid))
+    assert sorted(table.active_rows().tolist()) == sorted(table.rows_of([1, 2, 3]).tolist())
+
+
+def test_centroid_ring_buffer_keeps_last_points_in_order():
+    table = TrackTable(capacity=1, history=4)
+    row = table.add(1, (0, 0, 10, 10), 1.0, now=0.0)
+    car = Car(table, row)
+    for i in range(7):
+        car.centroids.append((float(i), float(-i)))
+    assert len(car.centroids) == 4
+    assert car.centroids[:] == [(3.0, -3.0), (4.0, -4.0), (5.0, -5.0), (6.0, -6.0)]
+    assert car.centroids[-1] == (6.0, -6.0) and car.centroids[0] == (3.0, -3.0)
+    np.testing.assert_array_equal(table.last_centroids(np.array([row]), 2)[0], [[5.0, -5.0], [6.0, -6.0]])
+
+
+def test_predict_bboxes_matches_predict_bbox():
+    rng = np.random.default_rng(0)
+    table = TrackTable(capacity=8, history=6)
+    cars = []
+    for tid in range(8):
+        row = table.add(tid, (100, 100, 140, 130), 1.0, now=0.0)
+        car = Car(table, row)
+        x, y = 120.0, 115.0
+        for _ in range(tid):     # de 0 a 7 centroides
+            x, y = x + rng.integers(-9, 10), y + rng.integers(-9, 10)
+            car.centroids.append((x, y))
+        car.lost = int(rng.integers(0, 3))
+        if tid == 1:             # un solo centroide y un prior de velocidad (Tracker_predict)
+            car.speed_x, car.speed_y = 6.5, -2.25
+        cars.append(car)
+    rows = np.array([c._row for c in cars])
+    expected = [list(predict_bbox(c)) for c in cars]
+    assert table.predict_bboxes(rows).tolist() == expected
@@ -0,0 +1,45 @@
+# tests/test_cascade.py
+import numpy as np
+
+from cascade import CascadeDetector
+from fake_yolo import RedBoxModel, draw_cars
+
+NEAR = [(0, 250, 960, 400)]                      # zona de la línea de conteo
+CAR_NEAR, CAR_FAR = (100, 300, 160, 340), (600, 50, 660, 90)
+
+
+def cascade(model, **kw):
+    return CascadeDetector(model, conf=0.5, low_imgsz=416, high_imgsz=960, low_conf=0.25, near_rois=NEAR, **kw)
+
+
+def test_doubtful_box_near_a_line_is_refined_in_a_mosaic():
+    model = RedBoxModel(sharp_scale=0.6)          # a 416 / 960 todas las cajas salen con conf 0.4
+    det = cascade(model)
+    out = det(draw_cars((540, 960), [CAR_NEAR, CAR_FAR]))
+    # la dudosa cerca de la línea se repasa; la lejana se queda por debajo de conf
+    np.testing.assert_allclose(out, [[*CAR_NEAR, 0.9, 2]], rtol=1e-6)
+    assert len(model.calls) == 2 and model.calls[0][1] == 416
+    assert model.calls[1][2][:2] != (540, 960)    # mosaico, no el frame completo
+    assert (det.refined_regions, det.refined_full) == (1, 0)
+
+
+def test_confident_pass_is_not_refined():
+    model = RedBoxModel(sharp_scale=0.3)
+    det = cascade(model)
+    out = det(draw_cars((540, 960), [CAR_NEAR, CAR_FAR]))
+    assert sorted(out[:, 0].tolist()) == [100, 600] and len(model.calls) == 1
+    assert det.refined_regions == det.refined_full == 0
+
+
+def test_large_doubtful_region_refines_the_whole_frame():
+    model = RedBoxModel(sharp_scale=0.6)
+    det = CascadeDetector(model, conf=0.5, low_imgsz=416, high_imgsz=960, near_rois=None)
+    out = det(draw_cars((540, 960), [(50, 20, 900, 500)]))
+    np.testing.assert_allclose(out, [[50, 20, 900, 500, 0.9, 2]], rtol=1e-6)
+    assert model.calls[1][2][:2] == (540, 960) and det.refined_full == 1
+
+
+def test_empty_frame():
+    model = RedBoxModel()
+    out = cascade(model)(draw_cars((540, 960), []))
+    assert out.shape == (0, 6) and len(model.calls) == 1
@@ -0,0 +1,79 @@
+# tests/test_detection_cache.py
+from argparse import Namespace
+
+import numpy as np
+import pytest
+
+import detection_cache
+from detection_cache import DetectionCache, DetectionRecorder, cache_path, cache_settings, tracker_dependent
+
+
+def make_args(tmp_path, **kw):
+    video = tmp_path / "clip.mp4"
+    if not video.exists():
+        video.write_bytes(b"not really a video" * 100)
+    args = Namespace(video=str(video), weights=None, det_cache=str(tmp_path / "cache"), conf=0.25, imgsz=640,
+                     skip=1, roi=None, roi_margin=0.1, cascade=False, low_imgsz=None, cascade_conf=None,
+                     decoder="opencv", decode_scale=1.0, dir_fps=None, adaptive=False, track_crops=False,
+                     motion_gate=False, tiles=None, flow=False, tracker="predict")
+    for k, v in kw.items():
+        setattr(args, k, v)
+    return args
+
+
+def test_round_trip_across_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(detection_cache, "CHUNK_FRAMES", 3)
+    rng = np.random.default_rng(0)
+    recorded = []
+    for i in range(8):
+        if i % 3 == 1:
+            dets = None                                     # frame sin inferencia
+        else:
+            dets = rng.random((i % 4, 6)).astype(np.float32)   # incluye frames con 0 detecciones
+        pts = None if i == 5 else 40.0 * i
+        recorded.append((2 * i, pts, dets))
+
+    path = tmp_path / "rec"
+    rec = DetectionRecorder(path, {"version": 2}, 1280, 720, 25.0)
+    for frame_idx, pts, dets in recorded:
+        rec.add(frame_idx, pts, dets)
+    rec.close()
+    assert not path.with_name("rec.partial").exists()
+    assert (rec.chunks, rec.frames) == (3, 8)
+
+    cache = DetectionCache(path)
+    assert (cache.width, cache.height, cache.fps, len(cache)) == (1280, 720, 25.0, 8)
+    replayed = list(cache)
+    assert len(replayed) == len(recorded)
+    for (frame_idx, pts, dets), (r_idx, r_pts, r_dets) in zip(recorded, replayed):
+        assert (r_idx, r_pts) == (frame_idx, pts)
+        if dets is None:
+            assert r_dets is None
+        else:
+            assert r_dets.shape == (len(dets), 6) and r_dets.dtype == np.float32
+            np.testing.assert_array_equal(r_dets, dets)
+
+
+def test_missing_cache_raises(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        DetectionCache(tmp_path / "nope")
+
+
+def test_cache_key_depends_on_detection_settings(tmp_path):
+    base = cache_path(make_args(tmp_path))
+    assert cache_path(make_args(tmp_path, tracker="hybrid")) == base
+    assert cache_path(make_args(tmp_path, conf=0.4)) != base
+    assert cache_path(make_args(tmp_path, skip=3)) != base
+    assert cache_path(make_args(tmp_path), camera_id="camara_2") != base
+    assert base.name.startswith("clip_")
+    settings = cache_settings(make_args(tmp_path))
+    (tmp_path / "clip.mp4").write_bytes(b"another video")
+    assert cache_settings(make_args(tmp_path))["video"] != settings["video"]
+
+
+def test_tracker_dependent_modes_are_listed(tmp_path):
+    assert tracker_dependent(make_args(tmp_path)) == []
+    args = make_args(tmp_path, adaptive=True, flow=True, tiles="2x1")
+    assert tracker_dependent(args) == ["--adaptive", "--tiles", "--flow"]
+    assert tracker_dependent(make_args(tmp_path), tile_spec="3x2") == ["--tiles"]
+    assert tracker_dependent(make_args(tmp_path, motion_gate="off")) == []
@@ -0,0 +1,59 @@
+# tests/test_detections.py
+import numpy as np
+import pytest
+
+from tiles import TiledDetector, merge_tile_boxes
+from tracker import yolo_result_to_detections
+from utilities import as_detections, make_detections
+
+
+class FakeBoxes:
+    """Lo que usa yolo_result_to_detections de ultralytics: boxes.data (N,6) y len()."""
+    def __init__(self, data):
+        self.data = np.asarray(data, dtype=np.float32).reshape(-1, 6)
+
+    def __len__(self):
+        return len(self.data)
+
+
+class FakeResult:
+    def __init__(self, data):
+        self.boxes = FakeBoxes(data)
+
+
+def test_as_detections_accepts_every_format():
+    arr = make_detections([[0, 0, 10, 10]], [0.5], [2])
+    assert as_detections(arr) is arr
+    np.testing.assert_array_equal(as_detections([((0, 0, 10, 10), 0.5)]), [[0, 0, 10, 10, 0.5, -1]])
+    np.testing.assert_array_equal(as_detections(np.array([[0, 0, 10, 10, 0.5]])), [[0, 0, 10, 10, 0.5, -1]])
+    assert as_detections([]).shape == (0, 6)
+    with pytest.raises(ValueError):
+        as_detections(np.zeros((2, 4)))
+
+
+def test_yolo_result_to_detections_truncates_and_keeps_class():
+    res = FakeResult([[1.7, 2.2, 30.9, 40.5, 0.8, 7]])
+    np.testing.assert_allclose(yolo_result_to_detections(res), [[1, 2, 30, 40, 0.8, 7]])
+    assert yolo_result_to_detections(FakeResult([])).shape == (0, 6)
+
+
+def test_merge_tile_boxes_keeps_class_of_most_confident_part():
+    # coche partido en el solape de dos teselas (x 90..110): cada parte cortada por el borde de la suya
+    boxes = np.array([[80, 10, 110, 40], [90, 10, 130, 40], [300, 10, 320, 30]], dtype=np.float64)
+    merged, confs, classes = merge_tile_boxes(boxes, np.array([0.6, 0.9, 0.7]), np.array([2, 7, 3]),
+                                              np.array([0, 1, 1]), np.array([True, True, False]))
+    assert merged.tolist() == [[80, 10, 130, 40], [300, 10, 320, 30]]
+    assert confs.tolist() == [0.9, 0.7] and classes.tolist() == [7, 3]
+
+
+def test_tiled_detector_carries_class():
+    class Model:
+        def predict(self, source, **kw):
+            # un objeto de clase 5 en coordenadas de cada tesela
+            return [FakeResult([[10, 10, 40, 30, 0.9, 5]]) for _ in source]
+
+    det = TiledDetector(Model(), [(0, 0, 200, 100), (150, 0, 350, 100)], 350, 100)
+    out = det(np.zeros((100, 350, 3), dtype=np.uint8))
+    assert out.dtype == np.float32 and out.shape == (2, 6)
+    assert out[:, 5].tolist() == [5, 5]
+    assert sorted(out[:, 0].tolist()) == [10, 160]
@@ -0,0 +1,41 @@
+# tests/test_flow.py
+import cv2
+import numpy as np
+
+from flow import FlowPropagator
+
+
+def textured_frame(seed=0, shape=(240, 320)):
+    noise = np.random.default_rng(seed).integers(0, 256, size=shape + (3,), dtype=np.uint8)
+    return cv2.GaussianBlur(noise, (7, 7), 0)
+
+
+def test_step_measures_a_translation():
+    frame = textured_frame()
+    moved = np.roll(frame, shift=(-3, 5), axis=(0, 1))      # 5 px a la derecha, 3 hacia arriba
+    boxes = np.array([[60, 60, 140, 120], [180, 100, 260, 180]], dtype=np.float64)
+    flow = FlowPropagator()
+    shifts, ok = flow.step(frame, boxes)
+    assert not ok.any() and not shifts.any()                  # sin frame anterior
+    shifts, ok = flow.step(moved, boxes)
+    assert ok.all()
+    np.testing.assert_allclose(shifts, [[5.0, -3.0], [5.0, -3.0]], atol=0.5)
+
+
+def test_step_without_boxes_only_keeps_the_frame():
+    frame = textured_frame()
+    flow = FlowPropagator(scale=1.0)
+    shifts, ok = flow.step(frame)
+    assert shifts.shape == (0, 2) and ok.shape == (0,)
+    shifts, ok = flow.step(frame, np.array([[100, 100, 160, 150]]))
+    assert ok.all()
+    np.testing.assert_allclose(shifts, [[0.0, 0.0]], atol=0.1)
+
+
+def test_flat_region_is_not_trusted():
+    frame = textured_frame()
+    frame[:, :100] = 128                                      # zona sin textura
+    flow = FlowPropagator(scale=1.0)
+    flow.step(frame)
+    _, ok = flow.step(np.roll(frame, 4, axis=1), np.array([[20, 50, 70, 100], [150, 50, 220, 110]]))
+    assert ok.tolist() == [False, True]
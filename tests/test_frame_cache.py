@@ -0,0 +1,91 @@
+# tests/test_frame_cache.py
+import cv2
+import numpy as np
+import pytest
+
+from frame_cache import build_frame_cache
+from sources import FrameCacheSource
+
+N_FRAMES = 20
+
+
+@pytest.fixture(scope="module")
+def video(tmp_path_factory):
+    path = tmp_path_factory.mktemp("video") / "clip.avi"
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), 25.0, (64, 48))
+    if not writer.isOpened():
+        pytest.skip("OpenCV sin códec MJPG")
+    for i in range(N_FRAMES):
+        frame = np.zeros((48, 64, 3), dtype=np.uint8)
+        frame[:, :, 1] = 10 * i
+        cv2.rectangle(frame, (2 * i, 10), (2 * i + 12, 30), (255, 255, 255), -1)
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+def decoded(video):
+    cap = cv2.VideoCapture(str(video))
+    frames = []
+    while True:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def read_all(src):
+    out = []
+    while True:
+        ok, frame = src.read()
+        if not ok:
+            return out
+        out.append((src.index, src.pts, frame))
+
+
+def test_round_trip(video, tmp_path):
+    meta = build_frame_cache(video, tmp_path / "cache")
+    assert (meta["frames"], meta["width"], meta["height"], meta["channels"]) == (N_FRAMES, 64, 48, 3)
+    assert not (tmp_path / "cache.partial").exists()
+    src = FrameCacheSource(tmp_path / "cache")
+    assert len(src) == N_FRAMES and src.get(cv2.CAP_PROP_FRAME_WIDTH) == 64
+    got = read_all(src)
+    assert [i for i, _, _ in got] == list(range(N_FRAMES))
+    pts = [p for _, p, _ in got]
+    assert pts == sorted(pts)
+    for (_, _, frame), ref in zip(got, decoded(video)):
+        np.testing.assert_array_equal(frame, ref)
+        assert not frame.flags.writeable
+
+
+@pytest.mark.parametrize("step, expected", [
+    (1, list(range(0, N_FRAMES, 2))),   # la caché ya tiene uno de cada 2
+    (2, list(range(0, N_FRAMES, 2))),
+    (4, list(range(0, N_FRAMES, 4))),
+    (6, list(range(0, N_FRAMES, 6))),
+    (3, list(range(0, N_FRAMES, 2))),   # 3 no es múltiplo de 2: decide process_frames por index
+])
+def test_step_counts_original_frames(video, tmp_path, step, expected):
+    build_frame_cache(video, tmp_path / "cache", step=2)
+    src = FrameCacheSource(tmp_path / "cache", step=step)
+    assert [i for i, _, _ in read_all(src)] == expected
+
+
+def test_seek(video, tmp_path):
+    build_frame_cache(video, tmp_path / "cache", step=2)
+    src = FrameCacheSource(tmp_path / "cache", step=4)
+    assert src.set(cv2.CAP_PROP_POS_FRAMES, 3)
+    assert [i for i, _, _ in read_all(src)] == [6, 10, 14, 18]
+    src.release()
+    assert not src.isOpened() and src.read() == (False, None)
+
+
+def test_gray_and_scaled(video, tmp_path):
+    meta = build_frame_cache(video, tmp_path / "cache", scale=0.5, gray=True)
+    assert (meta["width"], meta["height"], meta["channels"]) == (32, 24, 1)
+    src = FrameCacheSource(tmp_path / "cache")
+    ok, frame = src.read()
+    assert ok and frame.shape == (24, 32, 3)
+    np.testing.assert_array_equal(frame[..., 0], frame[..., 2])
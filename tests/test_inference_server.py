@@ -0,0 +1,89 @@
+# tests/test_inference_server.py
+import threading
+
+import numpy as np
+import pytest
+
+from inference_server import InferenceServer
+
+
+class EchoModel:
+    """Devuelve para cada imagen su valor (constante) y guarda el tamaño y parámetros de cada llamada."""
+    def __init__(self):
+        self.calls = []
+
+    def predict(self, source, **params):
+        self.calls.append((len(source), params))
+        if params.get("imgsz") == -1:
+            raise RuntimeError("imgsz no válido")
+        return [int(img[0, 0]) for img in source]
+
+
+def images(*values):
+    return [np.full((4, 4), v, dtype=np.uint8) for v in values]
+
+
+def run_clients(server, requests):
+    """Lanza una petición por hilo a la vez y devuelve sus resultados en el mismo orden."""
+    barrier = threading.Barrier(len(requests))
+    out = [None] * len(requests)
+
+    def worker(i, imgs, params):
+        model = server.client()
+        barrier.wait()
+        try:
+            out[i] = model.predict(imgs if len(imgs) > 1 else imgs[0], timeout=5, **params)
+        except Exception as e:
+            out[i] = e
+
+    threads = [threading.Thread(target=worker, args=(i, imgs, params)) for i, (imgs, params) in enumerate(requests)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return out
+
+
+def test_requests_from_several_cameras_share_one_call():
+    model = EchoModel()
+    server = InferenceServer(model, max_batch=6, max_wait=2.0)
+    try:
+        out = run_clients(server, [(images(1, 2), {"imgsz": 640}), (images(3), {"imgsz": 640}),
+                                   (images(4, 5, 6), {"imgsz": 640})])
+    finally:
+        server.close()
+    assert out == [[1, 2], [3], [4, 5, 6]]
+    assert model.calls == [(6, {"imgsz": 640})]
+    assert (server.calls, server.images, server.requests) == (1, 6, 3)
+
+
+def test_different_parameters_go_in_separate_calls():
+    model = EchoModel()
+    server = InferenceServer(model, max_batch=4, max_wait=2.0)
+    try:
+        out = run_clients(server, [(images(1), {"imgsz": 640, "classes": [2]}), (images(2), {"imgsz": 320, "classes": [2]}),
+                                   (images(3), {"imgsz": 640, "classes": [2]}), (images(4), {"imgsz": 320, "classes": [2]})])
+    finally:
+        server.close()
+    assert out == [[1], [2], [3], [4]]
+    assert sorted(n for n, _ in model.calls) == [2, 2] and server.calls == 2
+
+
+def test_errors_reach_only_their_requests():
+    model = EchoModel()
+    server = InferenceServer(model, max_batch=2, max_wait=2.0)
+    try:
+        out = run_clients(server, [(images(1), {"imgsz": -1}), (images(2), {"imgsz": 640})])
+    finally:
+        server.close()
+    assert isinstance(out[0], RuntimeError) and out[1] == [2]
+
+
+def test_close_finishes_pending_requests():
+    model = EchoModel()
+    server = InferenceServer(model, max_batch=16, max_wait=0.5)
+    future = server.submit(images(7), {})
+    server.close()
+    assert future.result(timeout=1) == [7]
+    with pytest.raises(RuntimeError):
+        server.submit(images(8), {})
@@ -0,0 +1,73 @@
+# tests/test_kalman.py
+import numpy as np
+import pytest
+
+from kalman import CHI2INV95, KalmanBoxFilter, cxcywh_to_xyxy, xyxy_to_cxcywh
+
+
+def moving_boxes(n_steps, start=(100.0, 200.0), size=(60.0, 40.0), vel=(10.0, -4.0)):
+    t = np.arange(n_steps)[:, None]
+    c = np.asarray(start) + t * np.asarray(vel)
+    return np.hstack([c - 0.5 * np.asarray(size), c + 0.5 * np.asarray(size)])
+
+
+def test_box_conversions_round_trip():
+    boxes = np.array([[10, 20, 50, 80], [0, 0, 1, 1]], dtype=np.float64)
+    np.testing.assert_allclose(xyxy_to_cxcywh(boxes), [[30, 50, 40, 60], [0.5, 0.5, 1, 1]])
+    np.testing.assert_allclose(cxcywh_to_xyxy(xyxy_to_cxcywh(boxes)), boxes)
+
+
+def test_learns_constant_velocity():
+    kf = KalmanBoxFilter()
+    boxes = moving_boxes(15)
+    mean, cov = kf.initiate(boxes[:1])
+    for box in boxes[1:]:
+        mean, cov = kf.predict(mean, cov)
+        mean, cov = kf.update(mean, cov, box[None])
+    np.testing.assert_allclose(mean[0, 4:6], [10.0, -4.0], atol=0.5)
+    pred, _ = kf.predict(mean, cov)
+    np.testing.assert_allclose(kf.boxes(pred)[0], moving_boxes(16)[-1], atol=1.0)
+
+
+def test_batched_update_matches_single_tracks():
+    kf = KalmanBoxFilter()
+    rng = np.random.default_rng(0)
+    boxes = moving_boxes(3) + rng.normal(0, 2, (3, 4))
+    mean, cov = kf.predict(*kf.initiate(boxes))
+    meas = boxes + rng.normal(0, 3, (3, 4))
+    b_mean, b_cov = kf.update(mean, cov, meas)
+    for i in range(3):
+        m, c = kf.update(mean[i:i + 1], cov[i:i + 1], meas[i:i + 1])
+        # forma clásica: K = P H^T S^-1
+        _, S = kf.project(mean[i:i + 1], cov[i:i + 1])
+        K = cov[i] @ kf.H.T @ np.linalg.inv(S[0])
+        np.testing.assert_allclose(m[0], mean[i] + K @ (xyxy_to_cxcywh(meas[i])[0] - mean[i, :4]))
+        np.testing.assert_allclose(b_mean[i], m[0])
+        np.testing.assert_allclose(b_cov[i], c[0])
+    assert (np.linalg.eigvalsh(b_cov) > 0).all()
+
+
+def test_gate_accepts_close_and_rejects_far_boxes():
+    kf = KalmanBoxFilter()
+    boxes = np.array([[100, 100, 160, 140], [400, 300, 440, 330]], dtype=np.float64)
+    mean, cov = kf.predict(*kf.initiate(boxes))
+    dets = np.vstack([boxes + 2, boxes + 150])
+    gate = kf.gate(mean, cov, dets)
+    assert gate.shape == (2, 4)
+    assert gate.tolist() == [[True, False, False, False], [False, True, False, False]]
+    assert kf.gating_threshold == CHI2INV95[4]
+
+
+def test_gating_distance_pairs_match_dense():
+    kf = KalmanBoxFilter()
+    rng = np.random.default_rng(1)
+    mean, cov = kf.predict(*kf.initiate(moving_boxes(5)))
+    dets = moving_boxes(7) + rng.normal(0, 5, (7, 4))
+    dense = kf.gating_distance(mean, cov, dets)
+    # Mahalanobis explícita para una pareja
+    proj, S = kf.project(mean, cov)
+    d = xyxy_to_cxcywh(dets[3])[0] - proj[2]
+    assert dense[2, 3] == pytest.approx(d @ np.linalg.inv(S[2]) @ d)
+    rows, cols = np.nonzero(rng.random(dense.shape) < 0.5)
+    np.testing.assert_allclose(kf.gating_distance(mean, cov, dets, rows, cols), dense[rows, cols])
+    np.testing.assert_array_equal(kf.gate(mean, cov, dets, rows, cols), kf.gate(mean, cov, dets)[rows, cols])
@@ -0,0 +1,46 @@
+# tests/test_mp_pipeline.py
+import multiprocessing as mp
+
+import numpy as np
+import pytest
+
+from mp_pipeline import FrameRing
+
+
+def fill_slot(name, slots, shape, slot, value):
+    ring = FrameRing(slots, shape, name=name)
+    ring[slot][...] = value
+    ring.close()
+
+
+def test_ring_is_shared_without_copies():
+    ring = FrameRing(4, (6, 8, 3), create=True)
+    try:
+        ring[1][...] = 7
+        other = FrameRing(4, (6, 8, 3), name=ring.name)
+        assert not other.owner and (other[1] == 7).all() and not other[0].any()
+        other[2][0, 0] = 99                          # misma memoria en los dos sentidos
+        assert ring[2][0, 0, 0] == 99
+        other.unlink()                               # solo el creador borra el segmento
+        other.close()
+
+        proc = mp.get_context("spawn").Process(target=fill_slot, args=(ring.name, 4, (6, 8, 3), 3, 42))
+        proc.start()
+        proc.join(timeout=30)
+        assert proc.exitcode == 0 and (ring[3] == 42).all()
+    finally:
+        ring.close()
+        ring.unlink()
+    with pytest.raises(FileNotFoundError):
+        FrameRing(4, (6, 8, 3), name=ring.name)
+
+
+def test_close_with_live_views():
+    ring = FrameRing(2, (4, 4), create=True)
+    view = ring[0]
+    view[...] = 1
+    ring.close()                                     # BufferError por la vista: no debe fallar
+    ring.unlink()
+    assert view.sum() == 16                          # el mapeo sigue vivo mientras haya vistas
+    del view
+    ring.close()
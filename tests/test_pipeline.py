@@ -0,0 +1,171 @@
+# tests/test_pipeline.py
+import io
+import threading
+
+import numpy as np
+import pytest
+
+import pipeline
+from pipeline import FfmpegWriter, ThreadedCapture, ThreadedWriter
+
+
+class CountingSource:
+    """Fuente de frames numerados (frame lleno con su índice) con index/pts como las de sources.py."""
+    def __init__(self, n, fail_at=None):
+        self.n = n
+        self.fail_at = fail_at
+        self.index = -1
+        self.pts = None
+        self.reads = 0
+        self.released = False
+
+    def read(self):
+        if self.reads == self.fail_at:
+            raise IOError("fallo de lectura")
+        if self.reads >= self.n:
+            return False, None
+        self.index = 2 * self.reads
+        self.pts = self.index * 40.0
+        self.reads += 1
+        return True, np.full((2, 2), self.reads - 1, dtype=np.int32)
+
+    def get(self, prop_id):
+        return 25.0
+
+    def isOpened(self):
+        return not self.released
+
+    def release(self):
+        self.released = True
+
+
+def test_threaded_capture_keeps_order_index_and_pts():
+    src = CountingSource(50)
+    cap = ThreadedCapture(src, maxsize=4)
+    seen = []
+    while True:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        seen.append((int(frame[0, 0]), cap.index, cap.pts))
+    assert seen == [(i, 2 * i, 80.0 * i) for i in range(50)]
+    assert cap.read() == (False, None) and cap.get(0) == 25.0
+    cap.release()
+    assert src.released
+
+
+def test_threaded_capture_bounded_queue_and_early_release():
+    src = CountingSource(10_000)
+    cap = ThreadedCapture(src, maxsize=3)
+    assert cap.read()[0]
+    cap.release()                          # sin leer el resto: el hilo no se queda bloqueado
+    assert src.released and src.reads < 10
+    assert not cap._thread.is_alive()
+
+
+def test_threaded_capture_reraises_decoder_errors():
+    cap = ThreadedCapture(CountingSource(10, fail_at=3))
+    for _ in range(3):
+        assert cap.read()[0]
+    with pytest.raises(IOError):
+        cap.read()
+    cap.release()
+
+
+class ListWriter:
+    def __init__(self, fail_at=None):
+        self.frames = []
+        self.fail_at = fail_at
+        self.released = False
+        self.thread = None
+
+    def write(self, frame):
+        self.thread = threading.current_thread().name
+        if len(self.frames) == self.fail_at:
+            raise IOError("disco lleno")
+        self.frames.append(int(frame[0, 0]))
+
+    def release(self):
+        self.released = True
+
+
+def test_threaded_writer_writes_in_order_and_flushes_on_release():
+    inner = ListWriter()
+    writer = ThreadedWriter(inner, maxsize=2)
+    for i in range(30):
+        writer.write(np.full((2, 2), i))
+    writer.release()
+    assert inner.frames == list(range(30)) and inner.released and inner.thread == "encoder"
+
+
+def test_threaded_writer_reports_errors():
+    inner = ListWriter(fail_at=2)
+    writer = ThreadedWriter(inner, maxsize=2)
+    with pytest.raises(IOError):
+        for i in range(100):
+            writer.write(np.full((2, 2), i))
+    with pytest.raises(IOError):
+        writer.release()
+    assert inner.frames == [0, 1] and inner.released
+
+
+class FakePopen:
+    """subprocess.Popen de ffmpeg: guarda el comando y lo escrito por stdin."""
+    instances = []
+    returncode = 0
+
+    def __init__(self, cmd, stdin=None, stdout=None, stderr=None):
+        self.cmd = cmd
+        self.stdin = io.BytesIO()
+        self.stdin.close = lambda: None
+        self.stderr = io.BytesIO(b"" if FakePopen.returncode == 0 else b"x264 error")
+        FakePopen.instances.append(self)
+
+    def poll(self):
+        return None
+
+    def wait(self):
+        return FakePopen.returncode
+
+
+@pytest.fixture
+def fake_ffmpeg(monkeypatch):
+    FakePopen.instances, FakePopen.returncode = [], 0
+    monkeypatch.setattr(pipeline.subprocess, "Popen", FakePopen)
+    return FakePopen
+
+
+def test_ffmpeg_writer_pipes_raw_frames(fake_ffmpeg, tmp_path):
+    writer = FfmpegWriter(tmp_path / "out.mp4", 12.5, 6, 4, preset="fast", crf=20)
+    assert writer.isOpened()
+    (proc,) = fake_ffmpeg.instances
+    cmd = proc.cmd
+    assert cmd[cmd.index("-s") + 1] == "6x4" and cmd[cmd.index("-r") + 1] == "12.5"
+    assert cmd[cmd.index("-preset") + 1] == "fast" and cmd[cmd.index("-crf") + 1] == "20"
+    assert cmd[cmd.index("-movflags") + 1] == "+faststart" and cmd[-1] == str(tmp_path / "out.mp4")
+    frames = [np.full((4, 6, 3), i, dtype=np.uint8) for i in range(3)]
+    for f in frames:
+        writer.write(f)
+    writer.write(np.asfortranarray(frames[0]))          # se escribe contiguo
+    with pytest.raises(ValueError):
+        writer.write(np.zeros((4, 5, 3), dtype=np.uint8))
+    writer.release()
+    assert proc.stdin.getvalue() == b"".join(f.tobytes() for f in frames + frames[:1])
+    assert not writer.isOpened()
+    writer.release()                                    # idempotente
+
+
+def test_ffmpeg_writer_fragmented_and_errors(fake_ffmpeg, tmp_path):
+    writer = FfmpegWriter(tmp_path / "out.mp4", 25, 4, 2, fragmented=True)
+    cmd = fake_ffmpeg.instances[0].cmd
+    assert "frag_keyframe" in cmd[cmd.index("-movflags") + 1]
+    fake_ffmpeg.returncode = 1
+    with pytest.raises(RuntimeError):
+        writer.release()
+
+
+def test_ffmpeg_writer_without_ffmpeg(monkeypatch, tmp_path):
+    def missing(*args, **kw):
+        raise FileNotFoundError("ffmpeg")
+    monkeypatch.setattr(pipeline.subprocess, "Popen", missing)
+    assert not FfmpegWriter(tmp_path / "out.mp4", 25, 4, 2).isOpened()
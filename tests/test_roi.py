@@ -0,0 +1,62 @@
+# tests/test_roi.py
+import numpy as np
+import pytest
+
+from roi import RoiMosaic, merge_rois, parse_rois, track_crops
+
+
+def test_mosaic_packs_without_overlap_and_round_trips():
+    rois = [(0, 300, 960, 420), (190, 50, 380, 270), (720, 50, 910, 270), (400, 0, 500, 40)]
+    mosaic = RoiMosaic(rois, 960, 540, imgsz=960)
+    frame = np.random.default_rng(0).integers(0, 256, size=(540, 960, 3), dtype=np.uint8)
+    canvas = mosaic.compose(frame)
+    assert canvas.shape[:2] == mosaic.shape and mosaic.imgsz <= 960 and mosaic.imgsz % 32 == 0
+    placed = []
+    for (x1, y1, x2, y2), (ox, oy) in zip(rois, mosaic.offsets):
+        w, h = x2 - x1, y2 - y1
+        np.testing.assert_array_equal(canvas[oy:oy + h, ox:ox + w], frame[y1:y2, x1:x2])
+        placed.append((ox, oy, ox + w, oy + h))
+    for i, a in enumerate(placed):
+        for b in placed[i + 1:]:
+            assert a[2] <= b[0] or b[2] <= a[0] or a[3] <= b[1] or b[3] <= a[1]
+
+    # una caja dentro de cada recorte vuelve a sus coordenadas del frame
+    frame_boxes = np.array([[100, 320, 160, 360], [200, 60, 260, 100], [800, 200, 900, 260], [410, 5, 450, 35]], float)
+    offsets = np.array([[ox - x1, oy - y1] * 2 for (x1, y1, _, _), (ox, oy) in zip(rois, mosaic.offsets)])
+    boxes, idx = mosaic.to_frame(frame_boxes + offsets)
+    assert idx.tolist() == [0, 1, 2, 3]
+    np.testing.assert_allclose(boxes, frame_boxes)
+
+
+def test_mosaic_clips_to_the_crop_and_drops_boxes_in_gaps():
+    rois = [(0, 0, 100, 100), (200, 0, 300, 100)]
+    mosaic = RoiMosaic(rois, 400, 100, imgsz=640, gap=16)
+    ox = mosaic.offsets[1][0]
+    boxes = np.array([[70, 10, 120, 50],          # centro en el primer recorte, sale por la derecha
+                      [102, 10, 112, 20],         # en el hueco entre recortes
+                      [ox + 10, 10, ox + 40, 50]], float)
+    out, idx = mosaic.to_frame(boxes)
+    assert idx.tolist() == [0, 2]
+    np.testing.assert_allclose(out, [[70, 10, 100, 50], [210, 10, 240, 50]])
+
+
+def test_merge_and_parse_rois():
+    assert merge_rois([(0, 0, 100, 100), (10, 10, 105, 100)]) == [(0, 0, 105, 100)]
+    assert len(merge_rois([(0, 0, 100, 100), (300, 300, 400, 400)])) == 2
+    assert parse_rois("0,0,0.5,0.5", 200, 100) == [(0, 0, 100, 50)]
+    with pytest.raises(ValueError):
+        RoiMosaic([], 100, 100, 640)
+
+
+def test_track_crops_are_square_and_inside_the_frame():
+    boxes = np.array([[100, 100, 140, 130],      # en medio
+                      [0, 0, 30, 20],            # esquina: se desplaza hacia dentro
+                      [590, 440, 640, 480],      # esquina opuesta
+                      [0, 0, 600, 400]])         # más grande que el frame: lado = lado menor
+    crops = track_crops(boxes, 640, 480, context=2.0, min_side=64)
+    assert crops[0] == (80, 75, 160, 155)
+    assert crops[1] == (0, 0, 64, 64)
+    assert crops[2] == (540, 380, 640, 480)
+    assert crops[3][2] - crops[3][0] == crops[3][3] - crops[3][1] == 480
+    for x1, y1, x2, y2 in crops:
+        assert 0 <= x1 < x2 <= 640 and 0 <= y1 < y2 <= 480
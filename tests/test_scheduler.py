@@ -0,0 +1,102 @@
+# tests/test_scheduler.py
+import numpy as np
+import pytest
+
+from car import TrackTable
+from scheduler import InferenceScheduler, MotionGate
+from VehicleCounter import VehicleCounter
+
+
+def store_with(bbox=(100, 60, 140, 90), velocity=(0.0, 0.0), hits=5):
+    store = TrackTable()
+    row = store.add(1, bbox, 0.9, now=0.0)
+    store.hits[row] = hits
+    store.velocity[row] = velocity
+    return store
+
+
+def run_frames(scheduler, store, counters=(), frames=40):
+    return [f for f in range(frames) if scheduler.decide(f, store, counters)]
+
+
+def test_idle_scene_runs_every_max_interval():
+    scheduler = InferenceScheduler(max_interval=15)
+    assert run_frames(scheduler, TrackTable()) == [0, 15, 30]
+    assert scheduler.reasons == {"start": 1, "idle": 2}
+
+
+def test_fast_track_shortens_the_interval():
+    # caja de 40 px a 10 px/frame: 0.5 * 40 / 10 = 2 frames
+    scheduler = InferenceScheduler(max_interval=15)
+    assert run_frames(scheduler, store_with(velocity=(10.0, 0.0)), frames=9) == [0, 2, 4, 6, 8]
+    assert scheduler.reasons["motion"] == 4
+
+
+def test_new_tracks_are_confirmed_quickly():
+    scheduler = InferenceScheduler(max_interval=15, confirm_interval=3)
+    assert run_frames(scheduler, store_with(hits=1), frames=10) == [0, 3, 6, 9]
+    assert scheduler.reasons["new"] == 3
+
+
+def test_track_approaching_a_line():
+    counter = VehicleCounter(line_position=0.5, orientation="horizontal")
+    counter.set_line_position(200, 320)                       # línea en y=100
+    # centro en y=75, baja a 5 px/frame: cruza en 5 frames (+1); el movimiento pediría 3
+    store = store_with(bbox=(100, 0, 140, 150), velocity=(0.0, 5.0))
+    scheduler = InferenceScheduler(max_interval=15, max_displacement=1.0)
+    assert run_frames(scheduler, store, [counter], frames=13) == [0, 6, 12]
+    assert scheduler.reasons["line"] == 2
+    # alejándose de la línea ya no cuenta
+    store.velocity[:] = (0.0, -5.0)
+    assert "line" not in scheduler._targets(store, [counter])
+
+
+def test_intervals_are_clamped():
+    scheduler = InferenceScheduler(min_interval=2, max_interval=4)
+    assert run_frames(scheduler, store_with(velocity=(100.0, 0.0)), frames=7) == [0, 2, 4, 6]
+    scheduler = InferenceScheduler(min_interval=2, max_interval=4)
+    assert run_frames(scheduler, TrackTable(), frames=9) == [0, 4, 8]
+    with pytest.raises(ValueError):
+        InferenceScheduler(min_interval=5, max_interval=4)
+
+
+def scene(n, moving_from=None, seed=0):
+    rng = np.random.default_rng(seed)
+    background = rng.integers(0, 256, size=(240, 320, 3), dtype=np.uint8)
+    frames = []
+    for i in range(n):
+        frame = background.copy()
+        if moving_from is not None and i >= moving_from:
+            x = 20 + 12 * (i - moving_from)
+            frame[100:160, x:x + 60] = (0, 0, 255)
+        frames.append(frame)
+    return frames
+
+
+@pytest.mark.parametrize("method", ["mog2", "diff"])
+def test_motion_gate_skips_static_frames(method):
+    gate = MotionGate(method=method, refresh_interval=1000)
+    store = TrackTable()
+    decisions = []
+    for i, frame in enumerate(scene(30, moving_from=20)):
+        gate.observe(frame)
+        decisions.append(gate.allow(i, store))
+    assert decisions[0]                                       # primera comprobación
+    assert not any(decisions[2:20])                           # escena estática
+    assert all(decisions[21:])                                # un coche cruzando
+    assert gate.skipped >= 18
+
+
+def test_motion_gate_refresh_and_moving_tracks():
+    gate = MotionGate(method="diff", refresh_interval=10)
+    store = TrackTable()
+    frames = scene(25)
+    allowed = []
+    for i, frame in enumerate(frames):
+        gate.observe(frame)
+        if gate.allow(i, store):
+            allowed.append(i)
+    assert allowed == [0, 10, 20]
+    moving = store_with(velocity=(4.0, 0.0))
+    gate.observe(frames[0])
+    assert gate.allow(21, moving)
@@ -0,0 +1,143 @@
+# tests/test_sources.py
+import shutil
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+from sources import CaptureSource, FfmpegSource, StreamSource, SyntheticSource
+
+N_FRAMES, FPS = 17, 25.0
+
+
+@pytest.fixture(scope="module")
+def clip(tmp_path_factory):
+    """Vídeo corto en el que cada frame lleva su número como nivel de gris (i * 12)."""
+    path = tmp_path_factory.mktemp("video") / "clip.avi"
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), FPS, (64, 48))
+    if not writer.isOpened():
+        pytest.skip("OpenCV sin códec MJPG")
+    for i in range(N_FRAMES):
+        writer.write(np.full((48, 64, 3), 12 * i, dtype=np.uint8))
+    writer.release()
+    return path
+
+
+def read_all(src):
+    out = []
+    while True:
+        ok, frame = src.read()
+        if not ok:
+            return out
+        # número del frame a partir de su nivel de gris (MJPG no es exacto)
+        out.append((src.index, src.pts, int(round(frame.mean() / 12))))
+
+
+@pytest.mark.parametrize("step", [1, 3, 5])
+def test_capture_source_decimation_keeps_index_and_pts(clip, step):
+    src = CaptureSource(cv2.VideoCapture(str(clip)), step=step)
+    try:
+        frames = read_all(src)
+    finally:
+        src.release()
+    expected = list(range(0, N_FRAMES, step))
+    assert [i for i, _, _ in frames] == expected
+    assert [n for _, _, n in frames] == expected                      # el frame entregado es el del índice
+    np.testing.assert_allclose([p for _, p, _ in frames], [i * 1000.0 / FPS for i in expected], atol=1.0)
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="sin ffmpeg en el PATH")
+@pytest.mark.parametrize("step, scale", [(1, 1.0), (4, 1.0), (3, 0.5)])
+def test_ffmpeg_source_decimation_keeps_index_and_pts(clip, step, scale):
+    src = FfmpegSource(clip, step=step, scale=scale)
+    try:
+        assert (src.get(cv2.CAP_PROP_FRAME_WIDTH), src.get(cv2.CAP_PROP_FRAME_HEIGHT)) == (64 * scale, 48 * scale)
+        frames = read_all(src)
+    finally:
+        src.release()
+    expected = list(range(0, N_FRAMES, step))
+    assert [i for i, _, _ in frames] == expected
+    assert [n for _, _, n in frames] == expected
+    assert [p for _, p, _ in frames] == [i * 1000.0 / FPS for i in expected]
+    assert src.read() == (False, None)
+
+
+class Closed:
+    def isOpened(self):
+        return False
+
+    def release(self):
+        pass
+
+
+class SlowStart(SyntheticSource):
+    """Cámara que tarda en entregar el primer frame."""
+    def __init__(self, delay, **kw):
+        super().__init__(**kw)
+        self._delay = delay
+
+    def read(self):
+        if self._delay:
+            time.sleep(self._delay)
+            self._delay = 0
+        return super().read()
+
+
+def flaky_opener(failures, make):
+    calls = []
+
+    def opener():
+        calls.append(1)
+        return Closed() if len(calls) <= failures else make()
+    return opener, calls
+
+
+def test_first_frame_survives_failed_connections():
+    opener, calls = flaky_opener(2, lambda: SyntheticSource(160, 120, live=True))
+    src = StreamSource("fake://cam", reconnect_delay=0.01, max_retries=3, opener=opener)
+    try:
+        assert len(calls) == 3 and src.reconnects == 2
+        assert (src.width, src.height) == (160, 120)
+        ok, frame = src.read()
+        assert ok and frame.shape == (120, 160, 3) and src.index == 0
+    finally:
+        src.release()
+
+
+def test_first_frame_may_take_longer_than_read_timeout():
+    src = StreamSource("fake://cam", read_timeout=0.05, opener=lambda: SlowStart(0.3, width=64, height=48, frames=3))
+    try:
+        assert (src.width, src.height) == (64, 48)
+    finally:
+        src.release()
+
+
+def test_gives_up_when_retries_are_exhausted():
+    opener, calls = flaky_opener(10, lambda: SyntheticSource(frames=1))
+    with pytest.raises(IOError):
+        StreamSource("fake://cam", reconnect_delay=0.01, max_retries=2, opener=opener)
+    assert len(calls) == 3
+
+
+def test_read_times_out_while_reconnecting():
+    opener, calls = flaky_opener(0, lambda: SyntheticSource(frames=1) if len(calls) == 1 else Closed())
+    src = StreamSource("fake://cam", reconnect_delay=5.0, read_timeout=0.1, opener=opener)
+    try:
+        assert src.read()[0]
+        t0 = time.perf_counter()
+        assert src.read() == (False, None)
+        assert time.perf_counter() - t0 < 1.0 and src.isOpened()   # sigue reconectando
+    finally:
+        src.release()
+
+
+def test_read_without_timeout_waits_until_retries_are_exhausted():
+    opener, calls = flaky_opener(0, lambda: SyntheticSource(frames=1) if len(calls) == 1 else Closed())
+    src = StreamSource("fake://cam", reconnect_delay=0.05, max_retries=2, opener=opener)
+    try:
+        assert src.read()[0]
+        assert src.read() == (False, None)
+        assert len(calls) == 3 and not src.isOpened()   # la conexión buena y 2 reintentos
+    finally:
+        src.release()
@@ -0,0 +1,91 @@
+# tests/test_stats.py
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from stats import (GroupedStats, RunningStats, direction_bucket, frame_time, hour_bucket, recording_start,
+                   region_bucket)
+
+
+def test_running_stats_matches_numpy():
+    xs = np.random.default_rng(0).normal(3.0, 2.0, size=500)
+    stats = RunningStats()
+    stats.update_many(xs)
+    assert stats.count == 500
+    assert stats.mean == pytest.approx(xs.mean())
+    assert stats.var == pytest.approx(xs.var())
+
+
+def test_running_stats_decay_weights_recent_samples():
+    xs = np.random.default_rng(1).normal(size=50)
+    decay = 0.9
+    stats = RunningStats(decay)
+    stats.update_many(xs)
+    w = decay ** np.arange(len(xs))[::-1]       # la última muestra pesa 1
+    mean = np.sum(w * xs) / w.sum()
+    assert stats.weight == pytest.approx(w.sum())
+    assert stats.mean == pytest.approx(mean)
+    assert stats.var == pytest.approx(np.sum(w * (xs - mean) ** 2) / w.sum())
+
+
+def test_running_stats_decay_follows_a_level_change():
+    stats = RunningStats(0.8)
+    stats.update_many([0.0] * 50 + [10.0] * 30)
+    assert stats.mean == pytest.approx(10.0, abs=0.05)
+
+
+def test_running_stats_vectors():
+    xs = np.random.default_rng(2).normal(size=(100, 2))
+    stats = RunningStats()
+    stats.update_many(xs)
+    np.testing.assert_allclose(stats.mean, xs.mean(axis=0))
+    np.testing.assert_allclose(stats.var, xs.var(axis=0))
+
+
+@pytest.mark.parametrize("decay", [0.0, 1.0, -0.5])
+def test_running_stats_rejects_invalid_decay(decay):
+    with pytest.raises(ValueError):
+        RunningStats(decay)
+
+
+def test_empty_stats_return_none():
+    assert RunningStats().mean is None and RunningStats().var is None
+    assert GroupedStats().mean("a") is None
+
+
+def test_grouped_stats_falls_back_to_total_below_min_count():
+    stats = GroupedStats(min_count=3)
+    for x in (10.0, 10.0, 10.0):
+        stats.update(x, "a")
+    for x in (0.0, 0.0):
+        stats.update(x, "b")
+    assert stats.mean("a") == pytest.approx(10.0)
+    assert stats.mean("b") == pytest.approx(6.0)           # solo 2 muestras: la global
+    assert stats.mean("c") == stats.mean() == pytest.approx(6.0)
+    stats.update(0.0, "b")
+    assert stats.mean("b") == pytest.approx(0.0)
+
+
+def test_buckets():
+    assert region_bucket((0, 0), (90, 120)) == (0, 0)
+    assert region_bucket((119.9, 89.9), (90, 120)) == (2, 2)
+    assert region_bucket((200, -5), (90, 120)) == (2, 0)   # fuera del frame: celda del borde
+    assert direction_bucket((3.0, -0.2)) == (1, 0)
+    assert direction_bucket((-0.6, 4.0)) == (-1, 1)
+    assert 0 <= hour_bucket(0.0) < 24 and 0 <= hour_bucket(0.0, hours=6) < 4
+
+
+def test_recording_start_and_frame_time(tmp_path):
+    assert recording_start("2025-03-01T07:30:00") == datetime(2025, 3, 1, 7, 30).timestamp()
+    video = tmp_path / "clip.mp4"
+    video.write_bytes(b"")
+    os.utime(video, (1_000_000.0, 1_000_000.0))
+    assert recording_start(None, video, frames=250, fps=25.0) == 1_000_000.0 - 10.0
+    assert recording_start(None, video) == 1_000_000.0                  # duración desconocida
+    t0 = time.time()
+    assert t0 <= recording_start(None, "rtsp://cam/1") <= time.time()
+    assert frame_time(100.0, 50, pts=2040.0) == pytest.approx(102.04)
+    assert frame_time(100.0, 50, fps=25.0) == pytest.approx(102.0)
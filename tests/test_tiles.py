@@ -0,0 +1,66 @@
+# tests/test_tiles.py
+import numpy as np
+import pytest
+
+from fake_yolo import RedBoxModel, draw_cars
+from tiles import TiledDetector, merge_tile_boxes, parse_tiles, tile_grid
+
+
+@pytest.mark.parametrize("width, height, cols, rows, overlap",
+                         [(1920, 1080, 3, 2, 0.2), (3840, 1080, 4, 1, 0.25), (1000, 700, 1, 1, 0.2), (999, 701, 3, 3, 0.1)])
+def test_tile_grid_covers_the_frame(width, height, cols, rows, overlap):
+    tiles = tile_grid(width, height, cols, rows, overlap)
+    assert len(tiles) == cols * rows
+    assert len({(x2 - x1, y2 - y1) for x1, y1, x2, y2 in tiles}) == 1      # todas iguales
+    covered = np.zeros((height, width), dtype=bool)
+    for x1, y1, x2, y2 in tiles:
+        assert 0 <= x1 < x2 <= width and 0 <= y1 < y2 <= height
+        covered[y1:y2, x1:x2] = True
+    assert covered.all()
+    tw = tiles[0][2] - tiles[0][0]
+    if cols > 1:                                   # vecinas en x solapadas ~overlap de la tesela
+        assert tiles[0][2] - tiles[1][0] >= int(overlap * tw) - 1
+
+
+def test_parse_tiles():
+    assert parse_tiles("2x1", 960, 540, overlap=0.2) == tile_grid(960, 540, 2, 1, 0.2)
+    assert parse_tiles("0,0,600,540;400,0,960,540", 960, 540) == [(0, 0, 600, 540), (400, 0, 960, 540)]
+    with pytest.raises(ValueError):
+        tile_grid(960, 540, 0, 1)
+
+
+def test_merge_tile_boxes():
+    boxes = np.array([[380, 200, 534, 260],        # coche partido: cortado por la derecha de la tesela 0
+                      [426, 200, 600, 260],        # y por la izquierda de la 1
+                      [100, 100, 140, 130],        # otro coche, entero en la tesela 0
+                      [110, 105, 150, 135]], float)  # misma tesela: no se une (lo resuelve NMS)
+    merged, confs, classes = merge_tile_boxes(boxes, np.array([0.8, 0.6, 0.9, 0.7]), np.array([2, 2, 2, 7]),
+                                              np.array([0, 1, 0, 0]), np.array([True, True, False, False]))
+    assert merged.tolist() == [[380, 200, 600, 260], [100, 100, 140, 130], [110, 105, 150, 135]]
+    assert confs.tolist() == [0.8, 0.9, 0.7] and classes.tolist() == [2, 2, 7]
+
+
+def test_tiled_detector_joins_a_car_across_tiles():
+    tiles = tile_grid(960, 540, 2, 1, 0.2)                                 # x 0..534 y 426..960
+    model = RedBoxModel(sharp_scale=0.0)
+    det = TiledDetector(model, tiles, 960, 540, conf=0.5, tile_imgsz=640)
+    out = det(draw_cars((540, 960), [(380, 200, 600, 260), (800, 400, 860, 440)]))
+    np.testing.assert_allclose(out[np.argsort(out[:, 0])],
+                               [[380, 200, 600, 260, 0.9, 2], [800, 400, 860, 440, 0.9, 2]], rtol=1e-6)
+    assert model.calls == [(2, 640, (540, 534, 3))]
+
+
+def test_tiled_detector_skips_idle_tiles():
+    model = RedBoxModel(sharp_scale=0.0)
+    det = TiledDetector(model, tile_grid(960, 540, 2, 1, 0.2), 960, 540, refresh_interval=100)
+    frame = draw_cars((540, 960), [(800, 400, 860, 440)])                 # solo en la tesela 1
+    det(frame, 0)
+    # sin movimiento ni tracks: solo la tesela con detecciones recientes
+    det(frame, 1)
+    assert det.tiles_run == 3 and model.calls[-1][0] == 1
+    # un track vivo dentro de la tesela inactiva la vuelve a inferir
+    det(frame, 2, track_boxes=np.array([[100, 100, 140, 130]]))
+    assert det.tiles_run == 5
+    # refresco periódico: todas
+    det(frame, 100)
+    assert det.tiles_run == 7
@@ -0,0 +1,73 @@
+# tests/test_tracker.py
+import numpy as np
+import pytest
+
+from tracker import Tracker, Tracker_predict
+from utilities import make_detections
+
+FRAME = np.zeros((240, 320, 3), dtype=np.uint8)
+
+
+def dets(*boxes):
+    return make_detections(list(boxes), [0.9] * len(boxes))
+
+
+def drive(tracker, box, velocity, steps, now=0.0):
+    """Un coche que avanza velocity px/frame durante steps frames y luego desaparece (max_lost=0)."""
+    x1, y1, x2, y2 = box
+    vx, vy = velocity
+    for i in range(steps):
+        tracker.update(FRAME, dets((x1 + vx * i, y1 + vy * i, x2 + vx * i, y2 + vy * i)), now=now + i)
+    tracker.update(FRAME, dets(), now=now + steps)
+
+
+def test_update_uses_given_time():
+    tracker = Tracker()
+    tracks = tracker.update(FRAME, dets((10, 10, 50, 40)), now=1000.0)
+    tracks = tracker.update(FRAME, dets((12, 10, 52, 40)), now=1000.5)
+    (car,) = tracks.values()
+    assert (car.created_at, car.last_seen) == (1000.0, 1000.5)
+
+
+@pytest.mark.parametrize("motion", ["linear", "kalman"])
+def test_speed_prior_seeds_new_tracks(motion):
+    tracker = Tracker_predict(max_lost=0, motion=motion)
+    drive(tracker, (10, 100, 50, 130), (10, 0), 6)
+    np.testing.assert_allclose(tracker.avg_speed, [10.0, 0.0])
+    assert not tracker.tracks
+
+    tracker.update(FRAME, dets((10, 20, 50, 50)), now=10.0)
+    (car,) = tracker.tracks.values()
+    assert (car.speed_x, car.speed_y) == (10.0, 0.0)
+    row = tracker.store.row_of(car.track_id)
+    if motion == "kalman":
+        np.testing.assert_allclose(tracker.store.kf_mean[row, 4:6], [10.0, 0.0])
+    # la caja prevista para el siguiente frame ya avanza con el prior
+    _, boxes = tracker.predicted_boxes()
+    assert 8 <= boxes[0, 0] - 10 <= 12 and boxes[0, 1] == 20
+
+
+def test_without_history_new_tracks_start_still():
+    tracker = Tracker_predict(motion="linear")
+    tracker.update(FRAME, dets((10, 20, 50, 50)), now=0.0)
+    (car,) = tracker.tracks.values()
+    assert (car.speed_x, car.speed_y) == (0.0, 0.0)
+    assert tracker.predicted_boxes()[1].tolist() == [[10, 20, 50, 50]]
+
+
+def test_direction_groups_pick_the_dominant_direction_of_the_cell():
+    tracker = Tracker_predict(max_lost=0, motion="linear", speed_groups="direction")
+    # misma celda (centro del frame): 5 coches a la derecha a 8 px/frame y 6 a la izquierda a 6
+    for i in range(5):
+        drive(tracker, (130, 100, 170, 130), (8, 0), 4, now=100.0 * i)
+    for i in range(6):
+        drive(tracker, (130, 100, 170, 130), (-6, 0), 4, now=1000.0 + 100.0 * i)
+    assert abs(tracker.avg_speed[0]) < 1
+    tracker.update(FRAME, dets((140, 100, 180, 130)), now=2000.0)
+    (car,) = tracker.tracks.values()
+    assert (car.speed_x, car.speed_y) == (-6.0, 0.0)
+
+
+def test_invalid_speed_groups():
+    with pytest.raises(ValueError):
+        Tracker_predict(speed_groups="lane")
@@ -0,0 +1,179 @@
+# tests/test_utilities.py
+import cv2
+import numpy as np
+import pytest
+
+import utilities
+from utilities import (FrameFeatures, assign, assign_pairs, center_distance_gate, compute_grad_hist, compute_hsv_hist,
+                       greedy_assignment, iou, iou_candidates, iou_matrix, linear_sum_assignment, optimal_assignment,
+                       overlap_pairs)
+
+needs_scipy = pytest.mark.skipif(linear_sum_assignment is None, reason="el modo 'hungarian' necesita scipy")
+
+
+def random_boxes(rng, n, size=400):
+    xy = rng.integers(0, size, size=(n, 2))
+    wh = rng.integers(1, 80, size=(n, 2))
+    return np.hstack([xy, xy + wh])
+
+
+def legacy_greedy(score_mat, threshold):
+    """Argmax repetido sobre la matriz, como hacían los trackers antes de greedy_assignment."""
+    score_mat = score_mat.astype(np.float64).copy()
+    pairs = []
+    while score_mat.size:
+        r, c = np.unravel_index(np.argmax(score_mat), score_mat.shape)
+        if score_mat[r, c] < threshold:
+            break
+        pairs.append((int(r), int(c)))
+        score_mat[r, :] = -1
+        score_mat[:, c] = -1
+    return pairs
+
+
+def test_iou_matrix_matches_iou():
+    rng = np.random.default_rng(0)
+    a, b = random_boxes(rng, 25), random_boxes(rng, 18)
+    expected = np.array([[iou(tuple(x), tuple(y)) for y in b] for x in a])
+    mat = iou_matrix(a, b)
+    assert mat.shape == (25, 18) and mat.dtype == np.float32
+    np.testing.assert_allclose(mat, expected, rtol=1e-6, atol=1e-7)
+
+
+def test_iou_matrix_edge_cases():
+    assert iou_matrix(np.zeros((0, 4)), [(0, 0, 10, 10)]).shape == (0, 1)
+    assert iou_matrix([(0, 0, 10, 10)], []).shape == (1, 0)
+    # cajas que solo se tocan en un borde, idénticas y contenida
+    mat = iou_matrix([(0, 0, 10, 10)], [(10, 0, 20, 10), (0, 0, 10, 10), (0, 0, 5, 10)])
+    np.testing.assert_allclose(mat, [[0.0, 1.0, 0.5]], atol=1e-6)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_greedy_assignment_matches_argmax_loop(seed):
+    rng = np.random.default_rng(seed)
+    a, b = random_boxes(rng, 30, size=200), random_boxes(rng, 22, size=200)
+    mat = iou_matrix(a, b)
+    rows, cols = greedy_assignment(mat, 0.1)
+    assert list(zip(rows.tolist(), cols.tolist())) == legacy_greedy(mat, 0.1)
+
+
+def test_greedy_assignment_ties_follow_argmax():
+    mat = np.array([[0.5, 0.5], [0.5, 0.5]], dtype=np.float32)
+    rows, cols = greedy_assignment(mat, 0.3)
+    assert list(zip(rows.tolist(), cols.tolist())) == [(0, 0), (1, 1)]
+    rows, cols = greedy_assignment(mat, 0.6)
+    assert len(rows) == 0 and len(cols) == 0
+
+
+def brute_force_best(score_mat, threshold):
+    """Suma máxima de scores (>= threshold) con cada fila y columna usada como mucho una vez."""
+    best = 0.0
+
+    def walk(r, used, total):
+        nonlocal best
+        if r == score_mat.shape[0]:
+            best = max(best, total)
+            return
+        walk(r + 1, used, total)
+        for c in range(score_mat.shape[1]):
+            if c not in used and score_mat[r, c] >= threshold:
+                walk(r + 1, used | {c}, total + score_mat[r, c])
+
+    walk(0, frozenset(), 0.0)
+    return best
+
+
+@needs_scipy
+@pytest.mark.parametrize("seed", range(10))
+def test_optimal_assignment_is_optimal(seed):
+    rng = np.random.default_rng(seed)
+    mat = rng.random((6, 5)) * (rng.random((6, 5)) < 0.5)
+    rows, cols = optimal_assignment(mat, 0.2)
+    assert len(set(rows.tolist())) == len(rows) and len(set(cols.tolist())) == len(cols)
+    assert (mat[rows, cols] >= 0.2).all()
+    assert mat[rows, cols].sum() == pytest.approx(brute_force_best(mat, 0.2))
+
+
+def test_assign_respects_gate():
+    mat = np.array([[0.9, 0.8], [0.7, 0.1]], dtype=np.float32)
+    gate = np.array([[False, True], [True, True]])
+    for mode in ("greedy", "hungarian") if linear_sum_assignment is not None else ("greedy",):
+        rows, cols = assign(mat, 0.3, mode, gate)
+        assert sorted(zip(rows.tolist(), cols.tolist())) == [(0, 1), (1, 0)]
+    with pytest.raises(ValueError):
+        assign(mat, 0.3, "nope")
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_overlap_pairs_finds_every_overlap(seed):
+    rng = np.random.default_rng(seed)
+    a, b = random_boxes(rng, 60), random_boxes(rng, 50)
+    rows, cols = overlap_pairs(a, b)
+    expected = np.argwhere(iou_matrix(a, b) > 0)
+    found = np.stack([rows, cols], axis=1)
+    # todas las parejas con IoU > 0, en orden fila-columna
+    assert {tuple(p) for p in expected.tolist()} <= {tuple(p) for p in found.tolist()}
+    assert np.array_equal(found, found[np.lexsort((cols, rows))])
+
+
+@pytest.mark.parametrize("sparse", [False, True])
+@pytest.mark.parametrize("mode", ["greedy", pytest.param("hungarian", marks=needs_scipy)])
+def test_candidate_pairs_match_dense_assignment(monkeypatch, sparse, mode):
+    if sparse:
+        monkeypatch.setattr(utilities, "SPARSE_MIN_PAIRS", 0)
+    rng = np.random.default_rng(3)
+    for _ in range(20):
+        a, b = random_boxes(rng, 40, size=250), random_boxes(rng, 30, size=250)
+        mat = iou_matrix(a, b)
+        gate = center_distance_gate(a, b, 1.0)
+        rows, cols, scores = iou_candidates(a, b, 0.2)
+        np.testing.assert_array_equal(scores, mat[rows, cols])
+        keep = center_distance_gate(a, b, 1.0, rows, cols)
+        np.testing.assert_array_equal(keep, gate[rows, cols])
+        got = assign_pairs(rows[keep], cols[keep], scores[keep], mat.shape, 0.2, mode)
+        expected = assign(mat, 0.2, mode, gate)
+        if mode == "greedy":
+            np.testing.assert_array_equal(got, expected)
+        else:
+            assert mat[got].sum() == pytest.approx(mat[expected].sum())
+
+
+def textured_frame(rng, width=480, height=360):
+    """Degradados y figuras de colores suavizados: gradientes con orientaciones variadas."""
+    frame = np.zeros((height, width, 3), dtype=np.uint8)
+    yy, xx = np.mgrid[:height, :width]
+    frame[..., 0] = xx * 255 // width
+    frame[..., 1] = yy * 255 // height
+    for _ in range(25):
+        color = tuple(int(v) for v in rng.integers(0, 256, 3))
+        x, y = int(rng.integers(0, width - 20)), int(rng.integers(0, height - 20))
+        cv2.rectangle(frame, (x, y), (x + int(rng.integers(10, 90)), y + int(rng.integers(10, 90))), color, -1)
+        cv2.circle(frame, (int(rng.integers(0, width)), int(rng.integers(0, height))), int(rng.integers(5, 40)), color, -1)
+    return cv2.GaussianBlur(frame, (5, 5), 0)
+
+
+def random_box(rng, lo, hi, width=480, height=360):
+    w, h = rng.integers(lo, hi, 2)
+    x, y = rng.integers(0, width - w), rng.integers(0, height - h)
+    return int(x), int(y), int(x + w), int(y + h)
+
+
+def test_frame_features_hsv_hist_is_exact():
+    rng = np.random.default_rng(0)
+    frame = textured_frame(rng)
+    features = FrameFeatures(frame, scale=1.0)
+    for _ in range(100):
+        box = random_box(rng, 5, 160)
+        np.testing.assert_array_equal(features.hsv_hist(box), compute_hsv_hist(frame, box))
+
+
+def test_frame_features_grad_hist_is_close_on_large_boxes():
+    # aproximación: el Sobel del frame entero difiere del recorte solo en el borde de la caja
+    rng = np.random.default_rng(1)
+    frame = textured_frame(rng)
+    features = FrameFeatures(frame, scale=1.0)
+    for _ in range(100):
+        box = random_box(rng, 100, 160)
+        approx, ref = features.grad_hist(box), compute_grad_hist(frame, box)
+        assert np.abs(approx - ref).max() < 0.2
+        assert np.corrcoef(approx, ref)[0, 1] > 0.9
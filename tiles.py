@@ -0,0 +1,176 @@
+# tiles.py
+from __future__ import annotations
+from typing import List, Optional, Sequence, Tuple
+import cv2
+import numpy as np
+from roi import Rect, clip_rect, parse_rois, pixel_boxes
+from tracker import Detections, yolo_result_to_detections
+from utilities import make_detections, nms
+
+
+def tile_grid(width: int, height: int, cols: int, rows: int, overlap: float = 0.2) -> List[Rect]:
+    """
+    Rejilla cols x rows de teselas iguales que se solapan overlap (fracción del lado de la
+    tesela) con sus vecinas; todas del mismo tamaño para que vayan en un solo lote.
+    """
+    if cols < 1 or rows < 1:
+        raise ValueError("la rejilla necesita al menos 1x1 teselas")
+    tw = int(np.ceil(width / (cols - (cols - 1) * overlap)))
+    th = int(np.ceil(height / (rows - (rows - 1) * overlap)))
+    xs = np.linspace(0, width - tw, cols).round().astype(int) if cols > 1 else [0]
+    ys = np.linspace(0, height - th, rows).round().astype(int) if rows > 1 else [0]
+    return [clip_rect((x, y, x + tw, y + th), width, height) for y in ys for x in xs]
+
+
+def parse_tiles(spec: str, width: int, height: int, overlap: float = 0.2) -> List[Rect]:
+    """Layout de teselas: "COLSxROWS" (rejilla) o rectángulos explícitos como en roi.parse_rois."""
+    if "x" in spec.lower() and "," not in spec:
+        cols, rows = (int(v) for v in spec.lower().split("x"))
+        return tile_grid(width, height, cols, rows, overlap)
+    # sin merge: las teselas explícitas se solapan a propósito
+    return parse_rois(spec, width, height, merge=False)
+
+
+def _is_cut(box: np.ndarray, tile: Rect, width: int, height: int, tol: float = 2.0) -> bool:
+    """True si la caja toca un borde interior de la tesela (el objeto sigue en la vecina)."""
+    x1, y1, x2, y2 = tile
+    return bool((x1 > 0 and box[0] <= x1 + tol) or (y1 > 0 and box[1] <= y1 + tol)
+                or (x2 < width and box[2] >= x2 - tol) or (y2 < height and box[3] >= y2 - tol))
+
+
+def merge_tile_boxes(boxes: np.ndarray, confs: np.ndarray, classes: np.ndarray, tile_idx: np.ndarray,
+                     cut: np.ndarray, min_overlap: float = 0.7) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Une las partes de un objeto partido entre teselas. Dos cajas de teselas distintas que se
+    tocan se sustituyen por su envolvente (con la confianza máxima y la clase de la caja más
+    segura) si
+    - una de ellas está cortada por el borde de su tesela y queda dentro de la otra en
+      >= min_overlap de su área (trozo de un objeto que la tesela vecina ve entero), o
+    - ambas están cortadas y coinciden en >= min_overlap de su extensión a lo largo del corte
+      (objeto más grande que el solape, partido en dos).
+    Los duplicados que quedan los quita NMS. Devuelve (cajas, confianzas, clases).
+    """
+    boxes = boxes.astype(np.float64).copy()
+    confs = confs.astype(np.float64).copy()
+    classes = np.asarray(classes).copy()
+    cut = np.asarray(cut, dtype=bool).copy()
+    alive = np.ones(len(boxes), dtype=bool)
+    order = np.argsort(-confs)
+    for a in order:
+        if not alive[a]:
+            continue
+        for b in order:
+            if b == a or not alive[b] or tile_idx[b] == tile_idx[a] or not (cut[a] or cut[b]):
+                continue
+            iw = min(boxes[a, 2], boxes[b, 2]) - max(boxes[a, 0], boxes[b, 0])
+            ih = min(boxes[a, 3], boxes[b, 3]) - max(boxes[a, 1], boxes[b, 1])
+            if iw <= 0 or ih <= 0:
+                continue
+            wa, ha = boxes[a, 2:] - boxes[a, :2]
+            wb, hb = boxes[b, 2:] - boxes[b, :2]
+            inside = max(iw * ih / max(wa * ha, 1.0) if cut[a] else 0.0,
+                         iw * ih / max(wb * hb, 1.0) if cut[b] else 0.0)
+            split = cut[a] and cut[b] and max(iw / max(min(wa, wb), 1.0), ih / max(min(ha, hb), 1.0)) >= min_overlap
+            if inside < min_overlap and not split:
+                continue
+            boxes[a, :2] = np.minimum(boxes[a, :2], boxes[b, :2])
+            boxes[a, 2:] = np.maximum(boxes[a, 2:], boxes[b, 2:])
+            if confs[b] > confs[a]:
+                confs[a], classes[a] = confs[b], classes[b]
+            cut[a] = cut[a] and cut[b]
+            alive[b] = False
+    return boxes[alive], confs[alive], classes[alive]
+
+
+class TiledDetector:
+    """
+    Detección por teselas solapadas para cámaras panorámicas de alta resolución: cada tesela se
+    infiere a tile_imgsz (todas en una sola llamada a predict), las cajas se pasan a coordenadas
+    del frame, se unen las partidas entre teselas (merge_tile_boxes) y se aplica NMS global.
+    Una tesela se salta si no ha tenido detecciones en los últimos idle_frames frames, no
+    contiene ningún track vivo y no ha cambiado desde la última inferencia (diferencia en gris
+    a baja resolución, fracción de píxeles > motion_threshold). Cada refresh_interval frames se
+    infieren todas.
+    """
+    def __init__(self, model, tiles: List[Rect], width: int, height: int, conf: float = 0.5,
+                 tile_imgsz: int = 640, idle_frames: int = 30, refresh_interval: int = 150,
+                 motion_threshold: float = 0.002, classes: Optional[Sequence[int]] = None):
+        if not tiles:
+            raise ValueError("TiledDetector necesita al menos una tesela")
+        self.model = model
+        self.tiles = list(tiles)
+        self.width = width
+        self.height = height
+        self.conf = conf
+        self.tile_imgsz = tile_imgsz
+        self.idle_frames = idle_frames
+        self.refresh_interval = refresh_interval
+        self.motion_threshold = motion_threshold
+        self.classes = list(classes) if classes is not None else None
+        self._last_hit = np.full(len(tiles), -np.inf)
+        self._last_refresh: Optional[int] = None
+        self._prev: Optional[np.ndarray] = None
+        self._scale = 0.25
+        self.calls = 0
+        self.tiles_run = 0
+
+    def _tile_motion(self, frame: np.ndarray) -> np.ndarray:
+        """Fracción de píxeles cambiados en cada tesela desde la última llamada."""
+        s = self._scale
+        gray = cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), None, fx=s, fy=s, interpolation=cv2.INTER_AREA)
+        prev, self._prev = self._prev, gray
+        if prev is None or prev.shape != gray.shape:
+            return np.ones(len(self.tiles))
+        mask = cv2.absdiff(gray, prev) > 25
+        out = np.zeros(len(self.tiles))
+        for i, (x1, y1, x2, y2) in enumerate(self.tiles):
+            m = mask[int(y1 * s):int(np.ceil(y2 * s)), int(x1 * s):int(np.ceil(x2 * s))]
+            out[i] = m.mean() if m.size else 0.0
+        return out
+
+    def _active(self, frame: np.ndarray, frame_idx: int, track_boxes: Optional[np.ndarray]) -> np.ndarray:
+        motion = self._tile_motion(frame)
+        if self._last_refresh is None or frame_idx - self._last_refresh >= self.refresh_interval:
+            self._last_refresh = frame_idx
+            return np.ones(len(self.tiles), dtype=bool)
+        active = (motion > self.motion_threshold) | (frame_idx - self._last_hit <= self.idle_frames)
+        if track_boxes is not None and len(track_boxes):
+            tb = np.asarray(track_boxes, dtype=np.float64).reshape(-1, 4)
+            for i, (x1, y1, x2, y2) in enumerate(self.tiles):
+                if not active[i]:
+                    active[i] = bool(((tb[:, 0] < x2) & (tb[:, 2] > x1) & (tb[:, 1] < y2) & (tb[:, 3] > y1)).any())
+        return active
+
+    def __call__(self, frame: np.ndarray, frame_idx: int = 0,
+                 track_boxes: Optional[np.ndarray] = None) -> Detections:
+        self.calls += 1
+        active = np.flatnonzero(self._active(frame, frame_idx, track_boxes))
+        if not len(active):
+            return np.zeros((0, 6), dtype=np.float32)
+        self.tiles_run += len(active)
+        crops = [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in (self.tiles[i] for i in active)]
+        results = self.model.predict(source=crops, conf=self.conf, imgsz=self.tile_imgsz,
+                                     classes=self.classes, verbose=False)
+        boxes, confs, classes, tile_idx, cut = [], [], [], [], []
+        for i, res in zip(active, results):
+            x1, y1 = self.tiles[i][:2]
+            dets = yolo_result_to_detections(res)
+            if len(dets):
+                self._last_hit[i] = frame_idx
+            b = dets[:, :4].astype(np.float64) + [x1, y1, x1, y1]
+            boxes.append(b)
+            confs.append(dets[:, 4])
+            classes.append(dets[:, 5])
+            tile_idx.append(np.full(len(b), i))
+            cut.append([_is_cut(bb, self.tiles[i], self.width, self.height) for bb in b])
+        boxes = np.concatenate(boxes)
+        if not len(boxes):
+            return np.zeros((0, 6), dtype=np.float32)
+        merged, mconfs, mclasses = merge_tile_boxes(boxes, np.concatenate(confs), np.concatenate(classes),
+                                                    np.concatenate(tile_idx), np.concatenate(cut))
+        keep = nms(merged, mconfs, 0.5)
+        return make_detections(pixel_boxes(merged[keep]), mconfs[keep], mclasses[keep])
+
+    def summary(self) -> str:
+        total = self.calls * len(self.tiles)
+        return f"Teselas: {self.tiles_run}/{total} inferidas ({self.tiles_run / max(total, 1):.0%})"
@@ -1,17 +1,19 @@
 # trackers/basic_tracker.py
 from __future__ import annotations
-from dataclasses import dataclass, field
 from typing import List, Tuple, Dict, Optional
 import time
 import math
 import cv2
 import numpy as np
-from car import Car
+from car import Car, TrackTable
+from kalman import KalmanBoxFilter
+from appearance import DetectionDescriptors, similarity_matrix
+from stats import GroupedStats, direction_bucket, hour_bucket, region_bucket
 from utilities import *
 from utilities import predict_center, distance_score, aspect_score, direction_score, appearance_score
-import random
 
 BBox = Tuple[int, int, int, int]  # (x1, y1, x2, y2)
+Detections = np.ndarray           # (N,6) float32: x1, y1, x2, y2, conf, cls (utilities.as_detections)
 
 # ------------------------------ Tracker -------------------------------
 
@@ -21,108 +23,264 @@ class Tracker:
     - iou_threshold: mínimo IoU para asociar detecciones con tracks existentes.
     - max_lost: nº de frames que un track puede estar sin detección antes de eliminarse.
     - min_hits: nº de emparejamientos requeridos para considerar un track 'confiable' (puede usarse en la fase de conteo).
+    - assignment: 'greedy' (IoU máximo primero) o 'hungarian' (asignación óptima por componentes, requiere scipy).
+    - gate_distance: si se indica, descarta parejas cuyo centro esté a más de gate_distance diagonales del track.
+    - motion: 'linear' (bbox actual / predict_bbox) o 'kalman' (filtro de Kalman por lotes; la covarianza
+      se usa además como gating: cada track solo considera detecciones dentro de su elipse de incertidumbre).
+    - feature_scale: si se indica, los histogramas de apariencia salen de mapas de frame completo
+      (FrameFeatures) a esa escala en lugar de procesar cada recorte; None = por recorte.
     """
-    def __init__(self, iou_threshold: float = 0.3, max_lost: int = 15, min_hits: int = 1):
+    def __init__(self, iou_threshold: float = 0.3, max_lost: int = 15, min_hits: int = 1,
+                 assignment: str = "greedy", gate_distance: Optional[float] = None, motion: str = "linear",
+                 feature_scale: Optional[float] = None):
+        if assignment not in ASSIGNMENT_MODES:
+            raise ValueError(f"assignment debe ser uno de {ASSIGNMENT_MODES}, no {assignment!r}")
+        if motion not in ("linear", "kalman"):
+            raise ValueError(f"motion debe ser 'linear' o 'kalman', no {motion!r}")
+        if assignment == "hungarian" and linear_sum_assignment is None:
+            raise ImportError("assignment='hungarian' necesita scipy (pip install scipy)")
         self.iou_threshold = iou_threshold
         self.max_lost = max_lost
         self.min_hits = min_hits
+        self.assignment = assignment
+        self.gate_distance = gate_distance
+        self.motion = motion
+        self.feature_scale = feature_scale
+        self.kf = KalmanBoxFilter() if motion == "kalman" else None
         self._next_id = 1
+        self._now: Optional[float] = None   # instante del frame en curso (ver update)
+        self.store = TrackTable()
         self.tracks: Dict[int, Car] = {}
+        # descriptores de las detecciones del frame en curso (se renueva en cada update)
+        self._descriptors = DetectionDescriptors(None)
+        # cajas con las que se emparejó en el último update (solo para draw_predictions)
+        self.last_predictions: Tuple[List[int], np.ndarray] = ([], np.zeros((0, 4)))
 
     def _create_track(self, frame: np.ndarray, bbox: BBox, conf: float) -> Car:
-        t = Car(track_id=self._next_id, bbox=bbox, confidence=conf, first_bbox=bbox)
+        row = self.store.add(self._next_id, bbox, conf, now=self._now)
+        t = Car(self.store, row)
         t.centroids.append(bbox_center(bbox))
+        if self.kf is not None:
+            mean, cov = self.kf.initiate(np.asarray([bbox]))
+            self.store.kf_mean[row], self.store.kf_cov[row] = mean[0], cov[0]
         # t.hsv_hist = compute_hsv_hist(frame, bbox)
         self.tracks[self._next_id] = t
         self._next_id += 1
         return t
 
-    def _match(self, detections: List[Tuple[BBox, float]]) -> Tuple[Dict[int, int], List[int], List[int]]:
+    def _match(self, detections: Detections) -> Tuple[Dict[int, int], List[int], List[int]]:
         """
-        Empareja tracks existentes con detecciones por IoU (greedy).
+        Empareja tracks existentes con detecciones por IoU (_match_boxes: modo de asignación
+        self.assignment y gating de movimiento si está activo).
         returns:
             assignments: dict {track_id -> det_idx}
             unassigned_tracks: list[track_id]
             unassigned_dets: list[det_idx]
         """
         track_ids = list(self.tracks.keys())
-        if not track_ids or not detections:
-            return {}, track_ids, list(range(len(detections)))
-
-        # Matriz IoU [num_tracks x num_dets]
-        iou_mat = np.zeros((len(track_ids), len(detections)), dtype=np.float32)
-        for ti, tid in enumerate(track_ids):
-            tb = self.tracks[tid].bbox
-            for di, (db, _) in enumerate(detections):
-                iou_mat[ti, di] = iou(tb, db)
-
-        assignments: Dict[int, int] = {}
-        used_tracks = set()
-        used_dets = set()
-
-        # Asignación greedy por IoU máximo
-        while True:
-            ti, di = np.unravel_index(np.argmax(iou_mat), iou_mat.shape)
-            best = iou_mat[ti, di]
-            if best < self.iou_threshold:
-                break
-            if ti in used_tracks or di in used_dets:
-                iou_mat[ti, di] = -1  # invalidar y continuar
-                continue
-            track_id = track_ids[ti]
-            assignments[track_id] = di
-            used_tracks.add(ti)
-            used_dets.add(di)
-            iou_mat[ti, :] = -1
-            iou_mat[:, di] = -1
-
-        unassigned_tracks = [track_ids[i] for i in range(len(track_ids)) if i not in used_tracks]
+        return self._match_boxes(track_ids, self._track_boxes(track_ids, predicted=self.kf is not None), detections)
+
+    def _track_boxes(self, track_ids: List[int], predicted: bool = False) -> np.ndarray:
+        """Apila en un array (N,4) el bbox actual (o el predicho) de cada track."""
+        rows = self.store.rows_of(track_ids)
+        if predicted and self.kf is not None:
+            return self.kf.boxes(self.store.kf_mean[rows])
+        if predicted:
+            return boxes_to_array(self.store.predict_bboxes(rows))
+        return boxes_to_array(self.store.bbox[rows])
+
+    def predicted_boxes(self, max_lost: Optional[int] = None) -> Tuple[List[int], np.ndarray]:
+        """
+        Cajas (N,4) previstas para el próximo update de los tracks vivos (con lost <= max_lost),
+        sin modificar el estado: Kalman (un paso de predict) o predict_bbox según motion.
+        """
+        rows = self.store.active_rows()
+        if max_lost is not None:
+            rows = rows[self.store.lost[rows] <= max_lost]
+        ids = self.store.ids[rows].tolist()
+        if not len(rows):
+            return ids, np.zeros((0, 4))
+        if self.kf is not None:
+            mean, _ = self.kf.predict(self.store.kf_mean[rows], self.store.kf_cov[rows])
+            return ids, self.kf.boxes(mean)
+        return ids, boxes_to_array(self.store.predict_bboxes(rows))
+
+    def _predicted_centers(self, track_ids: List[int]) -> Optional[np.ndarray]:
+        """Centros predichos (N,2) por el modelo de movimiento, o None para usar predict_center."""
+        if self.kf is None:
+            return None
+        return self.store.kf_mean[self.store.rows_of(track_ids), :2].copy()
+
+    def _motion_gate(self, track_ids: List[int], det_boxes: np.ndarray, pair_rows: Optional[np.ndarray] = None,
+                     pair_cols: Optional[np.ndarray] = None) -> Optional[np.ndarray]:
+        """
+        Máscara (N,M) de parejas permitidas, o (K,) solo para las parejas (pair_rows, pair_cols):
+        elipse de incertidumbre del Kalman y/o distancia máxima (gate_distance).
+        None si no hay ningún gating activo.
+        """
+        gate = None
+        if self.kf is not None:
+            rows = self.store.rows_of(track_ids)
+            gate = self.kf.gate(self.store.kf_mean[rows], self.store.kf_cov[rows], det_boxes, pair_rows, pair_cols)
+        if self.gate_distance is not None:
+            dist_gate = center_distance_gate(self._track_boxes(track_ids, predicted=self.kf is not None),
+                                             det_boxes, self.gate_distance, pair_rows, pair_cols)
+            gate = dist_gate if gate is None else gate & dist_gate
+        return gate
+
+    def _predict_motion(self):
+        """Paso de predicción del Kalman para todos los tracks vivos a la vez."""
+        rows = self.store.active_rows()
+        if self.kf is None or not len(rows):
+            return
+        self.store.kf_mean[rows], self.store.kf_cov[rows] = self.kf.predict(self.store.kf_mean[rows],
+                                                                            self.store.kf_cov[rows])
+
+    def _correct_motion(self, assignments: Dict[int, int], detections: Detections):
+        """Paso de corrección del Kalman para todos los tracks emparejados a la vez."""
+        if self.kf is None or not assignments:
+            return
+        rows = self.store.rows_of(assignments.keys())
+        boxes = boxes_to_array(detections[list(assignments.values()), :4])
+        self.store.kf_mean[rows], self.store.kf_cov[rows] = self.kf.update(self.store.kf_mean[rows],
+                                                                           self.store.kf_cov[rows], boxes)
+
+    def _match_boxes(self, track_ids: List[int], track_boxes: np.ndarray,
+                     detections: Detections) -> Tuple[Dict[int, int], List[int], List[int]]:
+        """
+        Emparejamiento por IoU entre las cajas (N,4) de los tracks y las detecciones.
+        Lo comparten todos los trackers: track_boxes puede ser el bbox actual o el predicho.
+        """
+        self.last_predictions = (track_ids, track_boxes)
+        if not track_ids or not len(detections):
+            return {}, list(track_ids), list(range(len(detections)))
+
+        # Parejas que se solapan (sin matriz IoU completa), gating solo sobre ellas
+        det_boxes, _ = detections_to_array(detections)
+        pair_rows, pair_cols, scores = iou_candidates(track_boxes, det_boxes, self.iou_threshold)
+        gate = self._motion_gate(track_ids, det_boxes, pair_rows, pair_cols) if len(pair_rows) else None
+        if gate is not None:
+            pair_rows, pair_cols, scores = pair_rows[gate], pair_cols[gate], scores[gate]
+        rows, cols = assign_pairs(pair_rows, pair_cols, scores, (len(track_ids), len(det_boxes)),
+                                  self.iou_threshold, self.assignment)
+
+        assignments: Dict[int, int] = {track_ids[ti]: int(di) for ti, di in zip(rows, cols)}
+        used_dets = set(assignments.values())
+        unassigned_tracks = [tid for tid in track_ids if tid not in assignments]
         unassigned_dets = [i for i in range(len(detections)) if i not in used_dets]
         return assignments, unassigned_tracks, unassigned_dets
 
-    def update(self, frame: np.ndarray, detections: List[Tuple[BBox, float]]) -> Dict[int, Car]:
+    def _rematch(self, frame: np.ndarray, detections: Detections, assignments: Dict[int, int],
+                 unassigned_tracks: List[int], unassigned_dets: List[int], kind: str, threshold: float):
+        """
+        Segunda fase sobre los tracks y detecciones que quedaron libres tras el IoU,
+        usando la similitud del descriptor kind ('hsv_hist' o 'grad_hist') para todas las parejas a la vez.
+        """
+        if not unassigned_tracks or not unassigned_dets:
+            return assignments, unassigned_tracks, unassigned_dets
+
+        score_mat = similarity_matrix(self.store, self.store.rows_of(unassigned_tracks), self._frame_descriptors(frame),
+                                      detections[unassigned_dets, :4], kind).astype(np.float32)
+
+        rows, cols = assign(score_mat, threshold, self.assignment)
+        for ti, dj in zip(rows, cols):
+            assignments[unassigned_tracks[ti]] = unassigned_dets[dj]
+
+        # Recalcular los no asignados tras esta segunda fase
+        used_dets = set(assignments.values())
+        unassigned_tracks = [tid for tid in self.tracks.keys() if tid not in assignments]
+        unassigned_dets = [i for i in range(len(detections)) if i not in used_dets]
+        return assignments, unassigned_tracks, unassigned_dets
+
+    def _frame_descriptors(self, frame: np.ndarray) -> DetectionDescriptors:
+        """Cache de descriptores del frame dado (se reutiliza mientras sea el mismo frame)."""
+        if self._descriptors.frame is not frame:
+            self._descriptors = self._new_descriptors(frame)
+        return self._descriptors
+
+    def _new_descriptors(self, frame: Optional[np.ndarray]) -> DetectionDescriptors:
+        features = None
+        if frame is not None and self.feature_scale is not None:
+            features = FrameFeatures(frame, scale=self.feature_scale)
+        return DetectionDescriptors(frame, features)
+
+    def _associate(self, frame: np.ndarray, detections: Detections):
+        """Fase de emparejamiento usada por update(); las subclases que necesitan el frame la redefinen."""
+        return self._match(detections)
+
+    def update(self, frame: np.ndarray, detections: Detections, now: Optional[float] = None) -> Dict[int, Car]:
         """
         Actualiza el conjunto de tracks con las detecciones del frame actual.
-        detections: lista de (bbox, conf) con bbox=(x1,y1,x2,y2)
+        detections: array (N,6) (x1,y1,x2,y2,conf,cls); se admite también la lista de (bbox, conf)
+        now: instante del frame (epoch, s) para created_at/last_seen; con vídeo grabado, el inicio
+             de la grabación + PTS (stats.frame_time). None = reloj actual.
         Devuelve un dict {track_id: Car} con los tracks vigentes tras la actualización.
         """
+        now = time.time() if now is None else now
+        self._now = now
+        detections = as_detections(detections)
+        # una sola conversión a Python para las filas que acaban en los tracks
+        boxes = detections[:, :4].astype(np.int64).tolist()
+        confs = detections[:, 4].tolist()
+        self._descriptors = self._new_descriptors(frame)
+        # 0) Predecir el movimiento (solo con motion='kalman')
+        self._predict_motion()
+
         # 1) Emparejar
-        assignments, un_tracks, un_dets = self._match(detections)
+        assignments, un_tracks, un_dets = self._associate(frame, detections)
 
         # 2) Actualizar tracks emparejados
         for track_id, det_idx in assignments.items():
-            bbox, conf = detections[det_idx]
-            self.tracks[track_id].update(frame, bbox, conf)
+            self.tracks[track_id].update(frame, tuple(boxes[det_idx]), confs[det_idx], now, self._descriptors)
+        self._correct_motion(assignments, detections)
 
         # 3) Marcar como perdidos los no emparejados
-        for tid in un_tracks:
-            self.tracks[tid].mark_missed()
+        self.store.mark_missed(self.store.rows_of(un_tracks))
 
         # 4) Crear nuevos tracks para detecciones no emparejadas
         for det_idx in un_dets:
-            bbox, conf = detections[det_idx]
-            self._create_track(frame, bbox, conf)
+            self._create_track(frame, tuple(boxes[det_idx]), confs[det_idx])
 
         # 5) Eliminar tracks vencidos
-        to_delete = [tid for tid, t in self.tracks.items() if t.lost > self.max_lost]
-        for tid in to_delete:
-            del self.tracks[tid]
+        self._remove_tracks(self.store.expired(self.max_lost))
+
+        return self.tracks
 
+    def propagate(self, frame: np.ndarray, flow) -> Dict[int, Car]:
+        """
+        Etapa barata para frames sin inferencia: mueve cajas y centroides de todos los tracks con
+        el flujo óptico (flow.FlowPropagator) para que los contadores vean trayectorias continuas.
+        No cambia hits/lost ni crea/elimina tracks. Con motion='kalman' la caja propagada se usa
+        como medida, así el filtro avanza frame a frame igual que los centroides.
+        """
+        rows = self.store.active_rows()
+        shifts, ok = flow.step(frame, self.store.bbox[rows])
+        self._predict_motion()
+        rows, shifts = rows[ok], shifts[ok]
+        if len(rows):
+            self.store.move(rows, shifts)
+            if self.kf is not None:
+                self.store.kf_mean[rows], self.store.kf_cov[rows] = self.kf.update(
+                    self.store.kf_mean[rows], self.store.kf_cov[rows], self.store.bbox[rows])
         return self.tracks
 
+    def _remove_tracks(self, rows: np.ndarray):
+        """Elimina los tracks de las filas indicadas de la tabla y del dict."""
+        for tid in self.store.ids[rows].tolist():
+            del self.tracks[tid]
+        self.store.remove(rows)
+
     # ------------------------- Helpers visualización -------------------------
 
     def draw_tracks(self, frame: np.ndarray, min_hits: Optional[int] = None) -> np.ndarray:
         """Dibuja bbox + ID + dirección. min_hits permite ocultar tracks muy recientes."""
         if min_hits is None:
             min_hits = self.min_hits
-        for t in self.tracks.values():
-            # no dibujar si lleva más de 8 frames perdido (no afecta a la lógica de tracking)
-            if t.lost > 8:
-                continue
-            if t.hits < min_hits:
-                continue
-
+        rows = self.store.active_rows()
+        # no dibujar si lleva más de 8 frames perdido (no afecta a la lógica de tracking)
+        rows = rows[(self.store.lost[rows] <= 8) & (self.store.hits[rows] >= min_hits)]
+        for tid in self.store.ids[rows].tolist():
+            t = self.tracks[tid]
             x1, y1, x2, y2 = t.bbox
 
             # color según estado
@@ -147,55 +305,39 @@ class Tracker:
 
         return frame
 
-    def draw_prediction(self, frame: np.ndarray, bbox, min_hits: Optional[int] = None) -> np.ndarray:
-        """Dibuja bbox + ID + dirección. min_hits permite ocultar tracks muy recientes."""
+    def draw_predictions(self, frame: np.ndarray, min_hits: Optional[int] = None) -> np.ndarray:
+        """
+        Dibuja las cajas (predichas) con las que se emparejó cada track en el último update.
+        Es una etapa de visualización aparte: el emparejamiento no dibuja nada sobre el frame.
+        """
         if min_hits is None:
             min_hits = self.min_hits
-        for t in self.tracks.values():
-            # no dibujar si lleva más de 8 frames perdido (no afecta a la lógica de tracking)
-            if t.lost > 8:
-                continue
-            if t.hits < min_hits:
+        track_ids, track_boxes = self.last_predictions
+        for tid, (x1, y1, x2, y2) in zip(track_ids, np.asarray(track_boxes, dtype=int).tolist()):
+            t = self.tracks.get(tid)
+            # no dibujar si lleva más de 8 frames perdido o si ya se eliminó
+            if t is None or t.lost > 8 or t.hits < min_hits:
                 continue
-
-            x1, y1, x2, y2 = bbox
-
-            # color según estado
-            if t.lost > 0: color = (255, 0, 0)     # rojo para tracks perdidos recientemente
-            else: color = (0, 215, 255)   # amarillo para activos
-
-            # dibujar bbox
             cv2.rectangle(frame, (x1, y1), (x2, y2), (255, 0, 0), 2)
-
-            # dirección y etiqueta
-            direction = t.current_direction()
-            lbl = f"ID {t.track_id}"
-            if direction: lbl += f" ({direction})"
-
-            # etiqueta sobre la caja
-            cv2.putText(frame, lbl, (x1, max(0, y1 - 6)), cv2.FONT_HERSHEY_SIMPLEX, 0.55, color, 2, cv2.LINE_AA)
-
-            # trayectoria (últimos puntos)
-            if len(t.centroids) >= 2:
-                for p, q in zip(t.centroids[-15:-1], t.centroids[-14:]):
-                    cv2.line(frame, (int(p[0]), int(p[1])), (int(q[0]), int(q[1])), color, 2)
-
+            cv2.putText(frame, f"ID {tid}", (x1, max(0, y1 - 6)), cv2.FONT_HERSHEY_SIMPLEX, 0.55, (255, 0, 0), 2,
+                        cv2.LINE_AA)
         return frame
 
 # ------------------- Integración con Ultralytics YOLO -------------------
 
-def yolo_result_to_detections(result) -> List[Tuple[BBox, float]]:
+def yolo_result_to_detections(result) -> Detections:
     """
-    Convierte un 'result' de Ultralytics a lista de (bbox, conf).
-    Solo usa 'boxes' presentes en result (ya filtradas por clase en tu inferencia).
+    Convierte un 'result' de Ultralytics en un array (N,6) float32 (x1, y1, x2, y2, conf, cls)
+    con una sola copia desde el tensor (boxes.data). Solo usa las 'boxes' presentes en result (ya
+    filtradas por clase en tu inferencia). Las coordenadas se truncan a píxel entero, como antes.
     """
-    dets: List[Tuple[BBox, float]] = []
-    if result is None or result.boxes is None:
-        return dets
-    for b in result.boxes:
-        x1, y1, x2, y2 = map(int, b.xyxy[0])
-        conf = float(b.conf)
-        dets.append(((x1, y1, x2, y2), conf))
+    if result is None or result.boxes is None or not len(result.boxes):
+        return np.zeros((0, 6), dtype=np.float32)
+    data = result.boxes.data
+    data = np.asarray(data.cpu().numpy() if hasattr(data, "cpu") else data, dtype=np.float32)
+    # con tracking de ultralytics data trae además el id: x1, y1, x2, y2, id, conf, cls
+    dets = data[:, [0, 1, 2, 3, -2, -1]] if data.shape[1] == 7 else data.copy()
+    dets[:, :4] = np.trunc(dets[:, :4])
     return dets
 
 
@@ -207,15 +349,22 @@ class TrackerHíbrido(Tracker):
                  appearance_threshold: float = 0.6,
                  cascade_threshold: float = 0.45,
                  weights: dict = None,
-                 debug: bool = False):
+                 debug: bool = False,
+                 assignment: str = "greedy",
+                 gate_distance: Optional[float] = None,
+                 motion: str = "kalman",
+                 feature_scale: Optional[float] = None):
         """
         weights: diccionario con pesos para cada heurística (suma 1.0).
                  keys: 'appearance', 'distance', 'aspect', 'direction'
         appearance_threshold: umbral mínimo para considerar similitud de apariencia (opcional)
         cascade_threshold: umbral compuesto para aceptar una asociación en la fase heurística
         debug: imprime info de debug si True
+        assignment / gate_distance / motion / feature_scale: ver Tracker ('linear' usa predict_center para la distancia)
         """
-        super().__init__(iou_threshold=iou_threshold, max_lost=max_lost, min_hits=min_hits)
+        super().__init__(iou_threshold=iou_threshold, max_lost=max_lost, min_hits=min_hits,
+                         assignment=assignment, gate_distance=gate_distance, motion=motion,
+                         feature_scale=feature_scale)
         self.appearance_threshold = appearance_threshold
         self.cascade_threshold = cascade_threshold
         self.debug = debug
@@ -225,7 +374,7 @@ class TrackerHíbrido(Tracker):
             self.weights = weights
 
 
-    def _match(self, detections: List[Tuple[BBox, float]], frame: Optional[np.ndarray] = None):
+    def _match(self, detections: Detections, frame: Optional[np.ndarray] = None):
         """
         Primero hace match por IoU (método base). Después intenta emparejar
         los tracks y detecciones que quedaron sin asignar usando heurísticas.
@@ -235,69 +384,50 @@ class TrackerHíbrido(Tracker):
         # -- 1) Fase IoU usando implementación de la clase base --
         base_assignments, un_tracks, un_dets = super()._match(detections)
 
-        # Convertir un_tracks a lista mutable y un_dets a lista mutable
-        remaining_tracks = list(un_tracks)
+        remaining_tracks = [tid for tid in un_tracks if tid in self.tracks]
         remaining_dets = list(un_dets)
-
-        # Precalcular centros de detecciones
-        det_centers = {}
-        for di in remaining_dets:
-            db, _ = detections[di]
-            det_centers[di] = bbox_center(db)
-
-        # Greedy matching sobre score compuesto
         extra_assignments: Dict[int, int] = {}
-        used_tracks = set()
-        used_dets = set()
-
-        # Construir lista de candidatos con score
-        candidate_scores = []
-        for tid in remaining_tracks:
-            track = self.tracks.get(tid)
-            if track is None:
-                continue
-            for di in remaining_dets:
-                if di in used_dets:
-                    continue
-                db, _ = detections[di]
-                center = det_centers[di]
-
-                # calculo de sub-scores
-                app_score = 0.0
-                if frame is not None:
-                    app_score = appearance_score(frame, track, db)
-                dist_score = distance_score(track, center)
-                asp_score = aspect_score(track, db)
-                dir_score = direction_score(track, center)
-
-                # compuesta por pesos
-                w = self.weights
-                composite = (w['appearance'] * app_score +
-                             w['distance'] * dist_score +
-                             w['aspect'] * asp_score +
-                             w['direction'] * dir_score)
-
-                candidate_scores.append((composite, tid, di, app_score, dist_score, asp_score, dir_score))
-
-        # Ordenar candidatos por score desc
-        candidate_scores.sort(key=lambda x: x[0], reverse=True)
-
-        for composite, tid, di, app_s, dist_s, asp_s, dir_s in candidate_scores:
-            if tid in used_tracks or di in used_dets:
-                continue
-            if composite < self.cascade_threshold:
-                # al ser ordenado, si este candidato no alcanza umbral, los siguientes tampoco
-                break
-            # opcional: exigir cierta mínima similitud de apariencia si está configurada
-            if frame is not None and self.appearance_threshold is not None:
-                if app_s < min(0.0, self.appearance_threshold * 0):  # NO obligamos; línea placeholder
-                    pass  # no forzamos descarte por apariencia aquí, lo dejamos para info
-            # aceptar la asignación
-            extra_assignments[tid] = di
-            used_tracks.add(tid)
-            used_dets.add(di)
-            if self.debug:
-                print(f"[Hybrid] Assign T{tid} <-> D{di} score={composite:.3f} (app={app_s:.2f}, dist={dist_s:.2f}, asp={asp_s:.2f}, dir={dir_s:.2f})")
+
+        if remaining_tracks and remaining_dets:
+            tracks = [self.tracks[tid] for tid in remaining_tracks]
+            det_boxes = boxes_to_array(detections[remaining_dets, :4])
+            # Precalcular centros de detecciones
+            det_centers = 0.5 * (det_boxes[:, :2] + det_boxes[:, 2:])
+
+            # Sub-scores baratos para todas las parejas a la vez
+            w = self.weights
+            dist_mat = distance_score_matrix(tracks, det_centers, self._predicted_centers(remaining_tracks))
+            asp_mat = aspect_score_matrix([t.bbox for t in tracks], det_boxes)
+            dir_mat = direction_score_matrix(tracks, det_centers)
+            composite = w['distance'] * dist_mat + w['aspect'] * asp_mat + w['direction'] * dir_mat
+
+            # Gating: una pareja solo puede superar cascade_threshold si su cota superior
+            # (apariencia = 1) lo hace; la apariencia solo se calcula para esas parejas.
+            app_max = w['appearance'] if frame is not None else 0.0
+            gate = composite + app_max >= self.cascade_threshold
+            motion_gate = self._motion_gate(remaining_tracks, det_boxes)
+            if motion_gate is not None:
+                gate &= motion_gate
+
+            app_mat = np.zeros_like(composite)
+            if frame is not None:
+                # descriptores solo de las detecciones con alguna pareja dentro del gating
+                cols = np.flatnonzero(gate.any(axis=0))
+                if len(cols):
+                    sim = similarity_matrix(self.store, self.store.rows_of(remaining_tracks),
+                                            self._frame_descriptors(frame),
+                                            detections[[remaining_dets[c] for c in cols], :4], "hsv_hist")
+                    app_mat[:, cols] = np.where(gate[:, cols], sim, 0.0)
+                composite = composite + w['appearance'] * app_mat
+
+            rows, cols = assign(composite, self.cascade_threshold, self.assignment, gate)
+            for ti, dj in zip(rows, cols):
+                tid, di = remaining_tracks[ti], remaining_dets[dj]
+                extra_assignments[tid] = di
+                if self.debug:
+                    print(f"[Hybrid] Assign T{tid} <-> D{di} score={composite[ti, dj]:.3f} "
+                          f"(app={app_mat[ti, dj]:.2f}, dist={dist_mat[ti, dj]:.2f}, "
+                          f"asp={asp_mat[ti, dj]:.2f}, dir={dir_mat[ti, dj]:.2f})")
 
         # Combinar asignaciones: las de IoU (base_assignments) tienen preferencia,
         # pero si por alguna razón un track aparece también en extra_assignments, preservamos la asignación IoU.
@@ -319,320 +449,150 @@ class TrackerHíbrido(Tracker):
 
         return final_assignments, new_unassigned_tracks, new_unassigned_dets
 
+    def _associate(self, frame: Optional[np.ndarray], detections: Detections):
+        return self._match(detections, frame)
 
-class Tracker_predict(Tracker):
-    def __init__(self, iou_threshold = 0.3, max_lost = 15, min_hits = 1):
-        super().__init__(iou_threshold, max_lost, min_hits)
-        self.avg_speed = None
-        self.speeds = np.array([])
 
-    def _match(self, detections: List[Tuple[BBox, float]], frame) -> Tuple[Dict[int, int], List[int], List[int]]:
+class Tracker_predict(Tracker):
+    """
+    Tracker por IoU sobre la caja predicha. Los tracks nuevos arrancan con la velocidad media
+    (vx, vy) con la que entraron los tracks ya eliminados, guardada como estadístico en línea
+    (stats.GroupedStats); el prior se usa como velocidad inicial del track (velocity y, con Kalman,
+    kf_mean) hasta que tiene dos centroides propios.
+    - speed_decay: olvido exponencial del prior (None = media de todo el stream).
+    - speed_groups: None, 'hour' (franja horaria del vídeo, ver update(now=...)), 'region' (celda de
+      una rejilla 3x3 del frame donde apareció el track) o 'direction' (celda + sentido, signo de
+      vx/vy: un prior por carril/sentido; al crear un track se toma el sentido más visto en su celda).
+      Si el grupo tiene pocas muestras se usa la media global.
+    """
+    def __init__(self, iou_threshold = 0.3, max_lost = 15, min_hits = 1, assignment = "greedy", gate_distance = None,
+                 motion = "kalman", feature_scale = None, speed_decay = None, speed_groups = None):
+        super().__init__(iou_threshold, max_lost, min_hits, assignment, gate_distance, motion, feature_scale)
+        if speed_groups not in (None, "hour", "region", "direction"):
+            raise ValueError(f"speed_groups debe ser None, 'hour', 'region' o 'direction', no {speed_groups!r}")
+        self.speed_groups = speed_groups
+        self.speed_stats = GroupedStats(decay=speed_decay)
+        self._frame_shape = None
+
+    @property
+    def avg_speed(self) -> Optional[np.ndarray]:
+        """Velocidad media global (vx, vy) de los tracks eliminados (None si aún no hay ninguno)."""
+        return self.speed_stats.mean()
+
+    def _speed_key(self, bbox: BBox, ts: float, velocity=None):
+        """Grupo del prior para un track que apareció en bbox en el instante ts."""
+        if self.speed_groups == "hour":
+            return hour_bucket(ts)
+        if self.speed_groups in ("region", "direction") and self._frame_shape is not None:
+            cell = region_bucket(bbox_center(bbox), self._frame_shape)
+            if self.speed_groups == "region":
+                return cell
+            if velocity is not None:
+                return cell, direction_bucket(velocity)
+            # sin velocidad (track nuevo): sentido con más muestras en la celda
+            counts = {k: g.count for k, g in self.speed_stats.groups.items() if k[0] == cell}
+            return max(counts, key=counts.get) if counts else None
+        return None
+
+    def _match(self, detections: Detections, frame) -> Tuple[Dict[int, int], List[int], List[int]]:
         """
-        Empareja tracks existentes con detecciones por IoU (greedy).
+        Empareja tracks existentes con detecciones por IoU contra la caja predicha de cada track
+        (_match_boxes: modo de asignación self.assignment y gating).
         returns:
             assignments: dict {track_id -> det_idx}
             unassigned_tracks: list[track_id]
             unassigned_dets: list[det_idx]
         """
         track_ids = list(self.tracks.keys())
-        if not track_ids or not detections:
-            return {}, track_ids, list(range(len(detections)))
-
-        # Matriz IoU [num_tracks x num_dets]
-        iou_mat = np.zeros((len(track_ids), len(detections)), dtype=np.float32)
-        for ti, tid in enumerate(track_ids):
-            tb = predict_bbox(self.tracks[tid])
-            self.draw_prediction(frame, tb, self.min_hits)
-            for di, (db, _) in enumerate(detections):
-                iou_mat[ti, di] = iou(tb, db)
-
-        assignments: Dict[int, int] = {}
-        used_tracks = set()
-        used_dets = set()
-
-        # Asignación greedy por IoU máximo
-        while True:
-            ti, di = np.unravel_index(np.argmax(iou_mat), iou_mat.shape)
-            best = iou_mat[ti, di]
-            if best < self.iou_threshold:
-                break
-            if ti in used_tracks or di in used_dets:
-                iou_mat[ti, di] = -1  # invalidar y continuar
-                continue
-            track_id = track_ids[ti]
-            assignments[track_id] = di
-            used_tracks.add(ti)
-            used_dets.add(di)
-            iou_mat[ti, :] = -1
-            iou_mat[:, di] = -1
-
-        unassigned_tracks = [track_ids[i] for i in range(len(track_ids)) if i not in used_tracks]
-        unassigned_dets = [i for i in range(len(detections)) if i not in used_dets]
-        return assignments, unassigned_tracks, unassigned_dets
+        track_boxes = self._track_boxes(track_ids, predicted=True)
+        return self._match_boxes(track_ids, track_boxes, detections)
     
-    def update(self, frame: np.ndarray, detections: List[Tuple[BBox, float]]) -> Dict[int, Car]:
-        """
-        Actualiza el conjunto de tracks con las detecciones del frame actual.
-        detections: lista de (bbox, conf) con bbox=(x1,y1,x2,y2)
-        Devuelve un dict {track_id: Car} con los tracks vigentes tras la actualización.
-        """
-        # 1) Emparejar
-        assignments, un_tracks, un_dets = self._match(detections, frame)
-
-        # 2) Actualizar tracks emparejados
-        for track_id, det_idx in assignments.items():
-            bbox, conf = detections[det_idx]
-            self.tracks[track_id].update(frame, bbox, conf)
-
-        # 3) Marcar como perdidos los no emparejados
-        for tid in un_tracks:
-            self.tracks[tid].mark_missed()
-
-        # 4) Crear nuevos tracks para detecciones no emparejadas
-        for det_idx in un_dets:
-            bbox, conf = detections[det_idx]
-            self._create_track(frame, bbox, conf)
-
-        # 5) Eliminar tracks vencidos
-        to_delete = [tid for tid, t in self.tracks.items() if t.lost > self.max_lost]
-        for tid in to_delete:
-            self.speeds = np.append(self.speeds, self.tracks[tid].speed_x)
-            self.avg_speed = np.mean(self.speeds)
-            del self.tracks[tid]
-
-        return self.tracks
+    def _associate(self, frame: Optional[np.ndarray], detections: Detections):
+        if frame is not None:
+            self._frame_shape = frame.shape
+        return self._match(detections, frame)
+
+    def _remove_tracks(self, rows: np.ndarray):
+        store = self.store
+        for row in rows.tolist():
+            velocity = store.velocity[row].copy()
+            key = self._speed_key(store.first_bbox[row], store.created_at[row], velocity)
+            self.speed_stats.update(velocity, key)
+        super()._remove_tracks(rows)
     
     def _create_track(self, frame, bbox, conf):
-        t =  super()._create_track(frame, bbox, conf)
-        if self.avg_speed:
-            t.speed = self.avg_speed
+        t = super()._create_track(frame, bbox, conf)
+        prior = self.speed_stats.mean(self._speed_key(bbox, t.created_at))
+        if prior is not None:
+            row = self.store.row_of(t.track_id)
+            self.store.velocity[row] = prior
+            if self.kf is not None:
+                self.store.kf_mean[row, 4:6] = prior
         return t
     
 
 class Tracker_color(Tracker):
-    def __init__(self, iou_threshold = 0.3, max_lost = 15, min_hits = 1, appearance_threshold=0.6):
-        super().__init__(iou_threshold, max_lost, min_hits)
+    def __init__(self, iou_threshold = 0.3, max_lost = 15, min_hits = 1, appearance_threshold=0.6,
+                 assignment = "greedy", gate_distance = None, feature_scale = None):
+        super().__init__(iou_threshold, max_lost, min_hits, assignment, gate_distance, feature_scale=feature_scale)
         self.appearance_threshold = appearance_threshold
     
     def _create_track(self, frame: np.ndarray, bbox: BBox, conf: float) -> Car:
-        t = Car(track_id=self._next_id, bbox=bbox, confidence=conf, first_bbox=bbox)
-        t.centroids.append(bbox_center(bbox))
-        t.hsv_hist = compute_hsv_hist(frame, bbox)
-        self.tracks[self._next_id] = t
-        self._next_id += 1
+        t = super()._create_track(frame, bbox, conf)
+        t.hsv_hist = self._frame_descriptors(frame).get("hsv_hist", bbox)
         return t
     
-    def _match(self, detections: List[Tuple[BBox, float]], frame) -> Tuple[Dict[int, int], List[int], List[int]]:
+    def _match(self, detections: Detections, frame) -> Tuple[Dict[int, int], List[int], List[int]]:
         """
-        Empareja tracks existentes con detecciones por IoU (greedy).
+        Empareja por IoU contra la caja predicha (_match_boxes) y reasigna los tracks y detecciones
+        sobrantes por color (hsv_hist).
         returns:
             assignments: dict {track_id -> det_idx}
             unassigned_tracks: list[track_id]
             unassigned_dets: list[det_idx]
         """
         track_ids = list(self.tracks.keys())
-        if not track_ids or not detections:
-            return {}, track_ids, list(range(len(detections)))
-
-        # Matriz IoU [num_tracks x num_dets]
-        iou_mat = np.zeros((len(track_ids), len(detections)), dtype=np.float32)
-        for ti, tid in enumerate(track_ids):
-            tb = predict_bbox(self.tracks[tid])
-            self.draw_prediction(frame, tb, self.min_hits)
-            for di, (db, _) in enumerate(detections):
-                iou_mat[ti, di] = iou(tb, db)
-
-        assignments: Dict[int, int] = {}
-        used_tracks = set()
-        used_dets = set()
-
-        # Asignación greedy por IoU máximo
-        while True:
-            ti, di = np.unravel_index(np.argmax(iou_mat), iou_mat.shape)
-            best = iou_mat[ti, di]
-            if best < self.iou_threshold:
-                break
-            if ti in used_tracks or di in used_dets:
-                iou_mat[ti, di] = -1  # invalidar y continuar
-                continue
-            track_id = track_ids[ti]
-            assignments[track_id] = di
-            used_tracks.add(ti)
-            used_dets.add(di)
-            iou_mat[ti, :] = -1
-            iou_mat[:, di] = -1
-
-        unassigned_tracks = [track_ids[i] for i in range(len(track_ids)) if i not in used_tracks]
-        unassigned_dets = [i for i in range(len(detections)) if i not in used_dets]
+        track_boxes = self._track_boxes(track_ids, predicted=True)
+        assignments, unassigned_tracks, unassigned_dets = self._match_boxes(track_ids, track_boxes, detections)
 
         # Reasignacion por colores
-        if unassigned_tracks and unassigned_dets:
-            app_mat = np.zeros((len(unassigned_tracks), len(unassigned_dets)), dtype=np.float32)
-            for ti, tid in enumerate(unassigned_tracks):
-                track = self.tracks[tid]
-                for dj, det_idx in enumerate(unassigned_dets):
-                    db, _ = detections[det_idx]
-                    app_mat[ti, dj] = appearance_score(frame, track, db)
-
-            while True:
-                ti, di = np.unravel_index(np.argmax(app_mat), app_mat.shape)
-                best = app_mat[ti, di]
-                if best < getattr(self, "appearance_threshold", 0.6):
-                    break
-                track_id = unassigned_tracks[ti]
-                det_idx = unassigned_dets[di]
-                assignments[track_id] = det_idx
-                used_tracks.add(track_ids.index(track_id))
-                used_dets.add(det_idx)
-                app_mat[ti, :] = -1
-                app_mat[:, di] = -1
-
-            # Recalcular los no asignados tras esta segunda fase
-            unassigned_tracks = [tid for tid in track_ids if tid not in assignments]
-            unassigned_dets = [i for i in range(len(detections)) if i not in used_dets]
+        assignments, unassigned_tracks, unassigned_dets = self._rematch(
+            frame, detections, assignments, unassigned_tracks, unassigned_dets, "hsv_hist", self.appearance_threshold)
 
         return assignments, unassigned_tracks, unassigned_dets
     
-    def update(self, frame: np.ndarray, detections: List[Tuple[BBox, float]]) -> Dict[int, Car]:
-        """
-        Actualiza el conjunto de tracks con las detecciones del frame actual.
-        detections: lista de (bbox, conf) con bbox=(x1,y1,x2,y2)
-        Devuelve un dict {track_id: Car} con los tracks vigentes tras la actualización.
-        """
-        # 1) Emparejar
-        assignments, un_tracks, un_dets = self._match(detections, frame)
-
-        # 2) Actualizar tracks emparejados
-        for track_id, det_idx in assignments.items():
-            bbox, conf = detections[det_idx]
-            self.tracks[track_id].update(frame, bbox, conf)
-
-        # 3) Marcar como perdidos los no emparejados
-        for tid in un_tracks:
-            self.tracks[tid].mark_missed()
-
-        # 4) Crear nuevos tracks para detecciones no emparejadas
-        for det_idx in un_dets:
-            bbox, conf = detections[det_idx]
-            self._create_track(frame, bbox, conf)
-
-        # 5) Eliminar tracks vencidos
-        to_delete = [tid for tid, t in self.tracks.items() if t.lost > self.max_lost]
-        for tid in to_delete:
-            del self.tracks[tid]
-
-        return self.tracks
+    def _associate(self, frame: np.ndarray, detections: Detections):
+        return self._match(detections, frame)
     
 class Tracker_grad(Tracker):
-    def __init__(self, iou_threshold = 0.3, max_lost = 15, min_hits = 1, shape_threshold=0.55):
-        super().__init__(iou_threshold, max_lost, min_hits)
+    def __init__(self, iou_threshold = 0.3, max_lost = 15, min_hits = 1, shape_threshold=0.55,
+                 assignment = "greedy", gate_distance = None, feature_scale = None):
+        super().__init__(iou_threshold, max_lost, min_hits, assignment, gate_distance, feature_scale=feature_scale)
         self.shape_threshold = shape_threshold
 
     def _create_track(self, frame: np.ndarray, bbox: BBox, conf: float) -> Car:
-        t = Car(track_id=self._next_id, bbox=bbox, confidence=conf, first_bbox=bbox)
-        t.centroids.append(bbox_center(bbox))
-        t.grad_hist = compute_grad_hist(frame, bbox)
-        self.tracks[self._next_id] = t
-        self._next_id += 1
+        t = super()._create_track(frame, bbox, conf)
+        t.grad_hist = self._frame_descriptors(frame).get("grad_hist", bbox)
         return t
 
-    def _match(self, detections: List[Tuple[BBox, float]], frame) -> Tuple[Dict[int, int], List[int], List[int]]:
+    def _match(self, detections: Detections, frame) -> Tuple[Dict[int, int], List[int], List[int]]:
         """
-        Empareja tracks existentes con detecciones por IoU (greedy).
+        Empareja por IoU contra la caja predicha (_match_boxes) y reasigna los tracks y detecciones
+        sobrantes por forma (grad_hist).
         returns:
             assignments: dict {track_id -> det_idx}
             unassigned_tracks: list[track_id]
             unassigned_dets: list[det_idx]
         """
         track_ids = list(self.tracks.keys())
-        if not track_ids or not detections:
-            return {}, track_ids, list(range(len(detections)))
-
-        # Matriz IoU [num_tracks x num_dets]
-        iou_mat = np.zeros((len(track_ids), len(detections)), dtype=np.float32)
-        for ti, tid in enumerate(track_ids):
-            tb = predict_bbox(self.tracks[tid])
-            self.draw_prediction(frame, tb, self.min_hits)
-            for di, (db, _) in enumerate(detections):
-                iou_mat[ti, di] = iou(tb, db)
-
-        assignments: Dict[int, int] = {}
-        used_tracks = set()
-        used_dets = set()
-
-        # Asignación greedy por IoU máximo
-        while True:
-            ti, di = np.unravel_index(np.argmax(iou_mat), iou_mat.shape)
-            best = iou_mat[ti, di]
-            if best < self.iou_threshold:
-                break
-            if ti in used_tracks or di in used_dets:
-                iou_mat[ti, di] = -1  # invalidar y continuar
-                continue
-            track_id = track_ids[ti]
-            assignments[track_id] = di
-            used_tracks.add(ti)
-            used_dets.add(di)
-            iou_mat[ti, :] = -1
-            iou_mat[:, di] = -1
-
-        unassigned_tracks = [track_ids[i] for i in range(len(track_ids)) if i not in used_tracks]
-        unassigned_dets = [i for i in range(len(detections)) if i not in used_dets]
+        track_boxes = self._track_boxes(track_ids, predicted=True)
+        assignments, unassigned_tracks, unassigned_dets = self._match_boxes(track_ids, track_boxes, detections)
 
-        # Reasignacion por colores
-        if unassigned_tracks and unassigned_dets:
-            app_mat = np.zeros((len(unassigned_tracks), len(unassigned_dets)), dtype=np.float32)
-            for ti, tid in enumerate(unassigned_tracks):
-                track = self.tracks[tid]
-                for dj, det_idx in enumerate(unassigned_dets):
-                    db, _ = detections[det_idx]
-                    app_mat[ti, dj] = shape_score(frame, track, db)
-
-            while True:
-                ti, di = np.unravel_index(np.argmax(app_mat), app_mat.shape)
-                best = app_mat[ti, di]
-                if best < getattr(self, "shape_threshold", 0.55):
-                    break
-                track_id = unassigned_tracks[ti]
-                det_idx = unassigned_dets[di]
-                assignments[track_id] = det_idx
-                used_tracks.add(track_ids.index(track_id))
-                used_dets.add(det_idx)
-                app_mat[ti, :] = -1
-                app_mat[:, di] = -1
-
-            # Recalcular los no asignados tras esta segunda fase
-            unassigned_tracks = [tid for tid in track_ids if tid not in assignments]
-            unassigned_dets = [i for i in range(len(detections)) if i not in used_dets]
+        # Reasignacion por forma
+        assignments, unassigned_tracks, unassigned_dets = self._rematch(
+            frame, detections, assignments, unassigned_tracks, unassigned_dets, "grad_hist", self.shape_threshold)
 
         return assignments, unassigned_tracks, unassigned_dets
     
-    def update(self, frame: np.ndarray, detections: List[Tuple[BBox, float]]) -> Dict[int, Car]:
-        """
-        Actualiza el conjunto de tracks con las detecciones del frame actual.
-        detections: lista de (bbox, conf) con bbox=(x1,y1,x2,y2)
-        Devuelve un dict {track_id: Car} con los tracks vigentes tras la actualización.
-        """
-        # 1) Emparejar
-        assignments, un_tracks, un_dets = self._match(detections, frame)
-
-        # 2) Actualizar tracks emparejados
-        for track_id, det_idx in assignments.items():
-            bbox, conf = detections[det_idx]
-            self.tracks[track_id].update(frame, bbox, conf)
-
-        # 3) Marcar como perdidos los no emparejados
-        for tid in un_tracks:
-            self.tracks[tid].mark_missed()
-
-        # 4) Crear nuevos tracks para detecciones no emparejadas
-        for det_idx in un_dets:
-            bbox, conf = detections[det_idx]
-            self._create_track(frame, bbox, conf)
-
-        # 5) Eliminar tracks vencidos
-        to_delete = [tid for tid, t in self.tracks.items() if t.lost > self.max_lost]
-        for tid in to_delete:
-            del self.tracks[tid]
-
-        return self.tracks
\ No newline at end of file
+    def _associate(self, frame: np.ndarray, detections: Detections):
+        return self._match(detections, frame)
\ No newline at end of file
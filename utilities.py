@@ -8,6 +8,13 @@ import cv2
 import numpy as np
 from typing import Any
 
+try:  # scipy es opcional: solo lo necesita el modo de asignación 'hungarian'
+    from scipy.optimize import linear_sum_assignment
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import connected_components
+except ImportError:
+    linear_sum_assignment = None
+
 BBox = Tuple[int, int, int, int]  # (x1, y1, x2, y2)
 
 def iou(boxA: BBox, boxB: BBox) -> float:
@@ -24,6 +31,281 @@ def iou(boxA: BBox, boxB: BBox) -> float:
     areaB = (boxB[2] - boxB[0]) * (boxB[3] - boxB[1])
     return inter / float(areaA + areaB - inter + 1e-9)
 
+# ---------------- Motor vectorizado de IoU / asignación ----------------
+
+def boxes_to_array(boxes) -> np.ndarray:
+    """Apila una secuencia de bboxes (x1,y1,x2,y2) en un array (N,4) float64."""
+    return np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+
+def make_detections(boxes, confs, classes=None) -> np.ndarray:
+    """Detecciones (N,6) float32 (x1, y1, x2, y2, conf, cls) a partir de cajas (N,4) y confianzas (N,); cls=-1 si no se da."""
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    out = np.empty((len(boxes), 6), dtype=np.float32)
+    out[:, :4] = boxes
+    out[:, 4] = confs
+    out[:, 5] = -1 if classes is None else classes
+    return out
+
+def as_detections(detections) -> np.ndarray:
+    """
+    Detecciones como array (N,6) float32: x1, y1, x2, y2, conf, cls. Un array (N,6) float32 se
+    devuelve tal cual (sin copia); también acepta arrays (N,5) sin clase y la lista de (bbox, conf).
+    """
+    if isinstance(detections, np.ndarray):
+        arr = detections
+    else:
+        arr = [(*bbox, conf) for bbox, conf in detections]
+    arr = np.asarray(arr, dtype=np.float32)
+    if arr.size == 0:
+        return np.zeros((0, 6), dtype=np.float32)
+    if arr.ndim != 2 or arr.shape[1] not in (5, 6):
+        raise ValueError(f"las detecciones deben ser (N,5) o (N,6), no {arr.shape}")
+    if arr.shape[1] == 5:
+        return make_detections(arr[:, :4], arr[:, 4])
+    return arr
+
+def detections_to_array(detections) -> Tuple[np.ndarray, np.ndarray]:
+    """Separa las detecciones (array (N,6) o lista de (bbox, conf)) en boxes (N,4) y confs (N,)."""
+    if not len(detections):
+        return np.zeros((0, 4), dtype=np.float64), np.zeros((0,), dtype=np.float64)
+    if isinstance(detections, np.ndarray):
+        return boxes_to_array(detections[:, :4]), detections[:, 4].astype(np.float64)
+    boxes = boxes_to_array([d[0] for d in detections])
+    confs = np.asarray([d[1] for d in detections], dtype=np.float64)
+    return boxes, confs
+
+def iou_matrix(boxes_a, boxes_b) -> np.ndarray:
+    """
+    IoU de todos contra todos entre boxes_a (N,4) y boxes_b (M,4) por broadcasting.
+    Equivale a llamar iou() para cada pareja. Devuelve (N,M) float32.
+    """
+    a = boxes_to_array(boxes_a)
+    b = boxes_to_array(boxes_b)
+    if len(a) == 0 or len(b) == 0:
+        return np.zeros((len(a), len(b)), dtype=np.float32)
+    inter_w = np.clip(np.minimum(a[:, None, 2], b[None, :, 2]) - np.maximum(a[:, None, 0], b[None, :, 0]), 0, None)
+    inter_h = np.clip(np.minimum(a[:, None, 3], b[None, :, 3]) - np.maximum(a[:, None, 1], b[None, :, 1]), 0, None)
+    inter = inter_w * inter_h
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter + 1e-9
+    out = np.zeros_like(inter)
+    np.divide(inter, union, out=out, where=inter > 0)
+    return out.astype(np.float32)
+
+def nms(boxes, scores, iou_threshold: float = 0.5) -> np.ndarray:
+    """
+    Non-maximum suppression greedy: índices de las cajas (N,4) que se conservan, por score
+    descendente. Se usa al juntar detecciones de varios recortes/teselas del mismo frame.
+    """
+    boxes = boxes_to_array(boxes)
+    scores = np.asarray(scores, dtype=np.float64).ravel()
+    if len(boxes) == 0:
+        return np.zeros((0,), dtype=np.intp)
+    order = np.argsort(-scores, kind="stable")
+    overlap = iou_matrix(boxes[order], boxes[order]) > iou_threshold
+    keep = np.ones(len(order), dtype=bool)
+    for i in range(len(order)):
+        if keep[i]:
+            keep[i + 1:] &= ~overlap[i, i + 1:]
+    return order[keep]
+
+def overlap_pairs(boxes_a, boxes_b) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Parejas (i, j) cuyas cajas se solapan (IoU > 0) sin construir la matriz (N,M): barrido
+    sobre x1 ordenado, cada caja de boxes_a solo mira las de boxes_b con x1 en
+    [x1_a - ancho máximo, x2_a). Devuelve (filas, columnas) en orden fila-columna.
+    """
+    a = boxes_to_array(boxes_a)
+    b = boxes_to_array(boxes_b)
+    if len(a) == 0 or len(b) == 0:
+        return np.zeros((0,), dtype=np.intp), np.zeros((0,), dtype=np.intp)
+    order = np.argsort(b[:, 0], kind="stable")
+    bx1 = b[order, 0]
+    max_w = max(0.0, float(np.max(b[:, 2] - b[:, 0])))
+    lo = np.searchsorted(bx1, a[:, 0] - max_w, side="left")
+    hi = np.searchsorted(bx1, a[:, 2], side="left")
+    counts = np.maximum(hi - lo, 0)
+    rows = np.repeat(np.arange(len(a), dtype=np.intp), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    cols = order[np.repeat(lo, counts) + offsets]
+    ok = (b[cols, 2] > a[rows, 0]) & (b[cols, 1] < a[rows, 3]) & (b[cols, 3] > a[rows, 1])
+    rows, cols = rows[ok], cols[ok]
+    s = np.lexsort((cols, rows))
+    return rows[s], cols[s]
+
+def iou_pairs(boxes_a, boxes_b, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+    """IoU solo de las parejas (rows[k], cols[k]); mismos valores que iou_matrix. (K,) float32."""
+    a = boxes_to_array(boxes_a)[rows]
+    b = boxes_to_array(boxes_b)[cols]
+    inter_w = np.clip(np.minimum(a[:, 2], b[:, 2]) - np.maximum(a[:, 0], b[:, 0]), 0, None)
+    inter_h = np.clip(np.minimum(a[:, 3], b[:, 3]) - np.maximum(a[:, 1], b[:, 1]), 0, None)
+    inter = inter_w * inter_h
+    union = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1]) + (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1]) - inter + 1e-9
+    out = np.zeros_like(inter)
+    np.divide(inter, union, out=out, where=inter > 0)
+    return out.astype(np.float32)
+
+SPARSE_MIN_PAIRS = 1 << 15   # por debajo de N*M parejas la matriz IoU densa es más barata que el barrido
+
+def iou_candidates(boxes_a, boxes_b, threshold: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Parejas con IoU >= threshold y su IoU: (filas, columnas, scores) en orden fila-columna.
+    Con threshold > 0 y problemas grandes solo se calcula el IoU de las que se solapan
+    (overlap_pairs); el gating posterior se aplica solo a estas parejas.
+    """
+    a, b = boxes_to_array(boxes_a), boxes_to_array(boxes_b)
+    if threshold <= 0 or len(a) * len(b) < SPARSE_MIN_PAIRS:
+        iou_mat = iou_matrix(a, b)
+        rows, cols = np.nonzero(iou_mat >= threshold)
+        return rows, cols, iou_mat[rows, cols]
+    rows, cols = overlap_pairs(a, b)
+    scores = iou_pairs(a, b, rows, cols)
+    keep = scores >= threshold
+    return rows[keep], cols[keep], scores[keep]
+
+def _greedy_pairs(rows: np.ndarray, cols: np.ndarray, scores: np.ndarray,
+                  shape: Tuple[int, int]) -> Tuple[np.ndarray, np.ndarray]:
+    """Greedy sobre parejas candidatas en orden fila-columna (ver greedy_assignment)."""
+    # orden estable -> los empates se resuelven como argmax (primer índice en orden fila-columna)
+    order = np.argsort(-scores, kind="stable")
+    used_rows = np.zeros(shape[0], dtype=bool)
+    used_cols = np.zeros(shape[1], dtype=bool)
+    max_pairs = min(shape)
+    out_r, out_c = [], []
+    for k in order:
+        r, c = rows[k], cols[k]
+        if used_rows[r] or used_cols[c]:
+            continue
+        used_rows[r] = True
+        used_cols[c] = True
+        out_r.append(r)
+        out_c.append(c)
+        if len(out_r) == max_pairs:
+            break
+    return np.asarray(out_r, dtype=np.intp), np.asarray(out_c, dtype=np.intp)
+
+def greedy_assignment(score_mat: np.ndarray, threshold: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Asignación greedy por score máximo: equivale a hacer argmax sobre la matriz,
+    aceptar la pareja e invalidar su fila y columna hasta que el máximo < threshold.
+    En lugar de re-escanear la matriz en cada paso, ordena una sola vez las parejas
+    candidatas (score >= threshold), así que el coste es O(K log K) con K candidatos.
+    Devuelve (filas, columnas) asignadas, en orden de aceptación.
+    """
+    rows, cols = np.nonzero(score_mat >= threshold)
+    if len(rows) == 0:
+        return np.zeros((0,), dtype=np.intp), np.zeros((0,), dtype=np.intp)
+    return _greedy_pairs(rows, cols, score_mat[rows, cols], score_mat.shape)
+
+ASSIGNMENT_MODES = ("greedy", "hungarian")
+
+def _optimal_pairs(rows: np.ndarray, cols: np.ndarray, scores: np.ndarray,
+                   shape: Tuple[int, int]) -> Tuple[np.ndarray, np.ndarray]:
+    """Hungarian por componentes conexas del grafo de parejas candidatas (ver optimal_assignment)."""
+    if linear_sum_assignment is None:
+        raise ImportError("El modo 'hungarian' necesita scipy (pip install scipy)")
+    n_rows, n_cols = shape
+    graph = coo_matrix((np.ones(len(rows), dtype=np.int8), (rows, n_rows + cols)),
+                       shape=(n_rows + n_cols, n_rows + n_cols))
+    _, labels = connected_components(graph, directed=False)
+    edge_comp = labels[rows]
+    order = np.argsort(edge_comp, kind="stable")
+    splits = np.flatnonzero(np.diff(edge_comp[order])) + 1
+
+    out_r, out_c = [], []
+    for edges in np.split(order, splits):
+        if len(edges) == 1:
+            # componente trivial: una sola pareja candidata
+            out_r.append(rows[edges])
+            out_c.append(cols[edges])
+            continue
+        r_idx = np.unique(rows[edges])
+        c_idx = np.unique(cols[edges])
+        # sub-problema denso solo de la componente; las parejas no candidatas cuestan 0, lo
+        # mismo que dejar la fila sin asignar (un coste prohibitivo forzaría a maximizar el
+        # nº de parejas antes que la suma de scores), y se descartan tras resolver
+        sub_r = np.searchsorted(r_idx, rows[edges])
+        sub_c = np.searchsorted(c_idx, cols[edges])
+        sub_cand = np.zeros((len(r_idx), len(c_idx)), dtype=bool)
+        sub_cand[sub_r, sub_c] = True
+        cost = np.zeros(sub_cand.shape)
+        cost[sub_r, sub_c] = -scores[edges]
+        ri, ci = linear_sum_assignment(cost)
+        keep = sub_cand[ri, ci]
+        out_r.append(r_idx[ri[keep]])
+        out_c.append(c_idx[ci[keep]])
+    return np.concatenate(out_r).astype(np.intp), np.concatenate(out_c).astype(np.intp)
+
+def optimal_assignment(score_mat: np.ndarray, threshold: float,
+                       gate: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Asignación de coste mínimo (Hungarian, scipy.optimize.linear_sum_assignment)
+    maximizando la suma de scores. Solo se consideran las parejas con score >= threshold
+    (y dentro de gate si se da). El grafo bipartito de candidatos se separa en
+    componentes conexas y se resuelve un sub-problema pequeño por componente.
+    Devuelve (filas, columnas) asignadas.
+    """
+    if linear_sum_assignment is None:
+        raise ImportError("El modo 'hungarian' necesita scipy (pip install scipy)")
+    cand = score_mat >= threshold
+    if gate is not None:
+        cand &= gate
+    rows, cols = np.nonzero(cand)
+    if len(rows) == 0:
+        return np.zeros((0,), dtype=np.intp), np.zeros((0,), dtype=np.intp)
+    return _optimal_pairs(rows, cols, score_mat[rows, cols], score_mat.shape)
+
+def assign(score_mat: np.ndarray, threshold: float, mode: str = "greedy",
+           gate: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Backend de asignación común a todos los trackers.
+    mode: 'greedy' (score máximo primero) o 'hungarian' (óptimo por componentes).
+    gate: máscara booleana opcional con las parejas permitidas.
+    """
+    if mode == "hungarian":
+        return optimal_assignment(score_mat, threshold, gate)
+    if mode != "greedy":
+        raise ValueError(f"Modo de asignación desconocido: {mode} (usa {ASSIGNMENT_MODES})")
+    if gate is not None:
+        score_mat = np.where(gate, score_mat, -1.0)
+    return greedy_assignment(score_mat, threshold)
+
+def assign_pairs(rows: np.ndarray, cols: np.ndarray, scores: np.ndarray, shape: Tuple[int, int],
+                 threshold: float, mode: str = "greedy") -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Como assign, pero sobre una lista de parejas candidatas (filas, columnas, scores) de una
+    matriz shape sin construirla: las parejas ausentes cuentan como no permitidas.
+    """
+    if mode not in ASSIGNMENT_MODES:
+        raise ValueError(f"Modo de asignación desconocido: {mode} (usa {ASSIGNMENT_MODES})")
+    keep = scores >= threshold
+    rows, cols, scores = rows[keep], cols[keep], scores[keep]
+    if len(rows) == 0:
+        return np.zeros((0,), dtype=np.intp), np.zeros((0,), dtype=np.intp)
+    if mode == "hungarian":
+        return _optimal_pairs(rows, cols, scores, shape)
+    s = np.lexsort((cols, rows))
+    return _greedy_pairs(rows[s], cols[s], scores[s], shape)
+
+def center_distance_gate(track_boxes, det_boxes, max_diag: float,
+                         rows: Optional[np.ndarray] = None, cols: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Gating espacial: True si el centro de la detección está a menos de
+    max_diag veces la diagonal del track. Devuelve (N,M) bool, o (K,) solo para
+    las parejas (rows, cols) si se dan.
+    """
+    a = boxes_to_array(track_boxes)
+    b = boxes_to_array(det_boxes)
+    ca = 0.5 * (a[:, :2] + a[:, 2:])
+    cb = 0.5 * (b[:, :2] + b[:, 2:])
+    diag = np.hypot(np.maximum(1.0, a[:, 2] - a[:, 0]), np.maximum(1.0, a[:, 3] - a[:, 1]))
+    if rows is not None:
+        dist = np.hypot(ca[rows, 0] - cb[cols, 0], ca[rows, 1] - cb[cols, 1])
+        return dist <= max_diag * diag[rows]
+    dist = np.hypot(ca[:, None, 0] - cb[None, :, 0], ca[:, None, 1] - cb[None, :, 1])
+    return dist <= max_diag * diag[:, None]
+
 def bbox_center(b: BBox) -> Tuple[float, float]:
     x1, y1, x2, y2 = b
     return (0.5 * (x1 + x2), 0.5 * (y1 + y2))
@@ -72,6 +354,117 @@ def compute_grad_hist(frame: np.ndarray, bbox: Tuple[int, int, int, int], bins:
     hist = cv2.normalize(hist, hist).flatten()  # normalizamos
     return hist
 
+# ---------------- Mapas de características de frame completo ----------------
+
+class FrameFeatures:
+    """
+    Etapa opcional por frame: cuantiza HSV y calcula la orientación del gradiente una sola vez
+    para todo el frame (a escala `scale`) y guarda histogramas integrales, de modo que el
+    descriptor de cualquier bbox sale de 4 consultas por bin en lugar de procesar el recorte.
+    Con cajas solapadas (parkings llenos) evita repetir los mismos píxeles muchas veces.
+    Los mapas se construyen de forma perezosa la primera vez que se pide cada descriptor.
+    Devuelve los mismos formatos que compute_hsv_hist / compute_grad_hist. hsv_hist es idéntico a
+    compute_hsv_hist a scale=1.0; grad_hist es una aproximación (ver grad_hist).
+    """
+    def __init__(self, frame: np.ndarray, scale: float = 0.5, hsv_bins: int = 16, grad_bins: int = 9):
+        self.frame = frame
+        self.scale = scale
+        self.hsv_bins = hsv_bins
+        self.grad_bins = grad_bins
+        self._small = None
+        self._hsv_integral = None    # (3*hsv_bins, h+1, w+1) int32
+        self._grad_integral = None   # (grad_bins, h+1, w+1) float32
+
+    def _scaled(self) -> np.ndarray:
+        if self._small is None:
+            if self.scale == 1.0:
+                self._small = self.frame
+            else:
+                self._small = cv2.resize(self.frame, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        return self._small
+
+    def _rect(self, bbox: BBox) -> Tuple[int, int, int, int]:
+        """bbox en coordenadas del mapa reducido, recortado al frame como en compute_hsv_hist."""
+        small = self._scaled()
+        h, w = small.shape[:2]
+        x1, y1, x2, y2 = (int(round(v * self.scale)) for v in bbox)
+        x1 = max(0, min(w - 1, x1))
+        x2 = max(0, min(w - 1, x2))
+        y1 = max(0, min(h - 1, y1))
+        y2 = max(0, min(h - 1, y2))
+        return x1, y1, x2, y2
+
+    @staticmethod
+    def _integral_per_bin(labels: np.ndarray, n_bins: int, out: np.ndarray,
+                          weights: Optional[np.ndarray] = None) -> None:
+        """Escribe en out[b] la imagen integral de la máscara (o del peso) de cada bin."""
+        for b in range(n_bins):
+            mask = cv2.compare(labels, b, cv2.CMP_EQ)
+            if weights is None:
+                cv2.integral(mask // 255, out[b])
+            else:
+                cv2.integral(cv2.bitwise_and(weights, weights, mask=mask), out[b], sdepth=cv2.CV_32F)
+
+    def _build_hsv(self):
+        hsv = cv2.cvtColor(self._scaled(), cv2.COLOR_BGR2HSV)
+        b = self.hsv_bins
+        h, w = hsv.shape[:2]
+        # mismos bins uniformes que calcHist: H en [0,180), S y V en [0,256)
+        lut_h = np.minimum(np.arange(256) * b // 180, 255).astype(np.uint8)
+        lut_sv = (np.arange(256) * b // 256).astype(np.uint8)
+        out = np.empty((3 * b, h + 1, w + 1), dtype=np.int32)
+        for c, lut in enumerate((lut_h, lut_sv, lut_sv)):
+            self._integral_per_bin(cv2.LUT(hsv[..., c], lut), b, out[c * b:(c + 1) * b])
+        self._hsv_integral = out
+
+    def _build_grad(self):
+        gray = cv2.cvtColor(self._scaled(), cv2.COLOR_BGR2GRAY)
+        gx = cv2.Sobel(gray, cv2.CV_32F, 1, 0, ksize=3)
+        gy = cv2.Sobel(gray, cv2.CV_32F, 0, 1, ksize=3)
+        mag, ang = cv2.cartToPolar(gx, gy, angleInDegrees=True)
+        # como np.histogram(range=(0,180)): 180 cae en el último bin y los ángulos > 180 no cuentan
+        labels = np.minimum(ang * (self.grad_bins / 180.0), self.grad_bins - 1).astype(np.uint8)
+        labels[ang > 180.0] = self.grad_bins
+        h, w = gray.shape
+        out = np.empty((self.grad_bins, h + 1, w + 1), dtype=np.float32)
+        self._integral_per_bin(labels, self.grad_bins, out, mag)
+        self._grad_integral = out
+
+    @staticmethod
+    def _box_sum(integral: np.ndarray, rect: Tuple[int, int, int, int]) -> np.ndarray:
+        x1, y1, x2, y2 = rect
+        return integral[:, y2, x2] - integral[:, y1, x2] - integral[:, y2, x1] + integral[:, y1, x1]
+
+    def hsv_hist(self, bbox: BBox) -> np.ndarray:
+        """Equivalente a compute_hsv_hist(frame, bbox) sobre el mapa reducido."""
+        if self._hsv_integral is None:
+            self._build_hsv()
+        x1, y1, x2, y2 = rect = self._rect(bbox)
+        if x2 <= x1 or y2 <= y1:
+            return np.zeros((self.hsv_bins * 3,), dtype=np.float32)
+        hist = self._box_sum(self._hsv_integral, rect).astype(np.float32)
+        s = hist.sum()
+        if s > 0:
+            hist /= s
+        return hist
+
+    def grad_hist(self, bbox: BBox) -> np.ndarray:
+        """
+        Aproximación de compute_grad_hist(frame, bbox) (normalizado L2) sobre el mapa reducido.
+        No es idéntico: el Sobel se calcula sobre el frame entero, así que en el borde de la caja
+        usa los píxeles vecinos en lugar del borde reflejado del recorte. La diferencia crece
+        cuanto más pequeña es la caja (en cajas de ~30 px puede cambiar el descriptor por completo),
+        así que activar feature_scale también cambia los scores de shape_score.
+        """
+        if self._grad_integral is None:
+            self._build_grad()
+        x1, y1, x2, y2 = rect = self._rect(bbox)
+        if x2 <= x1 or y2 <= y1:
+            return np.zeros((self.grad_bins,), dtype=np.float64)
+        hist = self._box_sum(self._grad_integral, rect).astype(np.float64)
+        norm = np.linalg.norm(hist)
+        return hist / norm if norm > 0 else hist
+
 # ---------------- Additional scoring utilities for hybrid tracker ----------------
 
 def predict_center(track: Any) -> Tuple[float, float]:
@@ -145,6 +538,12 @@ def predict_bbox(track):
         new_bbox = [int(x1 + dx), int(y1 + dy), int(x2 + dx), int(y2 + dy)]
         return new_bbox   
 
+    # Track recién creado con un prior de velocidad (Tracker_predict): se desplaza con él
+    vx, vy = getattr(track, 'speed_x', 0.0), getattr(track, 'speed_y', 0.0)
+    if vx or vy:
+        factor = 1.1 * (track.lost + 1) if hasattr(track, 'lost') else 1.0
+        x1, y1, x2, y2 = track.bbox
+        return [int(x1 + vx * factor), int(y1 + vy * factor), int(x2 + vx * factor), int(y2 + vy * factor)]
 
     # Si solo tiene un centroide o bbox, lo devolvemos sin cambios
     return track.bbox
@@ -223,4 +622,56 @@ def shape_score(frame: np.ndarray, track: Any, det_bbox: Tuple[int, int, int, in
 
     # Reescalar de [-1,1] a [0,1]
     score = (corr + 1.0) / 2.0
-    return float(max(0.0, min(1.0, score)))
\ No newline at end of file
+    return float(max(0.0, min(1.0, score)))
+
+# ---------------- Versiones matriciales (tracks x detecciones) ----------------
+
+def aspect_score_matrix(track_boxes, det_boxes) -> np.ndarray:
+    """aspect_score() para todas las parejas. Devuelve (N,M) float64."""
+    a = boxes_to_array(track_boxes)
+    b = boxes_to_array(det_boxes)
+    tw, th = a[:, 2] - a[:, 0], a[:, 3] - a[:, 1]
+    dw, dh = b[:, 2] - b[:, 0], b[:, 3] - b[:, 1]
+    ar_t = (tw / np.maximum(1e-6, th))[:, None]
+    ar_d = (dw / np.maximum(1e-6, dh))[None, :]
+    den = np.maximum(ar_t, ar_d)
+    score = np.zeros(np.broadcast(ar_t, ar_d).shape)
+    np.divide(np.abs(ar_t - ar_d), den, out=score, where=den != 0)
+    score = np.clip(1.0 - score, 0.0, 1.0)
+    score[(th <= 0)[:, None] | (dh <= 0)[None, :]] = 0.0
+    return score
+
+def distance_score_matrix(tracks: List[Any], det_centers: np.ndarray,
+                          pred_centers: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    distance_score() para todas las parejas; det_centers es (M,2). Devuelve (N,M).
+    pred_centers (N,2) permite usar otro modelo de movimiento en lugar de predict_center.
+    """
+    if pred_centers is None:
+        pred_centers = [predict_center(t) for t in tracks]
+    pred = np.asarray(pred_centers, dtype=np.float64).reshape(-1, 2)
+    boxes = boxes_to_array([t.bbox for t in tracks])
+    dist = np.hypot(pred[:, None, 0] - det_centers[None, :, 0], pred[:, None, 1] - det_centers[None, :, 1])
+    diag = np.hypot(np.maximum(1.0, boxes[:, 2] - boxes[:, 0]), np.maximum(1.0, boxes[:, 3] - boxes[:, 1]))
+    max_dist = np.maximum(1.0, 5.0 * diag)[:, None]
+    return np.maximum(0.0, 1.0 - dist / max_dist)
+
+def direction_score_matrix(tracks: List[Any], det_centers: np.ndarray) -> np.ndarray:
+    """direction_score() para todas las parejas; det_centers es (M,2). Devuelve (N,M)."""
+    n = len(tracks)
+    last = np.zeros((n, 2))
+    vel = np.zeros((n, 2))
+    for i, t in enumerate(tracks):
+        if len(t.centroids) >= 2:
+            last[i] = t.centroids[-1]
+            vel[i] = np.subtract(t.centroids[-1], t.centroids[-2])
+    u = det_centers[None, :, :] - last[:, None, :]
+    norm_v = np.hypot(vel[:, 0], vel[:, 1])[:, None]
+    norm_u = np.hypot(u[..., 0], u[..., 1])
+    den = norm_v * norm_u
+    cosang = np.zeros_like(den)
+    np.divide(vel[:, None, 0] * u[..., 0] + vel[:, None, 1] * u[..., 1], den, out=cosang, where=den != 0)
+    score = np.clip((cosang + 1.0) / 2.0, 0.0, 1.0)
+    # sin velocidad o detección en el mismo punto -> neutro
+    score[den == 0] = 0.5
+    return score